@@ -6,6 +6,8 @@ SONIFIED_AUDIO_BASE_DIR = os.path.join(BASE_DIR, "data/sonified_outputs")
 EMBEDDING_OUTPUT_DIR = os.path.join(BASE_DIR, "data/audio_embeddings")
 ANOMALY_OUTPUT_DIR = os.path.join(BASE_DIR, "data/anomaly_results")
 MOTIF_OUTPUT_DIR = os.path.join(BASE_DIR, "data/motif_recognition_results")
+MAP_OUTPUT_DIR = os.path.join(BASE_DIR, "data/maps")
+PIPELINE_MANIFEST_DIR = os.path.join(BASE_DIR, "data/manifests")  # per-transect, per-stage run manifests
 # LIDAR and HydroSHEDS configuration
 LIDAR_DTM_TILES_DIR = "data/lidar/Nasa_lidar_2008_to_2018_DTMs/DTM_tiles"
 HYDRO_GLOBAL_BASE_DIR = "data/hydrosheds"
@@ -21,9 +23,92 @@ AUDIO_SAMPLE_RATE = 44100
 VGGISH_SAMPLE_RATE = 16000
 DURATION_PER_GRID_CELL = 6.0  # seconds
 
+# Sonification parallelism (1 = sequential). Transects are fanned out to a process pool;
+# spare workers split each transect's cell grid into row bands.
+SONIFICATION_WORKERS = max(1, os.cpu_count() or 1)
+SONIFICATION_BANDS_PER_WORKER = 4  # row bands queued per band worker, for load balancing
+
+# Global seed for the per-cell sonification RNG (cells are seeded from seed, transect, row, col)
+SONIFICATION_RANDOM_SEED = 42
+
+# Batched synthesis: cells rendered per array pass, and log-frequency bins per octave used to
+# share noise filters between cells (None keeps every cutoff exact)
+SONIFICATION_BATCH_CELLS = 32
+SONIFICATION_CUTOFF_BINS_PER_OCTAVE = 48
+
+# Out-of-core raster reading: walk the DTM grid in strips of this many cell rows instead of
+# mosaicking every tile in RAM (False restores full in-memory reads). Plots use decimated reads.
+SONIFICATION_WINDOWED_READS = True
+SONIFICATION_STRIP_CELL_ROWS = 8
+SONIFICATION_VIZ_MAX_DIM = 2048
+
+# How satellite/hydro layers become per-cell values: "reproject" warps each layer onto the DTM
+# cell grid once (average, or mode for flow direction); "window" averages aligned source windows.
+# The per-cell feature table is cached on disk so re-runs with new musical parameters skip GIS work.
+SONIFICATION_ANCILLARY_MODE = "reproject"
+
+# Content-addressed cache of rendered cell audio (float32), keyed by cell features, synthesis
+# parameters, seed and sample rate; re-runs only synthesize cells whose inputs changed.
+# The store is trimmed least-recently-used first beyond the byte budget.
+SONIFICATION_CELL_CACHE = True
+SONIFICATION_CELL_CACHE_MAX_BYTES = 2 * 1024**3
+
+# Pipeline mode: in memory, audio, embeddings and scores are handed between stages without a disk
+# round-trip (every stage runs for every transect); persisting still writes the usual files and manifests.
+PIPELINE_IN_MEMORY = False
+PIPELINE_PERSIST_OUTPUTS = True
+# In memory, embed each transect while it is being synthesized (cells stream into VGGish through an
+# on-the-fly resampler). Transects then run one at a time, with all workers on row bands.
+PIPELINE_STREAM_EMBEDDINGS = True
+
+# VGGish inference: examples (0.96 s each) packed into one model call, from any number of blocks and
+# transects. Larger batches amortize per-call overhead; 256 suits CPU nodes.
+VGGISH_BATCH_EXAMPLES = 256
+# Embeddings are stored per transect as memory-mappable arrays with a frame index (time range and
+# cell per frame), so later stages slice only the frames they need. "float16" halves the store.
+EMBEDDING_STORE_DTYPE = "float32"
+# Audio is read and resampled (polyphase, cached filters) on a thread pool, up to VGGISH_PREFETCH_BLOCKS
+# blocks ahead of inference; the next transects' files are read ahead on the spare threads.
+VGGISH_RESAMPLE_THREADS = 4
+VGGISH_PREFETCH_BLOCKS = 4
+
+# VGGish model loading: a SavedModel in VGGISH_MODEL_DIR is used when present (air-gapped nodes; see
+# vggish_embedding.fetch_vggish_model), otherwise the TF Hub URL is resolved through the local hub
+# cache, downloading only when it is not cached and VGGISH_OFFLINE is off. Each process loads the
+# model once, with an optional warmup inference; VGGISH_WORKERS > 1 embeds transects on a pool of
+# worker processes that each keep a warm model.
+VGGISH_MODEL_DIR = os.path.join(BASE_DIR, "data/vggish_model")
+VGGISH_MODEL_CACHE_DIR = os.path.join(BASE_DIR, "data/tfhub_cache")
+VGGISH_OFFLINE = False
+VGGISH_WARMUP = True
+VGGISH_WORKERS = 1
+
 # Anomaly detection
 ISOLATION_FOREST_RANDOM_STATE = 42
 ISOLATION_FOREST_CONTAMINATION = 0.01
+# Scoring: embeddings are scored in chunks of this many frames (bounded memory, read straight from
+# the memory-mapped store), with chunks spread over a thread pool.
+ANOMALY_SCORING_CHUNK_FRAMES = 65536
+ANOMALY_SCORING_WORKERS = max(1, os.cpu_count() or 1)
+# Fitted detectors are saved per model name and version with the training data fingerprint, and
+# reused (memory-mapped) by later runs with the same training data and parameters
+ANOMALY_MODEL_REGISTRY = True
+ANOMALY_MODEL_REGISTRY_DIR = os.path.join(BASE_DIR, "data/anomaly_models")
+# Streaming scoring: optional baseline updated online with every scored batch of frames
+# ("half_space_trees", "sgd_one_class_svm" or None)
+ANOMALY_STREAMING_BASELINE = "half_space_trees"
+HST_N_TREES = 25
+HST_DEPTH = 15
+HST_WINDOW_SIZE = 250 # Frames per reference window (~4 minutes of audio)
+# k-NN detector (model kind "knn"): mean distance to the nearest reference (normal) frames, found
+# with an HNSW index when hnswlib is installed, else with an exact scikit-learn search
+KNN_NEIGHBORS = 10
+KNN_BACKEND = "auto" # "hnsw", "exact" or "auto"
+KNN_HNSW_M = 16
+KNN_HNSW_EF_CONSTRUCTION = 200
+KNN_HNSW_EF_SEARCH = 64
+KNN_THRESHOLD_SAMPLE = 10000 # Reference frames used to set the outlier distance threshold
+KNN_QUERY_THREADS = 1 # Per chunk; chunks already run on ANOMALY_SCORING_WORKERS threads
 
 # DTW
 DTW_SIMILARITY_THRESHOLD = 75
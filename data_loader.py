@@ -16,7 +16,8 @@ def load_embeddings(path):
     if not os.path.exists(path):
         log(f"Embedding file not found: {path}", level="WARN")
         return np.array([])
-    return np.load(path)
+    # Memory-mapped: callers page in only the frames they slice
+    return np.load(path, mmap_mode="r")
 
 def load_json(path):
     if not os.path.exists(path):
@@ -1,29 +1,204 @@
+import os
+import functools
 from config import *
 from utils.logger import log
+from utils.manifest import StageManifest
+from utils.embedding_store import EmbeddingStore
 from models import sonification, vggish_embedding, anomaly_detection, motif_recognition, map_visualization
 
-def main():
+# --- Stage specs: (inputs, config, outputs) of one stage for one transect ---
+# Inputs and outputs are {name: path}; config is {name: JSON value}. A stage re-runs for a transect
+# only when its manifest says one of these changed (or the last run never finished).
+
+embedding_store = EmbeddingStore(EMBEDDING_OUTPUT_DIR, EMBEDDING_STORE_DTYPE)
+
+def embedding_path(transect_id):
+    return embedding_store.embeddings_path(transect_id)
+
+def embedding_index_path(transect_id):
+    return embedding_store.index_path(transect_id)
+
+def anomaly_path(transect_id):
+    return os.path.join(ANOMALY_OUTPUT_DIR, f"{transect_id}_anomaly_results.json")
+
+def motif_path(transect_id):
+    return os.path.join(MOTIF_OUTPUT_DIR, f"{transect_id}_motif_recognition_results.json")
+
+def sonification_spec(transect_id):
+    return {}, sonification.stage_config(transect_id), sonification.transect_output_paths(transect_id)
+
+def embedding_spec(transect_id, source="wav"):
+    # source "stream": embedded from the raw cell mix (not peak-normalized or PCM-quantized like the
+    # WAV), so it never passes for a file-path run
+    inputs = {"audio": sonification.transect_output_paths(transect_id)["audio"]}
+    config = {"model": vggish_embedding.VGGISH_MODEL_URL, "sample_rate": VGGISH_SAMPLE_RATE,
+              "example_framing": list(vggish_embedding.vggish_example_framing()), "pad_tail": True,
+              "store_dtype": EMBEDDING_STORE_DTYPE, "source": source}
+    return inputs, config, {"embeddings": embedding_path(transect_id), "frame_index": embedding_index_path(transect_id)}
+
+def anomaly_spec(transect_id):
+    # The model is trained on the normal transects, so their embeddings are inputs of every transect
+    training_ids = list(anomaly_detection.NORMAL_TRANSECTS_FOR_TRAINING)
+    inputs = {f"train_embeddings:{tid}": embedding_path(tid) for tid in training_ids}
+    inputs["embeddings"] = embedding_path(transect_id)
+    inputs["frame_index"] = embedding_index_path(transect_id)
+    inputs["metadata"] = sonification.transect_output_paths(transect_id)["metadata"]
+    config = {"training_transects": training_ids, "contamination": ISOLATION_FOREST_CONTAMINATION,
+              "random_state": ISOLATION_FOREST_RANDOM_STATE, "cell_aggregates": ["mean", "min", "max", "any_flag"]}
+    return inputs, config, {"anomalies": anomaly_path(transect_id)}
+
+def motif_spec(transect_id):
+    # Motif library transects feed every transect's matching
+    motif_definitions = motif_recognition.ARCHAEOLOGICAL_MOTIFS_DEFINITIONS
+    inputs = {}
+    for tid in motif_definitions:
+        inputs[f"motif_embeddings:{tid}"] = embedding_path(tid)
+        inputs[f"motif_frame_index:{tid}"] = embedding_index_path(tid)
+        inputs[f"motif_metadata:{tid}"] = sonification.transect_output_paths(tid)["metadata"]
+    inputs["anomalies"] = anomaly_path(transect_id)
+    inputs["embeddings"] = embedding_path(transect_id)
+    inputs["frame_index"] = embedding_index_path(transect_id)
+    inputs["metadata"] = sonification.transect_output_paths(transect_id)["metadata"]
+    config = {"motifs": motif_definitions, "dtw_similarity_threshold": DTW_SIMILARITY_THRESHOLD}
+    return inputs, config, {"motifs": motif_path(transect_id)}
+
+def map_spec(transect_id):
+    inputs = {"metadata": sonification.transect_output_paths(transect_id)["metadata"], "motifs": motif_path(transect_id)}
+    config = {"source_crs": str(map_visualization.SOURCE_CRS), "target_crs": str(map_visualization.TARGET_CRS)}
+    return inputs, config, {"map": os.path.join(MAP_OUTPUT_DIR, f"{transect_id}_map.html")}
+
+def run_stage(stage, module, transect_ids, stage_spec, force=False):
+    """Run `module.run` for the transects whose manifest for `stage` is stale.
+
+    Each transect's manifest is written as soon as that transect finishes, so an interrupted
+    run resumes from the first unfinished transect.
+    """
+    specs = {transect_id: stage_spec(transect_id) for transect_id in transect_ids}
+    manifests = {transect_id: StageManifest(PIPELINE_MANIFEST_DIR, stage, transect_id) for transect_id in transect_ids}
+    stale_ids = []
+    for transect_id, (inputs, config, outputs) in specs.items():
+        reason = "forced" if force else manifests[transect_id].staleness(inputs, config, outputs)
+        if reason is None:
+            log(f"  [{stage}] {transect_id}: up to date, skipping")
+        else:
+            log(f"  [{stage}] {transect_id}: {reason}, running")
+            stale_ids.append(transect_id)
+    if not stale_ids:
+        return
+
+    for transect_id in stale_ids:
+        manifests[transect_id].mark_started(specs[transect_id][1])
+
+    def on_complete(transect_id, result):
+        inputs, config, outputs = specs[transect_id]
+        missing = [path for path in outputs.values() if not os.path.exists(path)]
+        if result is None or missing:
+            log(f"  [{stage}] {transect_id}: no complete output, will re-run next time", level="WARN")
+            return
+        manifests[transect_id].record(inputs, config, outputs)
+
+    module.run(transect_ids=stale_ids, on_complete=on_complete)
+
+def record_manifests(stage, transect_ids, stage_spec):
+    """Record a complete manifest for every transect whose `stage` outputs all exist."""
+    for transect_id in transect_ids:
+        inputs, config, outputs = stage_spec(transect_id)
+        if all(os.path.exists(path) for path in outputs.values()):
+            StageManifest(PIPELINE_MANIFEST_DIR, stage, transect_id).record(inputs, config, outputs)
+
+def run_in_memory(persist=PIPELINE_PERSIST_OUTPUTS, stream_embeddings=PIPELINE_STREAM_EMBEDDINGS):
+    """One-shot run that hands audio, embeddings and scores from stage to stage in memory.
+
+    Every stage runs for every transect. With stream_embeddings, VGGish consumes each cell's audio
+    as it is rendered; otherwise each transect's normalized audio is embedded and released as soon
+    as it is sonified. With persist, the usual files are written as a side effect and the
+    manifests are recorded, so a later incremental run can pick up from them.
+    """
+    transect_ids = list(sonification.TRANSECTS_TO_PROCESS)
+
+    # Stages 1+2: Sonification and VGGish embedding extraction
+    log("Running sonification and VGGish embedding extraction in memory...")
+    sonifier = sonification.Sonifier()
+    extractor = vggish_embedding.EmbeddingExtractor()
+    if stream_embeddings:
+        # Cells flow into the embedder while the transect is still being synthesized
+        artifacts_by_transect = {}
+        for transect_id in transect_ids:
+            artifacts = {}
+            chunks = sonification.cell_audio_chunks(sonifier.stream(transect_id, persist), artifacts)
+            embeddings, frame_times = extractor.process_stream(transect_id, chunks, sonification.SAMPLE_RATE, persist=False)
+            if artifacts:
+                artifacts.update(embeddings=embeddings, embedding_times=frame_times)
+                artifacts_by_transect[transect_id] = artifacts
+                if persist and embeddings.size > 0:
+                    extractor.save_embeddings(transect_id, embeddings, frame_times, artifacts["cells"])
+    else:
+        # Each transect's normalized audio is embedded as soon as it is ready
+        def embed(transect_id, artifacts):
+            if artifacts is not None:
+                extractor.process_in_memory(artifacts, persist)
+        sonified = sonifier.run_in_memory(transect_ids, persist, on_complete=embed)
+        artifacts_by_transect = {transect_id: artifacts for transect_id, artifacts in sonified.items() if artifacts is not None}
+
+    # Stage 3: Anomaly detection
+    log("Running anomaly detection...")
+    analyze_ids = [transect_id for transect_id in anomaly_detection.TRANSECTS_TO_ANALYZE if transect_id in artifacts_by_transect]
+    scorer = anomaly_detection.AnomalyScorer()
+    scorer.load_or_fit(artifacts_by_transect) # Reuses a saved model fitted on the same embeddings
+    for transect_id in analyze_ids:
+        scorer.process_in_memory(artifacts_by_transect[transect_id], persist)
+
+    # Stage 4: Motif recognition
+    log("Performing DTW motif matching...")
+    matcher = motif_recognition.MotifMatcher().prepare(artifacts_by_transect)
+    for transect_id in analyze_ids:
+        matcher.process_in_memory(artifacts_by_transect[transect_id], persist)
+
+    # Stage 5: Visualization
+    log("Generating interactive Folium maps...")
+    renderer = map_visualization.MapRenderer()
+    for artifacts in artifacts_by_transect.values():
+        renderer.process_in_memory(artifacts, persist)
+
+    if persist:
+        # Only transects a stage actually produced in this run get a manifest for it
+        def produced(key):
+            return [transect_id for transect_id, artifacts in artifacts_by_transect.items() if artifacts.get(key) is not None]
+        record_manifests("sonification", produced("cells"), sonification_spec)
+        record_manifests("embedding", [transect_id for transect_id in produced("embeddings") if artifacts_by_transect[transect_id]["embeddings"].size > 0],
+                         functools.partial(embedding_spec, source="stream" if stream_embeddings else "wav"))
+        record_manifests("anomaly", produced("anomalies"), anomaly_spec)
+        record_manifests("motif", produced("motifs"), motif_spec)
+        record_manifests("map", produced("cells"), map_spec)
+    return artifacts_by_transect
+
+def main(force_stages=(), in_memory=PIPELINE_IN_MEMORY):
     log("Starting SONAR: Whispers Beneath the Canopy")
 
+    if in_memory:
+        run_in_memory()
+        log("Pipeline complete.")
+        return
+
     # Stage 1: Sonification
     log("Running sonification...")
-    sonification.run()
+    run_stage("sonification", sonification, sonification.TRANSECTS_TO_PROCESS, sonification_spec, "sonification" in force_stages)
 
     # Stage 2: Embedding extraction
     log("Extracting VGGish embeddings...")
-    vggish_embedding.run()
+    run_stage("embedding", vggish_embedding, sonification.TRANSECTS_TO_PROCESS, embedding_spec, "embedding" in force_stages)
 
     # Stage 3: Anomaly detection
     log("Running anomaly detection...")
-    anomaly_detection.run()
+    run_stage("anomaly", anomaly_detection, anomaly_detection.TRANSECTS_TO_ANALYZE, anomaly_spec, "anomaly" in force_stages)
 
     # Stage 4: Motif recognition
     log("Performing DTW motif matching...")
-    motif_recognition.run()
+    run_stage("motif", motif_recognition, anomaly_detection.TRANSECTS_TO_ANALYZE, motif_spec, "motif" in force_stages)
 
     # Stage 5: Visualization
     log("Generating interactive Folium maps...")
-    map_visualization.run()
+    run_stage("map", map_visualization, sonification.TRANSECTS_TO_PROCESS, map_spec, "map" in force_stages)
 
     log("Pipeline complete. All results saved.")
 
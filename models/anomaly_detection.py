@@ -1,14 +1,41 @@
 # Cell 3: Anomaly Detection with Isolation Forest
 
-from sklearn.ensemble import IsolationForest
-from sklearn.svm import OneClassSVM # Alternative model
 import numpy as np
 import os
 import glob
 import json # To load metadata and align anomalies
-
-# --- RE-DEFINING GLOBAL TRANSECT LISTS FOR CELL SCOPE ---
-# These must be defined here as Cell 3 runs independently and needs these variables.
+from concurrent.futures import ThreadPoolExecutor # Chunked scoring across cores
+from config import (
+    SONIFIED_AUDIO_BASE_DIR,
+    EMBEDDING_OUTPUT_DIR,
+    ANOMALY_OUTPUT_DIR,
+    ISOLATION_FOREST_RANDOM_STATE,
+    ISOLATION_FOREST_CONTAMINATION, # Expected proportion of anomalies in the training data (e.g., 1%).
+                                    # For OneClassSVM, nu is equivalent to contamination.
+    ANOMALY_SCORING_CHUNK_FRAMES,
+    ANOMALY_SCORING_WORKERS,
+    ANOMALY_MODEL_REGISTRY,
+    ANOMALY_MODEL_REGISTRY_DIR,
+    ANOMALY_STREAMING_BASELINE,
+    HST_N_TREES,
+    HST_DEPTH,
+    HST_WINDOW_SIZE,
+    KNN_NEIGHBORS,
+    KNN_BACKEND,
+    KNN_HNSW_M,
+    KNN_HNSW_EF_CONSTRUCTION,
+    KNN_HNSW_EF_SEARCH,
+    KNN_THRESHOLD_SAMPLE,
+    KNN_QUERY_THREADS,
+    EMBEDDING_STORE_DTYPE,
+)
+from models.vggish_embedding import vggish_frame_times_ms, stored_frame_times
+from utils.embedding_store import EmbeddingStore, frame_centres, frame_ranges, reduce_segments
+from utils.half_space_trees import HalfSpaceTrees
+from utils.knn_detector import KNNDetector
+from utils.model_registry import ModelRegistry, training_fingerprint
+
+# --- Global transect lists (shared with the motif recognition stage) ---
 ARCHAEOLOGICAL_TRANSECTS = ['BR_AC_10', 'BR_RO_05', 'BR_PA_02', 'BR_AC_07', 'BR_AC_09']
 JUNGLE_TRANSECTS = ['BR_AM_04', 'BR_PA_04', 'BR_RO_03', 'BR_MT_01']
 CITY_TRANSECTS = ['BR_AM_03']
@@ -18,10 +45,7 @@ GAN_TRANSECTS = JUNGLE_TRANSECTS
 TRANSFORMER_TRANSECTS = ARCHAEOLOGICAL_TRANSECTS
 
 # --- Configuration for Anomaly Detection Module ---
-EMBEDDING_INPUT_DIR = "audio_embeddings" # Directory where VGGish embeddings are saved
-ANOMALY_OUTPUT_DIR = "anomaly_results" # Directory to save anomaly scores and flags
-
-os.makedirs(ANOMALY_OUTPUT_DIR, exist_ok=True)
+EMBEDDING_INPUT_DIR = EMBEDDING_OUTPUT_DIR # Directory where VGGish embeddings are saved
 
 # Define which transects are 'normal' for training the anomaly detection model
 # IMPORTANT: Updated to only include transects for which embeddings were successfully generated in Cell 2.
@@ -31,153 +55,487 @@ NORMAL_TRANSECTS_FOR_TRAINING = ['BR_AC_10', 'BR_AC_07'] # Using two archaeologi
 # Define which transects to apply anomaly detection to (all successfully processed ones)
 TRANSECTS_TO_ANALYZE = ['BR_PA_02', 'BR_RO_05', 'BR_AC_10', 'BR_AC_07'] # Only the ones where embeddings were created
 
-# Anomaly Detection Model Parameters
-ISOLATION_FOREST_RANDOM_STATE = 42 # For reproducibility
-ISOLATION_FOREST_CONTAMINATION = 0.01 # Expected proportion of anomalies in the training data (e.g., 1%)
-                                         # Adjust this based on your assumption of anomaly density in baseline areas.
-                                         # For OneClassSVM, nu is equivalent to contamination.
-
-print("Cell 3: Anomaly Detection Setup Complete.")
-
-# --- 1. Load Embeddings and Prepare Training Data ---
-print("\n--- Preparing training data for Anomaly Detection Model ---")
-all_normal_embeddings = []
-
-for transect_id in NORMAL_TRANSECTS_FOR_TRAINING:
-    embedding_filepath = os.path.join(EMBEDDING_INPUT_DIR, f"{transect_id}_embeddings.npy")
-    if os.path.exists(embedding_filepath):
-        print(f"  Loading normal embeddings for training: {transect_id}")
-        embeddings = np.load(embedding_filepath)
-        if embeddings.size > 0:
-            all_normal_embeddings.append(embeddings)
-        else:
-            print(f"    Warning: No embeddings found for {transect_id}. Skipping for training.")
+
+def build_model(kind="isolation_forest", contamination=ISOLATION_FOREST_CONTAMINATION, random_state=ISOLATION_FOREST_RANDOM_STATE):
+    """Create an unfitted anomaly detector: "isolation_forest", "one_class_svm" or "knn".
+
+    "knn" scores frames by their distance to the nearest training frames, so it is best trained on a
+    clean reference set (e.g. AnomalyScorer(training_transects=JUNGLE_TRANSECTS, model_kind="knn")).
+    """
+    if kind == "isolation_forest":
+        from sklearn.ensemble import IsolationForest
+        return IsolationForest(contamination=contamination, random_state=random_state)
+    if kind == "one_class_svm":
+        from sklearn.svm import OneClassSVM # Alternative model
+        return OneClassSVM(nu=contamination, kernel="rbf", gamma="auto")
+    if kind == "knn":
+        return KNNDetector(KNN_NEIGHBORS, contamination, KNN_BACKEND, KNN_HNSW_M, KNN_HNSW_EF_CONSTRUCTION, KNN_HNSW_EF_SEARCH,
+                           KNN_THRESHOLD_SAMPLE, query_threads=KNN_QUERY_THREADS, random_state=random_state)
+    raise ValueError(f"Unknown anomaly model kind: {kind!r}")
+
+
+def build_streaming_baseline(kind=ANOMALY_STREAMING_BASELINE, contamination=ISOLATION_FOREST_CONTAMINATION,
+                             random_state=ISOLATION_FOREST_RANDOM_STATE):
+    """Create an online detector (partial_fit / score_samples, higher is more normal), or None.
+
+    "half_space_trees" keeps a sliding reference window of mass profiles; "sgd_one_class_svm" is a
+    linear one-class SVM trained by mini-batch SGD.
+    """
+    if kind is None:
+        return None
+    if kind == "half_space_trees":
+        return HalfSpaceTrees(HST_N_TREES, HST_DEPTH, HST_WINDOW_SIZE, random_state=random_state)
+    if kind == "sgd_one_class_svm":
+        from sklearn.linear_model import SGDOneClassSVM
+        return SGDOneClassSVM(nu=contamination, random_state=random_state)
+    raise ValueError(f"Unknown streaming baseline kind: {kind!r}")
+
+
+def flags_from_scores(model, anomaly_scores):
+    """Outlier flags from decision_function scores, exactly where model.predict would return -1.
+
+    decision_function already subtracts the fitted offset, so the threshold is 0: IsolationForest
+    flags scores < 0, while the libsvm-based OneClassSVM flags scores <= 0.
+    """
+    if type(model).__name__ == "OneClassSVM":
+        return anomaly_scores <= 0
+    return anomaly_scores < 0
+
+
+def score_embeddings(model, embeddings, chunk_frames=ANOMALY_SCORING_CHUNK_FRAMES, workers=ANOMALY_SCORING_WORKERS):
+    """Return (scores, flags) per embedding from a single decision_function pass.
+
+    Embeddings (an array or a read-only memory map) are scored chunk_frames at a time, so only one
+    chunk per worker is materialized in memory; chunks are spread over `workers` threads (the tree
+    and kernel evaluations run outside the GIL).
+    """
+    num_frames = len(embeddings)
+    anomaly_scores = np.empty(num_frames, dtype=np.float64)
+    chunk_frames = max(1, int(chunk_frames))
+    chunks = [(start, min(start + chunk_frames, num_frames)) for start in range(0, num_frames, chunk_frames)]
+
+    def score_chunk(chunk):
+        start, end = chunk
+        anomaly_scores[start:end] = model.decision_function(np.asarray(embeddings[start:end], dtype=np.float32))
+
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            list(executor.map(score_chunk, chunks))
     else:
-        print(f"  Warning: Embedding file not found for normal transect '{transect_id}'. Skipping for training.")
-
-if not all_normal_embeddings:
-    print("ERROR: No normal transect embeddings available for training. Cannot proceed with anomaly detection.")
-    # Raise an error to halt execution if training data is genuinely missing
-    raise ValueError("No normal transect embeddings for training. Check paths/data for NORMAL_TRANSECTS_FOR_TRAINING.")
-
-# Concatenate all normal embeddings for training
-X_train_normal = np.vstack(all_normal_embeddings)
-print(f"Total number of normal embedding samples for training: {X_train_normal.shape[0]}")
-print(f"Embedding dimensionality: {X_train_normal.shape[1]}")
-
-# --- 2. Train Anomaly Detection Model (Isolation Forest) ---
-print("\n--- Training Isolation Forest Model ---")
-# You can choose between IsolationForest or OneClassSVM
-# model = OneClassSVM(nu=ISOLATION_FOREST_CONTAMINATION, kernel="rbf", gamma="auto") # One-Class SVM
-model = IsolationForest(contamination=ISOLATION_FOREST_CONTAMINATION, random_state=ISOLATION_FOREST_RANDOM_STATE)
-
-# Fit the model to the normal data
-model.fit(X_train_normal)
-print("Isolation Forest model trained successfully.")
-
-# --- 3. Apply Anomaly Detection to All Transects ---
-print("\n--- Applying Anomaly Detection to all selected transects ---")
-
-all_transect_anomaly_results = {}
-
-for transect_id in TRANSECTS_TO_ANALYZE:
-    print(f"\nProcessing transect: {transect_id}")
-    embedding_filepath = os.path.join(EMBEDDING_INPUT_DIR, f"{transect_id}_embeddings.npy")
-    metadata_filepath = os.path.join(SONIFIED_AUDIO_BASE_DIR, transect_id, f"{transect_id}_geospatial_metadata.json")
-
-    if not os.path.exists(embedding_filepath):
-        print(f"  Embeddings not found for {transect_id}. Skipping anomaly detection for this transect.")
-        continue
-    
-    if not os.path.exists(metadata_filepath):
-        print(f"  Metadata not found for {transect_id}. Cannot link anomalies to geospatial cells. Skipping.")
-        continue
-
-    embeddings_to_predict = np.load(embedding_filepath)
-    if embeddings_to_predict.size == 0:
-        print(f"  No embeddings found in file for {transect_id}. Skipping.")
-        continue
-
-    # Predict anomaly scores (lower score indicates higher anomaly)
-    # Isolation Forest returns decision_function scores (negative for anomalies)
-    anomaly_scores = model.decision_function(embeddings_to_predict)
-
-    # Predict if a sample is an outlier (-1) or an inlier (1)
-    # For IsolationForest, -1 is outlier, 1 is inlier.
-    anomaly_predictions = model.predict(embeddings_to_predict)
-
-    # Convert predictions to a more intuitive boolean flag: True for anomaly, False for normal
-    anomaly_flags = (anomaly_predictions == -1)
-
-    print(f"  Calculated {len(anomaly_scores)} anomaly scores for {transect_id}.")
-    print(f"  Detected {np.sum(anomaly_flags)} anomalous segments ({np.sum(anomaly_flags)/len(anomaly_flags)*100:.2f}%)")
-
-    # Load geospatial metadata to align anomalies with cells
-    with open(metadata_filepath, 'r') as f:
-        cell_geometries = json.load(f)
-
-    # --- Aligning Anomaly Results with Geospatial Cells ---
-    # This is a critical and potentially complex part.
-    # VGGish embeddings are generated for overlapping 0.96s segments (with 0.5s hop).
-    # Your sonified cells are DURATION_PER_GRID_CELL (6.0s) long.
-    # We need to map which VGGish embeddings fall within which original geospatial cell's audio.
-
-    # Calculate how many VGGish embeddings per original grid cell
-    vggish_frame_length_s = 0.96
-    vggish_hop_length_s = 0.5
-    
-    # DURATION_PER_GRID_CELL is a global constant from Cell 1. We assume its value here.
-    # If this notebook were standalone, DURATION_PER_GRID_CELL would need to be defined here.
-    # For now, it relies on it being run in a session where Cell 1 has executed.
-    
-    # Store results, linking them back to the original cell metadata
-    transect_anomaly_data = []
-    current_vggish_idx = 0
-
-    for i, cell_geom in enumerate(cell_geometries):
-        cell_start_ms = cell_geom['audio_start_ms']
-        cell_end_ms = cell_geom['audio_end_ms']
-        cell_duration_s = (cell_end_ms - cell_start_ms) / 1000.0
-
-        # Calculate VGGish embeddings relevant to this cell's audio duration
-        actual_num_vggish_embeddings_for_this_cell = int(np.floor((cell_duration_s - vggish_frame_length_s) / vggish_hop_length_s) + 1)
-        if actual_num_vggish_embeddings_for_this_cell < 0: # Handle very short/silent cells that might not generate embeddings
-            actual_num_vggish_embeddings_for_this_cell = 0
-
-        # Ensure we don't go out of bounds of the extracted embeddings array
-        end_vggish_idx = min(current_vggish_idx + actual_num_vggish_embeddings_for_this_cell, len(anomaly_scores))
-        
-        cell_vggish_scores = anomaly_scores[current_vggish_idx:end_vggish_idx]
-        cell_vggish_flags = anomaly_flags[current_vggish_idx:end_vggish_idx]
-
-        # Determine if *any* VGGish segment within this cell is anomalous
-        is_cell_anomalous = np.any(cell_vggish_flags) if cell_vggish_flags.size > 0 else False
-        
-        # Calculate mean anomaly score for the cell (or min score if you want to emphasize worst anomaly)
-        mean_cell_anomaly_score = np.mean(cell_vggish_scores) if cell_vggish_scores.size > 0 else 0.0
-
-        transect_anomaly_data.append({
-            "cell_id": i, # Or a unique ID if you have one for each cell
-            "minx": cell_geom['minx'],
-            "miny": cell_geom['miny'],
-            "maxx": cell_geom['maxx'],
-            "maxy": cell_geom['maxy'],
-            "audio_start_ms": cell_geom['audio_start_ms'],
-            "audio_end_ms": cell_geom['audio_end_ms'],
-            "is_anomalous_flag": bool(is_cell_anomalous), # Convert to native bool
-            "mean_anomaly_score": float(mean_cell_anomaly_score), # Convert to native float
-            # Optionally, you can store all VGGish scores for the cell here if needed for finer analysis
-            # "vggish_segment_scores": cell_vggish_scores.tolist()
-        })
-        current_vggish_idx = end_vggish_idx # Move to the next block of VGGish embeddings
-
-    all_transect_anomaly_results[transect_id] = transect_anomaly_data
-
-    # Save the anomaly results for the current transect
-    output_json_filepath = os.path.join(ANOMALY_OUTPUT_DIR, f"{transect_id}_anomaly_results.json")
-    with open(output_json_filepath, 'w') as f:
-        json.dump(transect_anomaly_data, f, indent=4)
-    print(f"  Anomaly results saved to: {output_json_filepath}")
-
-print("\n--- Anomaly Detection Process Complete ---")
-print(f"All anomaly results saved to: '{ANOMALY_OUTPUT_DIR}'")
\ No newline at end of file
+        for chunk in chunks:
+            score_chunk(chunk)
+    return anomaly_scores, flags_from_scores(model, anomaly_scores)
+
+
+def aggregate_cell_scores(anomaly_scores, anomaly_flags, first_frames, end_frames):
+    """Per-cell aggregates of per-frame scores/flags over frame ranges [first, end), as arrays.
+
+    Returns {"mean", "min", "max", "flag", "n_frames"}; cells without frames get 0.0 scores and no
+    flag. Segment reductions do the work, so the cost is a few passes over the frames.
+    """
+    anomaly_scores = np.asarray(anomaly_scores, dtype=np.float64)
+    anomaly_flags = np.asarray(anomaly_flags, dtype=bool)
+    n_frames = np.maximum(np.asarray(end_frames) - np.asarray(first_frames), 0)
+    score_sums = reduce_segments(np.add, anomaly_scores, first_frames, end_frames)
+    return {
+        "mean": np.divide(score_sums, n_frames, out=np.zeros(len(n_frames)), where=n_frames > 0),
+        "min": reduce_segments(np.minimum, anomaly_scores, first_frames, end_frames),
+        "max": reduce_segments(np.maximum, anomaly_scores, first_frames, end_frames),
+        # Determine if *any* VGGish segment within the cell is anomalous
+        "flag": reduce_segments(np.logical_or, anomaly_flags, first_frames, end_frames, False),
+        "n_frames": n_frames,
+    }
+
+
+def align_scores_to_cells(anomaly_scores, anomaly_flags, cell_geometries, frame_times_ms=None):
+    """Aggregate per-embedding scores/flags into one result dict per geospatial cell.
+
+    Each embedding is assigned to the cell whose [audio_start_ms, audio_end_ms) contains the centre
+    of its frame, using the frame timestamps saved with the embeddings (the nominal VGGish grid of
+    0.975 s frames every 0.96 s when none are given). The frame -> cell ranges are found with one
+    search and the scores are aggregated per cell with segment reductions (aggregate_cell_scores).
+    """
+    if frame_times_ms is None:
+        frame_times_ms = vggish_frame_times_ms(len(anomaly_scores))
+    cell_starts_ms = np.array([cell_geom['audio_start_ms'] for cell_geom in cell_geometries], dtype=np.float64)
+    cell_ends_ms = np.array([cell_geom['audio_end_ms'] for cell_geom in cell_geometries], dtype=np.float64)
+    first_frames, end_frames = frame_ranges(frame_times_ms[:len(anomaly_scores)], cell_starts_ms, cell_ends_ms)
+    cell_scores = aggregate_cell_scores(anomaly_scores, anomaly_flags, first_frames, end_frames)
+
+    # Native Python values for JSON, converted in bulk
+    is_anomalous = cell_scores["flag"].tolist()
+    mean_scores, min_scores, max_scores = cell_scores["mean"].tolist(), cell_scores["min"].tolist(), cell_scores["max"].tolist()
+    return [cell_result(i, cell_geom, is_anomalous[i], mean_scores[i], min_scores[i], max_scores[i])
+            for i, cell_geom in enumerate(cell_geometries)]
+
+
+def cell_result(cell_id, cell_geom, is_anomalous, mean_score, min_score, max_score):
+    """One cell's entry of the anomaly results JSON."""
+    return {
+        "cell_id": cell_id, # Or a unique ID if you have one for each cell
+        "minx": cell_geom['minx'],
+        "miny": cell_geom['miny'],
+        "maxx": cell_geom['maxx'],
+        "maxy": cell_geom['maxy'],
+        "audio_start_ms": cell_geom['audio_start_ms'],
+        "audio_end_ms": cell_geom['audio_end_ms'],
+        "is_anomalous_flag": is_anomalous,
+        "mean_anomaly_score": mean_score,
+        "min_anomaly_score": min_score, # Most anomalous segment of the cell
+        "max_anomaly_score": max_score,
+    }
+
+
+class StreamingAnomalyScorer:
+    """Online anomaly scoring of embedding frames as they are produced (e.g. by the VGGish stream).
+
+    push() scores each batch of frames right away with the fitted detector and returns the results
+    of every cell that can no longer receive frames: frames and cells both arrive in time order, so
+    a cell is closed as soon as a frame centred at or after its end has been seen. Cells can be given
+    up front or added as they are rendered; frames past the last known cell wait for their cell.
+    finish() closes the remaining cells. Closed cells carry the same fields as the batch results.
+
+    With a streaming baseline (partial_fit / score_samples, see build_streaming_baseline), each batch
+    is scored against the baseline before it is added to it, and cells also report
+    "mean_baseline_score" (None while the baseline has no reference yet).
+    """
+
+    def __init__(self, scorer, cell_geometries=(), baseline=None, on_cell=None):
+        self.scorer = scorer
+        self.baseline = baseline
+        self.on_cell = on_cell
+        self.cells = [] # Every cell added so far; cell ids are positions in this list
+        self.next_cell = 0 # First cell that is still open
+        self.n_frames = 0
+        self.baseline_frames = 0
+        self.last_centre = -np.inf
+        # Frames not yet assigned to a cell (centred after the last known cell's start)
+        self._pending = {"times": np.zeros((0, 2)), "scores": np.zeros(0), "flags": np.zeros(0, dtype=bool),
+                         "baseline": np.zeros(0)}
+        # Running aggregates of the open cells, index = cell id - next_cell
+        self._open = {"start": np.zeros(0), "end": np.zeros(0), "sum": np.zeros(0), "min": np.zeros(0),
+                      "max": np.zeros(0), "flag": np.zeros(0, dtype=bool), "count": np.zeros(0, dtype=np.int64),
+                      "baseline_sum": np.zeros(0), "baseline_count": np.zeros(0, dtype=np.int64)}
+        self.add_cells(cell_geometries)
+
+    def add_cells(self, cell_geometries):
+        """Append cells (in time order, after the cells added so far); returns the cells this closes."""
+        cell_geometries = list(cell_geometries)
+        if not cell_geometries:
+            return []
+        self.cells.extend(cell_geometries)
+        n = len(cell_geometries)
+        new = {"start": np.array([cell_geom['audio_start_ms'] for cell_geom in cell_geometries], dtype=np.float64),
+               "end": np.array([cell_geom['audio_end_ms'] for cell_geom in cell_geometries], dtype=np.float64),
+               "sum": np.zeros(n), "min": np.full(n, np.inf), "max": np.full(n, -np.inf), "flag": np.zeros(n, dtype=bool),
+               "count": np.zeros(n, dtype=np.int64), "baseline_sum": np.zeros(n), "baseline_count": np.zeros(n, dtype=np.int64)}
+        self._open = {key: np.concatenate((values, new[key])) for key, values in self._open.items()}
+        self._assign()
+        return self._close()
+
+    def push(self, embeddings, frame_times_ms=None):
+        """Score a batch of frames; returns (scores, flags, baseline_scores, closed_cells).
+
+        frame_times_ms defaults to the nominal VGGish grid continuing from the frames pushed so far.
+        baseline_scores is None without a baseline.
+        """
+        embeddings = np.asarray(embeddings)
+        if frame_times_ms is None:
+            frame_times_ms = vggish_frame_times_ms(len(embeddings), first_frame=self.n_frames)
+        frame_times_ms = np.asarray(frame_times_ms, dtype=np.float64).reshape(-1, 2)
+        if len(embeddings) == 0:
+            return np.zeros(0), np.zeros(0, dtype=bool), None, []
+        anomaly_scores, anomaly_flags = self.scorer.score(embeddings)
+        baseline_scores = None
+        if self.baseline is not None:
+            # Prequential: score against what the baseline knew before this batch, then update it
+            if self.baseline_frames > 0:
+                baseline_scores = np.asarray(self.baseline.score_samples(embeddings), dtype=np.float64)
+            else:
+                baseline_scores = np.full(len(embeddings), np.nan)
+            self.baseline.partial_fit(embeddings)
+            self.baseline_frames += len(embeddings)
+        self.n_frames += len(embeddings)
+        self.last_centre = max(self.last_centre, float(frame_centres(frame_times_ms)[-1]))
+        added = {"times": frame_times_ms, "scores": anomaly_scores, "flags": anomaly_flags,
+                 "baseline": np.full(len(embeddings), np.nan) if baseline_scores is None else baseline_scores}
+        self._pending = {key: np.concatenate((values, added[key])) for key, values in self._pending.items()}
+        self._assign()
+        return anomaly_scores, anomaly_flags, baseline_scores, self._close()
+
+    def finish(self, duration_ms=None):
+        """Close every open cell; returns their results. duration_ms clips the last frames' ends."""
+        if duration_ms is not None:
+            self._pending["times"][:, 1] = np.minimum(self._pending["times"][:, 1], max(float(duration_ms), 0.0))
+        self.last_centre = np.inf
+        self._assign()
+        closed = self._close()
+        self._pending = {key: values[:0] for key, values in self._pending.items()} # Frames past the last cell
+        return closed
+
+    def _assign(self):
+        # Fold every pending frame centred before the last known cell end into its cell's aggregates
+        open_cells, pending = self._open, self._pending
+        if not len(open_cells["end"]) or not len(pending["scores"]):
+            return
+        n_ready = int(np.searchsorted(frame_centres(pending["times"]), open_cells["end"][-1], side="left"))
+        if n_ready == 0:
+            return
+        ready = {key: values[:n_ready] for key, values in pending.items()}
+        first, end = frame_ranges(ready["times"], open_cells["start"], open_cells["end"])
+        has_baseline = ~np.isnan(ready["baseline"])
+        open_cells["sum"] += reduce_segments(np.add, ready["scores"], first, end)
+        open_cells["min"] = np.minimum(open_cells["min"], reduce_segments(np.minimum, ready["scores"], first, end, np.inf))
+        open_cells["max"] = np.maximum(open_cells["max"], reduce_segments(np.maximum, ready["scores"], first, end, -np.inf))
+        open_cells["flag"] |= reduce_segments(np.logical_or, ready["flags"], first, end, False)
+        open_cells["count"] += np.maximum(end - first, 0)
+        open_cells["baseline_sum"] += reduce_segments(np.add, np.where(has_baseline, ready["baseline"], 0.0), first, end)
+        open_cells["baseline_count"] += reduce_segments(np.add, has_baseline.astype(np.int64), first, end, 0)
+        self._pending = {key: values[n_ready:] for key, values in pending.items()}
+
+    def _close(self):
+        # Emit (and forget) the open cells that end at or before the latest frame centre
+        open_cells = self._open
+        n_closed = int(np.searchsorted(open_cells["end"], self.last_centre, side="right"))
+        closed = []
+        for k in range(n_closed):
+            count = int(open_cells["count"][k])
+            # Cells without frames get 0.0 scores and no flag, as in the batch results
+            result = cell_result(self.next_cell + k, self.cells[self.next_cell + k], bool(open_cells["flag"][k]),
+                                 float(open_cells["sum"][k] / count) if count else 0.0,
+                                 float(open_cells["min"][k]) if count else 0.0, float(open_cells["max"][k]) if count else 0.0)
+            if self.baseline is not None:
+                baseline_count = int(open_cells["baseline_count"][k])
+                result["mean_baseline_score"] = float(open_cells["baseline_sum"][k] / baseline_count) if baseline_count else None
+            closed.append(result)
+            if self.on_cell is not None:
+                self.on_cell(result)
+        self.next_cell += n_closed
+        self._open = {key: values[n_closed:] for key, values in open_cells.items()}
+        return closed
+
+
+class AnomalyScorer:
+    """Anomaly detection stage: embeddings + cell metadata in, `{transect}_anomaly_results.json` out.
+
+    The detector is trained on the normal transects the first time it is needed and then reused
+    for every transect scored by this instance. With a model registry, a detector fitted earlier on
+    the same training data with the same parameters is loaded instead of retrained; `model_name`
+    (default: the model kind) keeps several detectors side by side.
+    """
+
+    def __init__(self, training_transects=NORMAL_TRANSECTS_FOR_TRAINING, model_kind="isolation_forest",
+                 contamination=ISOLATION_FOREST_CONTAMINATION, random_state=ISOLATION_FOREST_RANDOM_STATE,
+                 embedding_dir=EMBEDDING_INPUT_DIR, metadata_dir=SONIFIED_AUDIO_BASE_DIR, output_dir=ANOMALY_OUTPUT_DIR,
+                 chunk_frames=ANOMALY_SCORING_CHUNK_FRAMES, workers=ANOMALY_SCORING_WORKERS,
+                 registry_dir=ANOMALY_MODEL_REGISTRY_DIR if ANOMALY_MODEL_REGISTRY else None, model_name=None):
+        self.training_transects = list(training_transects)
+        self.model_kind = model_kind
+        self.contamination = contamination
+        self.random_state = random_state
+        self.embedding_dir = embedding_dir
+        self.metadata_dir = metadata_dir
+        self.output_dir = output_dir
+        self.chunk_frames = chunk_frames
+        self.workers = workers
+        self.store = EmbeddingStore(embedding_dir, EMBEDDING_STORE_DTYPE) # Embeddings are read memory-mapped
+        self.registry = ModelRegistry(registry_dir) if registry_dir else None
+        self.model_name = model_name or model_kind
+        self.model_version = None # Registry version of the detector in use, once there is one
+        self._model = None
+
+    def embedding_path(self, transect_id):
+        return self.store.embeddings_path(transect_id)
+
+    def metadata_path(self, transect_id):
+        return os.path.join(self.metadata_dir, transect_id, f"{transect_id}_geospatial_metadata.json")
+
+    def output_path(self, transect_id):
+        return os.path.join(self.output_dir, f"{transect_id}_anomaly_results.json")
+
+    def training_sources(self, artifacts_by_transect=None):
+        # In-memory embeddings (artifacts_by_transect[transect_id]["embeddings"]) take precedence over .npy files
+        print("\n--- Preparing training data for Anomaly Detection Model ---")
+        artifacts_by_transect = artifacts_by_transect or {}
+        all_normal_embeddings = []
+        for transect_id in self.training_transects:
+            embedding_filepath = self.embedding_path(transect_id)
+            in_memory = (artifacts_by_transect.get(transect_id) or {}).get("embeddings")
+            if in_memory is not None and in_memory.size > 0:
+                print(f"  Using in-memory normal embeddings for training: {transect_id}")
+                all_normal_embeddings.append((transect_id, in_memory))
+            elif os.path.exists(embedding_filepath):
+                print(f"  Loading normal embeddings for training: {transect_id}")
+                embeddings = self.store.embeddings(transect_id)
+                if embeddings.size > 0:
+                    all_normal_embeddings.append((transect_id, embeddings))
+                else:
+                    print(f"    Warning: No embeddings found for {transect_id}. Skipping for training.")
+            else:
+                print(f"  Warning: Embedding file not found for normal transect '{transect_id}'. Skipping for training.")
+
+        if not all_normal_embeddings:
+            print("ERROR: No normal transect embeddings available for training. Cannot proceed with anomaly detection.")
+            raise ValueError("No normal transect embeddings for training. Check paths/data for NORMAL_TRANSECTS_FOR_TRAINING.")
+        return all_normal_embeddings
+
+    def load_training_embeddings(self, artifacts_by_transect=None):
+        """Stacked embeddings of the normal transects (see training_sources)."""
+        return np.vstack([embeddings for _, embeddings in self.training_sources(artifacts_by_transect)])
+
+    def fit(self, X_train_normal=None):
+        """Train the detector (on the normal transects' embeddings unless X_train_normal is given).
+
+        X_train_normal may be a list of row blocks (e.g. memory-mapped transects); detectors that
+        index blocks chunk by chunk (accepts_row_blocks) get them as they are, others get one array.
+        """
+        if X_train_normal is None:
+            X_train_normal = [embeddings for _, embeddings in self.training_sources()]
+        blocks = list(X_train_normal) if isinstance(X_train_normal, (list, tuple)) else [X_train_normal]
+        print(f"Total number of normal embedding samples for training: {sum(len(block) for block in blocks)}")
+        print(f"Embedding dimensionality: {blocks[0].shape[1]}")
+        print(f"\n--- Training {self.model_kind} model ---")
+        model = build_model(self.model_kind, self.contamination, self.random_state)
+        model.fit(blocks if getattr(model, "accepts_row_blocks", False) else np.vstack(blocks))
+        print("Anomaly detection model trained successfully.")
+        self._model = model
+        return self
+
+    def model_params(self):
+        """What a saved detector must have been fitted with to be reused by this scorer."""
+        import sklearn
+        settings = build_model(self.model_kind, self.contamination, self.random_state).get_params()
+        return {"model_kind": self.model_kind, "contamination": self.contamination, "random_state": self.random_state,
+                "model_settings": settings, "sklearn_version": sklearn.__version__}
+
+    def load_or_fit(self, artifacts_by_transect=None):
+        """Load the registry's detector for this training data and parameters, or fit and save one.
+
+        The training data is identified by a fingerprint of the normal transects' embeddings, so
+        re-extracted embeddings or a changed transect list lead to a new model version.
+        """
+        if self.registry is None:
+            return self.fit([embeddings for _, embeddings in self.training_sources(artifacts_by_transect)])
+        sources = self.training_sources(artifacts_by_transect)
+        criteria = dict(self.model_params(), training_transects=[transect_id for transect_id, _ in sources],
+                        training_fingerprint=training_fingerprint(sources))
+        version = self.registry.find(self.model_name, **criteria)
+        if version is not None:
+            model, _ = self.registry.load(self.model_name, version)
+            # Runtime-only settings (e.g. thread counts) are not part of the match: take the current ones
+            current = build_model(self.model_kind, self.contamination, self.random_state)
+            for name in getattr(model, "RUNTIME_PARAMS", ()):
+                setattr(model, name, getattr(current, name))
+            self._model = model
+            self.model_version = version
+            print(f"Loaded saved {self.model_kind} model '{self.model_name}' v{version} (no retraining needed).")
+            return self
+        self.fit([embeddings for _, embeddings in sources])
+        self.model_version = self.registry.save(self.model_name, self._model, n_training_frames=sum(len(e) for _, e in sources),
+                                                **criteria)
+        print(f"Saved {self.model_kind} model '{self.model_name}' v{self.model_version} to {self.registry.root}")
+        return self
+
+    @property
+    def model(self):
+        if self._model is None:
+            self.load_or_fit()
+        return self._model
+
+    def score(self, embeddings):
+        """Return (scores, flags) per embedding; lower scores are more anomalous."""
+        # Isolation Forest returns decision_function scores (negative for anomalies); the outlier
+        # flags (predict == -1) follow from the same scores, so the model is evaluated once
+        return score_embeddings(self.model, embeddings, self.chunk_frames, self.workers)
+
+    def streaming(self, cell_geometries=(), baseline_kind=ANOMALY_STREAMING_BASELINE, on_cell=None):
+        """A StreamingAnomalyScorer that scores frames with this scorer's detector as they arrive."""
+        baseline = build_streaming_baseline(baseline_kind, self.contamination, self.random_state)
+        return StreamingAnomalyScorer(self, cell_geometries, baseline, on_cell)
+
+    def score_transect(self, transect_id):
+        """Per-cell anomaly results for a transect, or None if its inputs are missing."""
+        embedding_filepath = self.embedding_path(transect_id)
+        metadata_filepath = self.metadata_path(transect_id)
+        if not os.path.exists(embedding_filepath):
+            print(f"  Embeddings not found for {transect_id}. Skipping anomaly detection for this transect.")
+            return None
+        if not os.path.exists(metadata_filepath):
+            print(f"  Metadata not found for {transect_id}. Cannot link anomalies to geospatial cells. Skipping.")
+            return None
+
+        embeddings_to_predict = self.store.embeddings(transect_id)
+        if embeddings_to_predict.size == 0:
+            print(f"  No embeddings found in file for {transect_id}. Skipping.")
+            return None
+
+        # Load geospatial metadata to align anomalies with cells
+        with open(metadata_filepath, 'r') as f:
+            cell_geometries = json.load(f)
+        frame_times = stored_frame_times(self.store, transect_id, len(embeddings_to_predict))
+        return self.score_cells(transect_id, embeddings_to_predict, cell_geometries, frame_times)[0]
+
+    def score_cells(self, transect_id, embeddings, cell_geometries, frame_times=None):
+        """Return (per-cell results, per-embedding scores, per-embedding flags)."""
+        anomaly_scores, anomaly_flags = self.score(embeddings)
+        print(f"  Calculated {len(anomaly_scores)} anomaly scores for {transect_id}.")
+        print(f"  Detected {np.sum(anomaly_flags)} anomalous segments ({np.sum(anomaly_flags)/len(anomaly_flags)*100:.2f}%)")
+        transect_anomaly_data = align_scores_to_cells(anomaly_scores, anomaly_flags, cell_geometries, frame_times)
+        return transect_anomaly_data, anomaly_scores, anomaly_flags
+
+    def save_results(self, transect_id, transect_anomaly_data):
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_json_filepath = self.output_path(transect_id)
+        with open(output_json_filepath, 'w') as f:
+            json.dump(transect_anomaly_data, f, indent=4)
+        print(f"  Anomaly results saved to: {output_json_filepath}")
+        return output_json_filepath
+
+    def process_transect(self, transect_id):
+        """Score one transect and save its results; returns the JSON path, or None."""
+        print(f"\nProcessing transect: {transect_id}")
+        transect_anomaly_data = self.score_transect(transect_id)
+        if transect_anomaly_data is None:
+            return None
+        return self.save_results(transect_id, transect_anomaly_data)
+
+    def process_in_memory(self, artifacts, persist=True):
+        """In-memory handoff: score artifacts["embeddings"] against artifacts["cells"].
+
+        Adds "anomalies" (per-cell results), "anomaly_scores" and "anomaly_flags" (per embedding)
+        to the artifacts; with persist, the JSON is written as well. Returns the per-cell results.
+        """
+        transect_id = artifacts["transect_id"]
+        print(f"\nProcessing transect (in memory): {transect_id}")
+        embeddings = artifacts.get("embeddings")
+        if embeddings is None or embeddings.size == 0:
+            print(f"  No embeddings for {transect_id}. Skipping.")
+            return None
+        transect_anomaly_data, anomaly_scores, anomaly_flags = self.score_cells(transect_id, embeddings, artifacts["cells"],
+                                                                                artifacts.get("embedding_times"))
+        artifacts.update(anomalies=transect_anomaly_data, anomaly_scores=anomaly_scores, anomaly_flags=anomaly_flags)
+        if persist:
+            self.save_results(transect_id, transect_anomaly_data)
+        return transect_anomaly_data
+
+    def run(self, transect_ids=None, on_complete=None):
+        """Score the given transects (default TRANSECTS_TO_ANALYZE); returns {transect_id: json_path or None}."""
+        transect_ids = TRANSECTS_TO_ANALYZE if transect_ids is None else transect_ids
+        print("\n--- Applying Anomaly Detection to all selected transects ---")
+        results = {}
+        for transect_id in transect_ids:
+            results[transect_id] = self.process_transect(transect_id)
+            if on_complete is not None:
+                on_complete(transect_id, results[transect_id])
+        print("\n--- Anomaly Detection Process Complete ---")
+        print(f"All anomaly results saved to: '{self.output_dir}'")
+        return results
+
+
+def run(transect_ids=None, on_complete=None):
+    """Pipeline entry point (see AnomalyScorer.run)."""
+    return AnomalyScorer().run(transect_ids, on_complete)
+
+
+if __name__ == "__main__":
+    run()
@@ -1,39 +1,27 @@
 # Cell 5: Interactive Folium Maps within Notebook
 
-import folium
 import json
 import os
 import numpy as np
 from pyproj import CRS, Transformer
-from IPython.display import display, HTML # For displaying maps in notebooks
 from config import (
     SONIFIED_AUDIO_BASE_DIR,
-    MOTIF_OUTPUT_DIR as ANOMALY_MOTIF_RESULTS_INPUT_DIR, ) 
-from config import BASE_DIR
-CHATGPT_OUTPUT_DIR = f"{BASE_DIR}/data/chatgpt_contextualizations"
-# --- Configuration & Data Paths (from your Cell 1 setup) ---
-# These variables should be available in your notebook's global scope
-# IF you have run Cell 1 correctly at the beginning of your session.
-# If you restart your kernel and run ONLY this cell, you'll need to copy
-# the definitions of SONIFIED_AUDIO_BASE_DIR, ANOMALY_MOTIF_RESULTS_INPUT_DIR,
-# CHATGPT_OUTPUT_DIR, and TRANSECT_FILE_PATHS from Cell 1 to here.
+    MOTIF_OUTPUT_DIR as ANOMALY_MOTIF_RESULTS_INPUT_DIR,
+    MAP_OUTPUT_DIR,
+    BASE_DIR,
+)
+# folium and IPython are imported where maps are built/displayed, so importing this module stays cheap.
 
-SONIFIED_AUDIO_BASE_DIR = "/kaggle/input/openai-competition-dataset/sonified_outputs"
-ANOMALY_MOTIF_RESULTS_INPUT_DIR = "motif_recognition_results"
-CHATGPT_OUTPUT_DIR = "chatgpt_contextualizations"
+CHATGPT_OUTPUT_DIR = f"{BASE_DIR}/data/chatgpt_contextualizations"
 
 # IMPORTANT: REPLACE "EPSG:XXXX" with the actual CRS reported by your Cell 5 output
 # (e.g., "EPSG:5356" if that was your detected master CRS).
 SOURCE_CRS = CRS("EPSG:5356") # WGS 84 / UTM zone 20S (Example, replace with your actual CRS)
 TARGET_CRS = CRS("EPSG:4326") # WGS84 Lat/Lon (Standard for Folium map)
 
-transformer = Transformer.from_crs(SOURCE_CRS, TARGET_CRS, always_xy=True)
-
-print("Setting up notebook-native mapping...")
-
 # --- Helper Functions (adapted from app.py, no Streamlit dependencies) ---
 
-def load_transect_data_notebook(transect_id):
+def load_transect_data_notebook(transect_id, audio_dir=SONIFIED_AUDIO_BASE_DIR, motif_dir=ANOMALY_MOTIF_RESULTS_INPUT_DIR, chatgpt_dir=CHATGPT_OUTPUT_DIR):
     """Loads all relevant data for a given transect for notebook display."""
     data = {
         'metadata': [],
@@ -43,7 +31,7 @@ def load_transect_data_notebook(transect_id):
     }
 
     # 1. Load Geospatial Metadata
-    metadata_path = os.path.join(SONIFIED_AUDIO_BASE_DIR, transect_id, f"{transect_id}_geospatial_metadata.json")
+    metadata_path = os.path.join(audio_dir, transect_id, f"{transect_id}_geospatial_metadata.json")
     if os.path.exists(metadata_path):
         try:
             with open(metadata_path, 'r') as f:
@@ -55,7 +43,7 @@ def load_transect_data_notebook(transect_id):
         print(f"Warning: Metadata not found for {transect_id} at {metadata_path}")
 
     # 2. Find Sonified Audio File (path only, for reference)
-    audio_base_path = os.path.join(SONIFIED_AUDIO_BASE_DIR, transect_id, f"{transect_id}_full_sonification_SOTA")
+    audio_base_path = os.path.join(audio_dir, transect_id, f"{transect_id}_full_sonification_SOTA")
     audio_path_archeo = f"{audio_base_path}_Archaeological.wav"
     audio_path_jungle = f"{audio_base_path}_Jungle.wav"
     if os.path.exists(audio_path_archeo):
@@ -64,7 +52,7 @@ def load_transect_data_notebook(transect_id):
         data['audio_path'] = audio_path_jungle
 
     # 3. Load Anomaly/Motif Results
-    motif_results_path = os.path.join(ANOMALY_MOTIF_RESULTS_INPUT_DIR, f"{transect_id}_motif_recognition_results.json")
+    motif_results_path = os.path.join(motif_dir, f"{transect_id}_motif_recognition_results.json")
     if os.path.exists(motif_results_path):
         try:
             with open(motif_results_path, 'r') as f:
@@ -76,19 +64,23 @@ def load_transect_data_notebook(transect_id):
         print(f"Warning: Motif results not found for {transect_id} at {motif_results_path}")
 
     # 4. Load ChatGPT Context
-    chatgpt_context_path = os.path.join(CHATGPT_OUTPUT_DIR, f"{transect_id}_chatgpt_context.txt")
-    if os.path.exists(chatgpt_context_path):
-        try:
-            with open(chatgpt_context_path, 'r', encoding='utf-8') as f:
-                data['chatgpt_context'] = f.read()
-        except Exception as e:
-            print(f"Warning: Error reading ChatGPT context for {transect_id}: {e}")
-            data['chatgpt_context'] = "Error loading contextualization."
-    else:
-        print(f"Warning: ChatGPT context not found for {transect_id} at {chatgpt_context_path}")
+    data['chatgpt_context'] = load_chatgpt_context(transect_id, chatgpt_dir)
 
     return data
 
+def load_chatgpt_context(transect_id, chatgpt_dir=CHATGPT_OUTPUT_DIR):
+    """Loads the ChatGPT contextualization text for a transect (a placeholder message if missing)."""
+    chatgpt_context_path = os.path.join(chatgpt_dir, f"{transect_id}_chatgpt_context.txt")
+    if not os.path.exists(chatgpt_context_path):
+        print(f"Warning: ChatGPT context not found for {transect_id} at {chatgpt_context_path}")
+        return "No contextualization available."
+    try:
+        with open(chatgpt_context_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception as e:
+        print(f"Warning: Error reading ChatGPT context for {transect_id}: {e}")
+        return "Error loading contextualization."
+
 def get_motif_info_for_cell_notebook(cell_idx, motif_results):
     """Retrieves motif matching info for a specific cell_id (index)."""
     for result in motif_results:
@@ -96,28 +88,58 @@ def get_motif_info_for_cell_notebook(cell_idx, motif_results):
             return result
     return None
 
-def get_transect_list_notebook():
+def get_transect_list_notebook(audio_dir=SONIFIED_AUDIO_BASE_DIR):
     """Dynamically gets the list of available transects from the audio output directory."""
-    if not os.path.exists(SONIFIED_AUDIO_BASE_DIR):
-        print(f"Warning: Base directory for sonified audio not found: {SONIFIED_AUDIO_BASE_DIR}")
+    if not os.path.exists(audio_dir):
+        print(f"Warning: Base directory for sonified audio not found: {audio_dir}")
         return []
-    transects = [d for d in os.listdir(SONIFIED_AUDIO_BASE_DIR) if os.path.isdir(os.path.join(SONIFIED_AUDIO_BASE_DIR, d))]
+    transects = [d for d in os.listdir(audio_dir) if os.path.isdir(os.path.join(audio_dir, d))]
     transects.sort()
     return transects
 
 
-# --- Main Loop to Generate and Display Maps ---
+def in_notebook():
+    """True when running under IPython/Jupyter, where maps can be displayed inline."""
+    try:
+        from IPython import get_ipython
+    except ImportError:
+        return False
+    return get_ipython() is not None
 
-processed_transect_ids = get_transect_list_notebook()
 
-if not processed_transect_ids:
-    print("No transect data found to display. Please ensure all previous pipeline steps have run successfully.")
-else:
-    print(f"Found {len(processed_transect_ids)} transects for visualization.")
+class MapRenderer:
+    """Map stage: cell metadata + motif results in, `{transect}_map.html` out.
 
-    for transect_id in processed_transect_ids:
-        print(f"\n--- Displaying Visualization for Transect: {transect_id} ---")
-        transect_data = load_transect_data_notebook(transect_id)
+    Maps are also displayed inline (with the ChatGPT contextualization) when `display_maps` is
+    true, which defaults to whether we are running in a notebook.
+    """
+
+    def __init__(self, audio_dir=SONIFIED_AUDIO_BASE_DIR, motif_dir=ANOMALY_MOTIF_RESULTS_INPUT_DIR, chatgpt_dir=CHATGPT_OUTPUT_DIR,
+                 output_dir=MAP_OUTPUT_DIR, source_crs=SOURCE_CRS, target_crs=TARGET_CRS, display_maps=None):
+        self.audio_dir = audio_dir
+        self.motif_dir = motif_dir
+        self.chatgpt_dir = chatgpt_dir
+        self.output_dir = output_dir
+        self.source_crs = source_crs
+        self.target_crs = target_crs
+        self.display_maps = in_notebook() if display_maps is None else display_maps
+        self._transformer = None
+
+    @property
+    def transformer(self):
+        if self._transformer is None:
+            self._transformer = Transformer.from_crs(self.source_crs, self.target_crs, always_xy=True)
+        return self._transformer
+
+    def output_path(self, transect_id):
+        return os.path.join(self.output_dir, f"{transect_id}_map.html")
+
+    def render(self, transect_id, transect_data=None):
+        """Build the Folium map for a transect; returns (map, transect_data)."""
+        import folium
+        if transect_data is None:
+            transect_data = load_transect_data_notebook(transect_id, self.audio_dir, self.motif_dir, self.chatgpt_dir)
+        transformer = self.transformer
 
         # Initialize Folium Map
         if transect_data['metadata']:
@@ -184,8 +206,11 @@ else:
                 print(f"Warning: Could not add cell {i} to map for {transect_id} due to coordinate transformation or other error: {e}")
 
         folium.LayerControl().add_to(m)
-        
-        # Display the map directly in the notebook output
+        return m, transect_data
+
+    def show(self, transect_id, m, transect_data):
+        """Display a rendered map and its ChatGPT contextualization inline in the notebook."""
+        from IPython.display import display, HTML # For displaying maps in notebooks
         print(f"### Interactive Map for {transect_id}:")
         display(m)
 
@@ -201,4 +226,62 @@ else:
             print("No ChatGPT contextualization available for this transect.")
         print("\n" + "="*80 + "\n") # Separator for different transects
 
-print("\nNotebook-native visualization process complete.")
\ No newline at end of file
+    def process_transect(self, transect_id):
+        """Render, save (and optionally display) one transect's map; returns the HTML path."""
+        print(f"\n--- Displaying Visualization for Transect: {transect_id} ---")
+        m, transect_data = self.render(transect_id)
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_html_path = self.output_path(transect_id)
+        m.save(output_html_path)
+        print(f"  Map saved to: {output_html_path}")
+        if self.display_maps:
+            self.show(transect_id, m, transect_data)
+        return output_html_path
+
+    def process_in_memory(self, artifacts, persist=True):
+        """In-memory handoff: map artifacts["cells"] and artifacts["motifs"] without re-reading JSON.
+
+        The HTML is written only with persist; returns the rendered map.
+        """
+        transect_id = artifacts["transect_id"]
+        print(f"\n--- Displaying Visualization for Transect: {transect_id} ---")
+        # The ChatGPT context is not produced by the pipeline, so it still comes from disk
+        transect_data = {
+            'metadata': artifacts.get("cells") or [],
+            'audio_path': artifacts.get("audio_path"),
+            'motif_results': artifacts.get("motifs") or [],
+            'chatgpt_context': load_chatgpt_context(transect_id, self.chatgpt_dir),
+        }
+        m, transect_data = self.render(transect_id, transect_data)
+        if persist:
+            os.makedirs(self.output_dir, exist_ok=True)
+            m.save(self.output_path(transect_id))
+            print(f"  Map saved to: {self.output_path(transect_id)}")
+        if self.display_maps:
+            self.show(transect_id, m, transect_data)
+        return m
+
+    def run(self, transect_ids=None, on_complete=None):
+        """Map the given transects (default: every sonified transect); returns {transect_id: html_path}."""
+        print("Setting up notebook-native mapping...")
+        transect_ids = get_transect_list_notebook(self.audio_dir) if transect_ids is None else list(transect_ids)
+        if not transect_ids:
+            print("No transect data found to display. Please ensure all previous pipeline steps have run successfully.")
+            return {}
+        print(f"Found {len(transect_ids)} transects for visualization.")
+        results = {}
+        for transect_id in transect_ids:
+            results[transect_id] = self.process_transect(transect_id)
+            if on_complete is not None:
+                on_complete(transect_id, results[transect_id])
+        print("\nNotebook-native visualization process complete.")
+        return results
+
+
+def run(transect_ids=None, on_complete=None):
+    """Pipeline entry point (see MapRenderer.run)."""
+    return MapRenderer().run(transect_ids, on_complete)
+
+
+if __name__ == "__main__":
+    run()
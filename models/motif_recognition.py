@@ -6,16 +6,16 @@ import glob
 import json
 from fastdtw import fastdtw # For efficient Dynamic Time Warping
 from scipy.spatial.distance import euclidean # For DTW distance metric
-from config import EMBEDDING_OUTPUT_DIR, ANOMALY_OUTPUT_DIR, MOTIF_OUTPUT_DIR
+from config import SONIFIED_AUDIO_BASE_DIR, EMBEDDING_OUTPUT_DIR, ANOMALY_OUTPUT_DIR, MOTIF_OUTPUT_DIR, DTW_SIMILARITY_THRESHOLD, EMBEDDING_STORE_DTYPE
+from models.anomaly_detection import TRANSFORMER_TRANSECTS, TRANSECTS_TO_ANALYZE
+from models.vggish_embedding import vggish_frame_times_ms, stored_frame_times
+from utils.embedding_store import EmbeddingStore, frame_ranges
 
 EMBEDDING_INPUT_DIR = EMBEDDING_OUTPUT_DIR
 ANOMALY_RESULTS_DIR = ANOMALY_OUTPUT_DIR
 
-os.makedirs(MOTIF_OUTPUT_DIR, exist_ok=True)
-
-# Use from config or define as before
+# Archaeological transects the motif library is drawn from (shared with the anomaly stage)
 ARCHAEOLOGICAL_MOTIF_TRANSECTS = TRANSFORMER_TRANSECTS
- # From your Cell 1 configuration
 
 # Define a placeholder for motifs and their types
 # In a real scenario, you would manually define precise time segments
@@ -52,16 +52,9 @@ ARCHAEOLOGICAL_MOTIFS_DEFINITIONS = {
     },
 }
 
-# Threshold for DTW similarity (lower means more similar)
-# This will require experimentation. Anomalies with DTW distance below this
-# might be considered a "match".
-DTW_SIMILARITY_THRESHOLD = 75 # This is a placeholder, tune based on your data
-
-
-print("Cell 4: Archaeological Signature Recognition Setup Complete.")
 
 # --- Helper function to get VGGish embeddings for a specific audio time range ---
-def get_vggish_embeddings_for_time_range(embeddings_array, audio_start_ms, audio_end_ms, total_audio_duration_ms):
+def get_vggish_embeddings_for_time_range(embeddings_array, audio_start_ms, audio_end_ms, total_audio_duration_ms, frame_times_ms=None):
     """
     Retrieves VGGish embeddings corresponding to a specific audio time range.
 
@@ -70,171 +63,173 @@ def get_vggish_embeddings_for_time_range(embeddings_array, audio_start_ms, audio
         audio_start_ms (int): Start time of the segment in milliseconds.
         audio_end_ms (int): End time of the segment in milliseconds.
         total_audio_duration_ms (int): Total duration of the full sonified audio in milliseconds.
+        frame_times_ms (np.ndarray): [start_ms, end_ms] per embedding, as saved by the embedding
+            stage (default: the nominal VGGish grid).
 
     Returns:
-        np.ndarray: VGGish embeddings for the specified time range.
+        np.ndarray: VGGish embeddings whose frames are centred in the specified time range.
     """
     if embeddings_array.size == 0 or total_audio_duration_ms == 0:
         return np.array([])
+    if frame_times_ms is None:
+        frame_times_ms = vggish_frame_times_ms(embeddings_array.shape[0], total_audio_duration_ms)
 
-    vggish_frame_length_s = 0.96
-    vggish_hop_length_s = 0.5
-    
-    # Calculate the start and end VGGish frame indices
-    # This is an approximation due to overlapping frames.
-    # A more precise method would involve aligning VGGish timestamps.
-    start_s = audio_start_ms / 1000.0
-    end_s = audio_end_ms / 1000.0
-
-    # Ensure indices are within bounds
-    num_total_embeddings = embeddings_array.shape[0]
-
-    # Approximate index calculation. VGGish frames are centered.
-    # An embedding at index `i` is roughly centered at `i * vggish_hop_length_s + vggish_frame_length_s / 2`
-    # This needs careful alignment for production, but this will work for a first pass.
-    start_embedding_idx = max(0, int((start_s - vggish_frame_length_s / 2) / vggish_hop_length_s))
-    end_embedding_idx = min(num_total_embeddings, int((end_s - vggish_frame_length_s / 2) / vggish_hop_length_s) + 1) # +1 to include the last partial frame
-
-    # If the time range is very short or at the very end, ensure at least one embedding is captured if possible
-    if start_embedding_idx >= num_total_embeddings:
+    # Frames are indexed directly by their timestamps
+    start_embedding_idx, end_embedding_idx = frame_ranges(frame_times_ms, audio_start_ms, audio_end_ms)
+    if end_embedding_idx <= start_embedding_idx:
         return np.array([])
-    if end_embedding_idx <= start_embedding_idx and start_embedding_idx < num_total_embeddings:
-        end_embedding_idx = start_embedding_idx + 1 # At least one embedding if within bounds
-
     return embeddings_array[start_embedding_idx:end_embedding_idx]
 
 
-# --- 1. Build Archaeological Motif Library ---
-print("\n--- Building Archaeological Motif Library ---")
-motif_library = {} # Stores {motif_type: [list_of_motif_embeddings]}
-
-for transect_id, motif_info in ARCHAEOLOGICAL_MOTIFS_DEFINITIONS.items():
-    motif_type = motif_info["motif_type"]
-    audio_start_ms = motif_info["audio_segment_start_ms"]
-    audio_end_ms = motif_info["audio_segment_end_ms"]
-
-    full_embedding_filepath = os.path.join(EMBEDDING_INPUT_DIR, f"{transect_id}_embeddings.npy")
-    full_metadata_filepath = os.path.join(SONIFIED_AUDIO_BASE_DIR, transect_id, f"{transect_id}_geospatial_metadata.json")
-    
-    if not os.path.exists(full_embedding_filepath) or not os.path.exists(full_metadata_filepath):
-        print(f"  Warning: Skipping motif '{motif_type}' from {transect_id}. Required files not found.")
-        continue
-
-    transect_embeddings = np.load(full_embedding_filepath)
-    
-    with open(full_metadata_filepath, 'r') as f:
-        cell_geometries = json.load(f)
-    
-    # Calculate total audio duration from the metadata
-    if cell_geometries:
-        total_audio_duration_ms = cell_geometries[-1]['audio_end_ms'] # Last cell's end time is total duration
-    else:
-        total_audio_duration_ms = 0
-
-    motif_embeddings = get_vggish_embeddings_for_time_range(
-        transect_embeddings, audio_start_ms, audio_end_ms, total_audio_duration_ms
-    )
-
-    if motif_embeddings.size > 0:
-        if motif_type not in motif_library:
-            motif_library[motif_type] = []
-        motif_library[motif_type].append(motif_embeddings)
-        print(f"  Added motif '{motif_type}' from {transect_id} ({motif_embeddings.shape[0]} embeddings).")
-    else:
-        print(f"  Warning: No VGGish embeddings found for specified motif time range in {transect_id} for '{motif_type}'.")
-
-if not motif_library:
-    print("ERROR: No archaeological motifs could be loaded. Cannot proceed with signature recognition.")
-    exit()
-
-# --- 2. Iterate Through Anomalies and Perform Motif Matching ---
-print("\n--- Performing Archaeological Signature Recognition (Motif Matching) ---")
-
-all_transect_motif_results = {}
-
-# Iterate over the anomaly results saved in the previous step
-# You will need to load the anomaly_results.json for each transect
-for transect_id in TRANSECTS_TO_ANALYZE:
-    anomaly_results_filepath = os.path.join(ANOMALY_RESULTS_DIR, f"{transect_id}_anomaly_results.json")
-    full_embedding_filepath = os.path.join(EMBEDDING_INPUT_DIR, f"{transect_id}_embeddings.npy")
-    full_metadata_filepath = os.path.join(SONIFIED_AUDIO_BASE_DIR, transect_id, f"{transect_id}_geospatial_metadata.json")
-
-    if not os.path.exists(anomaly_results_filepath) or \
-       not os.path.exists(full_embedding_filepath) or \
-       not os.path.exists(full_metadata_filepath):
-        print(f"  Skipping motif recognition for {transect_id}: Missing anomaly results, embeddings, or metadata.")
-        continue
-
-    with open(anomaly_results_filepath, 'r') as f:
-        anomaly_data_for_transect = json.load(f)
-    
-    transect_embeddings = np.load(full_embedding_filepath)
-    with open(full_metadata_filepath, 'r') as f:
-        cell_geometries = json.load(f)
-    
-    total_audio_duration_ms = cell_geometries[-1]['audio_end_ms'] if cell_geometries else 0
-
-    motif_matching_results_for_transect = []
-
-    for anomaly_cell_info in anomaly_data_for_transect:
-        if anomaly_cell_info["is_anomalous_flag"]:
-            cell_minx = anomaly_cell_info["minx"]
-            cell_miny = anomaly_cell_info["miny"]
-            cell_maxx = anomaly_cell_info["maxx"]
-            cell_maxy = anomaly_cell_info["maxy"]
-            cell_audio_start_ms = anomaly_cell_info["audio_start_ms"]
-            cell_audio_end_ms = anomaly_cell_info["audio_end_ms"]
-
-            # Get the VGGish embeddings for this anomalous cell's audio segment
-            anomaly_segment_embeddings = get_vggish_embeddings_for_time_range(
-                transect_embeddings, cell_audio_start_ms, cell_audio_end_ms, total_audio_duration_ms
-            )
+# DTW_SIMILARITY_THRESHOLD (from config): DTW distance below which an anomaly counts as a motif
+# "match" (lower means more similar). This will require experimentation.
 
-            best_match_motif_type = "Unknown"
-            best_match_dtw_distance = float('inf')
-
-            if anomaly_segment_embeddings.size > 0:
-                for motif_type, motif_embedding_list in motif_library.items():
-                    for single_motif_embeddings in motif_embedding_list:
-                        if single_motif_embeddings.size == 0:
-                            continue
-
-                        # Perform DTW comparison
-                        # Make sure both sequences have enough points for DTW
-                        if anomaly_segment_embeddings.shape[0] > 1 and single_motif_embeddings.shape[0] > 1:
-                            distance, path = fastdtw(anomaly_segment_embeddings, single_motif_embeddings, dist=euclidean)
-                        elif anomaly_segment_embeddings.shape[0] == 1 and single_motif_embeddings.shape[0] == 1:
-                            # If both are single embeddings, just use Euclidean distance
-                            distance = euclidean(anomaly_segment_embeddings[0], single_motif_embeddings[0])
-                        else:
-                            # Handle cases where one or both are too short for DTW
-                            # You might set a very high distance or skip
-                            distance = float('inf') # Set to infinity if comparison isn't meaningful
-
-                        if distance < best_match_dtw_distance:
-                            best_match_dtw_distance = distance
-                            best_match_motif_type = motif_type
-            
-            # Decide if it's a "match" based on a threshold
-            is_matched = best_match_dtw_distance < DTW_SIMILARITY_THRESHOLD
-
-            motif_matching_results_for_transect.append({
-                "cell_id": anomaly_cell_info["cell_id"],
-                "minx": cell_minx,
-                "miny": cell_miny,
-                "maxx": cell_maxx,
-                "maxy": cell_maxy,
-                "audio_start_ms": cell_audio_start_ms,
-                "audio_end_ms": cell_audio_end_ms,
-                "is_anomalous_flag": True, # It's an anomalous cell from previous stage
-                "mean_anomaly_score": anomaly_cell_info["mean_anomaly_score"],
-                "matched_motif_type": best_match_motif_type if is_matched else "No_Match",
-                "motif_similarity_score": float(best_match_dtw_distance) if best_match_dtw_distance != float('inf') else None,
-                "is_motif_matched": is_matched
-            })
-        else:
-            # Include non-anomalous cells in the output for completeness, but without motif matching
-            motif_matching_results_for_transect.append({
+
+def motif_distance(anomaly_segment_embeddings, single_motif_embeddings):
+    """DTW distance between two embedding sequences (Euclidean for single frames, inf if not comparable)."""
+    # Make sure both sequences have enough points for DTW
+    if anomaly_segment_embeddings.shape[0] > 1 and single_motif_embeddings.shape[0] > 1:
+        distance, path = fastdtw(anomaly_segment_embeddings, single_motif_embeddings, dist=euclidean)
+        return distance
+    if anomaly_segment_embeddings.shape[0] == 1 and single_motif_embeddings.shape[0] == 1:
+        # If both are single embeddings, just use Euclidean distance
+        return euclidean(anomaly_segment_embeddings[0], single_motif_embeddings[0])
+    # One or both are too short for DTW: the comparison isn't meaningful
+    return float('inf')
+
+
+def total_audio_duration_ms(cell_geometries):
+    # Last cell's end time is the total duration
+    return cell_geometries[-1]['audio_end_ms'] if cell_geometries else 0
+
+
+class MotifMatcher:
+    """Motif recognition stage: anomaly results + embeddings in, `{transect}_motif_recognition_results.json` out.
+
+    The motif library is built from ARCHAEOLOGICAL_MOTIFS_DEFINITIONS the first time it is needed.
+    """
+
+    def __init__(self, motif_definitions=ARCHAEOLOGICAL_MOTIFS_DEFINITIONS, similarity_threshold=DTW_SIMILARITY_THRESHOLD,
+                 embedding_dir=EMBEDDING_INPUT_DIR, anomaly_dir=ANOMALY_RESULTS_DIR, metadata_dir=SONIFIED_AUDIO_BASE_DIR,
+                 output_dir=MOTIF_OUTPUT_DIR):
+        self.motif_definitions = motif_definitions
+        self.similarity_threshold = similarity_threshold
+        self.embedding_dir = embedding_dir
+        self.anomaly_dir = anomaly_dir
+        self.metadata_dir = metadata_dir
+        self.output_dir = output_dir
+        self.store = EmbeddingStore(embedding_dir, EMBEDDING_STORE_DTYPE)
+        self._library = None
+
+    def embedding_path(self, transect_id):
+        return self.store.embeddings_path(transect_id)
+
+    def metadata_path(self, transect_id):
+        return os.path.join(self.metadata_dir, transect_id, f"{transect_id}_geospatial_metadata.json")
+
+    def anomaly_path(self, transect_id):
+        return os.path.join(self.anomaly_dir, f"{transect_id}_anomaly_results.json")
+
+    def output_path(self, transect_id):
+        return os.path.join(self.output_dir, f"{transect_id}_motif_recognition_results.json")
+
+    def build_library(self, artifacts_by_transect=None):
+        """Return {motif_type: [motif_embeddings, ...]}; raises ValueError if no motif could be loaded.
+
+        In-memory artifacts (with "embeddings" and "cells") are used in place of files when given.
+        """
+        print("\n--- Building Archaeological Motif Library ---")
+        artifacts_by_transect = artifacts_by_transect or {}
+        motif_library = {}
+        for transect_id, motif_info in self.motif_definitions.items():
+            motif_type = motif_info["motif_type"]
+            artifacts = artifacts_by_transect.get(transect_id) or {}
+            if artifacts.get("embeddings") is not None and artifacts.get("cells") is not None:
+                transect_embeddings, cell_geometries = artifacts["embeddings"], artifacts["cells"]
+                frame_times = artifacts.get("embedding_times")
+            else:
+                full_embedding_filepath = self.embedding_path(transect_id)
+                full_metadata_filepath = self.metadata_path(transect_id)
+                if not os.path.exists(full_embedding_filepath) or not os.path.exists(full_metadata_filepath):
+                    print(f"  Warning: Skipping motif '{motif_type}' from {transect_id}. Required files not found.")
+                    continue
+                # Memory-mapped: only the motif's frames are read
+                transect_embeddings = self.store.embeddings(transect_id)
+                frame_times = stored_frame_times(self.store, transect_id, len(transect_embeddings))
+                with open(full_metadata_filepath, 'r') as f:
+                    cell_geometries = json.load(f)
+
+            motif_embeddings = get_vggish_embeddings_for_time_range(
+                transect_embeddings, motif_info["audio_segment_start_ms"], motif_info["audio_segment_end_ms"],
+                total_audio_duration_ms(cell_geometries), frame_times
+            )
+            if motif_embeddings.size > 0:
+                motif_embeddings = np.array(motif_embeddings, dtype=np.float32) # Small copy; the library outlives the memory map
+                motif_library.setdefault(motif_type, []).append(motif_embeddings)
+                print(f"  Added motif '{motif_type}' from {transect_id} ({motif_embeddings.shape[0]} embeddings).")
+            else:
+                print(f"  Warning: No VGGish embeddings found for specified motif time range in {transect_id} for '{motif_type}'.")
+
+        if not motif_library:
+            print("ERROR: No archaeological motifs could be loaded. Cannot proceed with signature recognition.")
+            raise ValueError("No archaeological motifs could be loaded. Check ARCHAEOLOGICAL_MOTIFS_DEFINITIONS and embeddings.")
+        return motif_library
+
+    def prepare(self, artifacts_by_transect=None):
+        """(Re)build the motif library now, optionally from in-memory artifacts; returns self."""
+        self._library = self.build_library(artifacts_by_transect)
+        return self
+
+    @property
+    def library(self):
+        if self._library is None:
+            self._library = self.build_library()
+        return self._library
+
+    def best_match(self, anomaly_segment_embeddings):
+        """(motif_type, dtw_distance) of the closest library motif; ("Unknown", inf) if none compare."""
+        best_match_motif_type = "Unknown"
+        best_match_dtw_distance = float('inf')
+        if anomaly_segment_embeddings.size == 0:
+            return best_match_motif_type, best_match_dtw_distance
+        for motif_type, motif_embedding_list in self.library.items():
+            for single_motif_embeddings in motif_embedding_list:
+                if single_motif_embeddings.size == 0:
+                    continue
+                distance = motif_distance(anomaly_segment_embeddings, single_motif_embeddings)
+                if distance < best_match_dtw_distance:
+                    best_match_dtw_distance = distance
+                    best_match_motif_type = motif_type
+        return best_match_motif_type, best_match_dtw_distance
+
+    def match_transect(self, transect_id):
+        """Per-cell motif results for a transect, or None if its inputs are missing."""
+        anomaly_results_filepath = self.anomaly_path(transect_id)
+        full_embedding_filepath = self.embedding_path(transect_id)
+        full_metadata_filepath = self.metadata_path(transect_id)
+        if not os.path.exists(anomaly_results_filepath) or \
+           not os.path.exists(full_embedding_filepath) or \
+           not os.path.exists(full_metadata_filepath):
+            print(f"  Skipping motif recognition for {transect_id}: Missing anomaly results, embeddings, or metadata.")
+            return None
+
+        with open(anomaly_results_filepath, 'r') as f:
+            anomaly_data_for_transect = json.load(f)
+        # Memory-mapped: only the anomalous cells' frames are read
+        transect_embeddings = self.store.embeddings(transect_id)
+        frame_times = stored_frame_times(self.store, transect_id, len(transect_embeddings))
+        with open(full_metadata_filepath, 'r') as f:
+            cell_geometries = json.load(f)
+        return self.match_cells(anomaly_data_for_transect, transect_embeddings, cell_geometries, frame_times)
+
+    def match_cells(self, anomaly_data_for_transect, transect_embeddings, cell_geometries, frame_times=None):
+        """Per-cell motif results from anomaly results, the transect's embeddings (and their frame
+        timestamps) and its cells."""
+        transect_duration_ms = total_audio_duration_ms(cell_geometries)
+
+        motif_matching_results_for_transect = []
+        for anomaly_cell_info in anomaly_data_for_transect:
+            result = {
                 "cell_id": anomaly_cell_info["cell_id"],
                 "minx": anomaly_cell_info["minx"],
                 "miny": anomaly_cell_info["miny"],
@@ -242,20 +237,78 @@ for transect_id in TRANSECTS_TO_ANALYZE:
                 "maxy": anomaly_cell_info["maxy"],
                 "audio_start_ms": anomaly_cell_info["audio_start_ms"],
                 "audio_end_ms": anomaly_cell_info["audio_end_ms"],
-                "is_anomalous_flag": False,
+                "is_anomalous_flag": bool(anomaly_cell_info["is_anomalous_flag"]),
                 "mean_anomaly_score": anomaly_cell_info["mean_anomaly_score"],
-                "matched_motif_type": "Not_Anomalous",
-                "motif_similarity_score": None,
-                "is_motif_matched": False
-            })
-
-    all_transect_motif_results[transect_id] = motif_matching_results_for_transect
-
-    # Save the motif recognition results for the current transect
-    output_json_filepath = os.path.join(MOTIF_OUTPUT_DIR, f"{transect_id}_motif_recognition_results.json")
-    with open(output_json_filepath, 'w') as f:
-        json.dump(motif_matching_results_for_transect, f, indent=4)
-    print(f"  Motif recognition results saved to: {output_json_filepath}")
-
-print("\n--- Archaeological Signature Recognition Process Complete ---")
-print(f"All motif recognition results saved to: '{MOTIF_OUTPUT_DIR}'")
\ No newline at end of file
+            }
+            if anomaly_cell_info["is_anomalous_flag"]:
+                # Get the VGGish embeddings for this anomalous cell's audio segment
+                anomaly_segment_embeddings = get_vggish_embeddings_for_time_range(
+                    transect_embeddings, anomaly_cell_info["audio_start_ms"], anomaly_cell_info["audio_end_ms"], transect_duration_ms,
+                    frame_times
+                )
+                best_match_motif_type, best_match_dtw_distance = self.best_match(anomaly_segment_embeddings)
+                # Decide if it's a "match" based on a threshold
+                is_matched = best_match_dtw_distance < self.similarity_threshold
+                result.update({
+                    "matched_motif_type": best_match_motif_type if is_matched else "No_Match",
+                    "motif_similarity_score": float(best_match_dtw_distance) if best_match_dtw_distance != float('inf') else None,
+                    "is_motif_matched": bool(is_matched),
+                })
+            else:
+                # Non-anomalous cells are included for completeness, but without motif matching
+                result.update({"matched_motif_type": "Not_Anomalous", "motif_similarity_score": None, "is_motif_matched": False})
+            motif_matching_results_for_transect.append(result)
+        return motif_matching_results_for_transect
+
+    def process_transect(self, transect_id):
+        """Match one transect and save its results; returns the JSON path, or None."""
+        motif_matching_results_for_transect = self.match_transect(transect_id)
+        if motif_matching_results_for_transect is None:
+            return None
+        return self.save_results(transect_id, motif_matching_results_for_transect)
+
+    def process_in_memory(self, artifacts, persist=True):
+        """In-memory handoff: match artifacts["anomalies"] using artifacts["embeddings"] and ["cells"].
+
+        Adds "motifs" (per-cell results) to the artifacts; with persist, the JSON is written as well.
+        """
+        transect_id = artifacts["transect_id"]
+        if artifacts.get("anomalies") is None or artifacts.get("embeddings") is None:
+            print(f"  Skipping motif recognition for {transect_id}: Missing anomaly results or embeddings.")
+            return None
+        motif_matching_results_for_transect = self.match_cells(artifacts["anomalies"], artifacts["embeddings"], artifacts["cells"],
+                                                               artifacts.get("embedding_times"))
+        artifacts["motifs"] = motif_matching_results_for_transect
+        if persist:
+            self.save_results(transect_id, motif_matching_results_for_transect)
+        return motif_matching_results_for_transect
+
+    def save_results(self, transect_id, motif_matching_results_for_transect):
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_json_filepath = self.output_path(transect_id)
+        with open(output_json_filepath, 'w') as f:
+            json.dump(motif_matching_results_for_transect, f, indent=4)
+        print(f"  Motif recognition results saved to: {output_json_filepath}")
+        return output_json_filepath
+
+    def run(self, transect_ids=None, on_complete=None):
+        """Match the given transects (default TRANSECTS_TO_ANALYZE); returns {transect_id: json_path or None}."""
+        transect_ids = TRANSECTS_TO_ANALYZE if transect_ids is None else transect_ids
+        print("\n--- Performing Archaeological Signature Recognition (Motif Matching) ---")
+        results = {}
+        for transect_id in transect_ids:
+            results[transect_id] = self.process_transect(transect_id)
+            if on_complete is not None:
+                on_complete(transect_id, results[transect_id])
+        print("\n--- Archaeological Signature Recognition Process Complete ---")
+        print(f"All motif recognition results saved to: '{self.output_dir}'")
+        return results
+
+
+def run(transect_ids=None, on_complete=None):
+    """Pipeline entry point (see MotifMatcher.run)."""
+    return MotifMatcher().run(transect_ids, on_complete)
+
+
+if __name__ == "__main__":
+    run()
@@ -1,9 +1,8 @@
 #Cell 1: Setup & Global Configuration
 import rasterio
 import numpy as np
+from numpy.lib import recfunctions # Packs feature rows for cell audio cache keys
 import soundfile as sf # For efficient reading/writing of WAV data
-from pydub import AudioSegment # Primarily for per-cell segment creation and panning
-from pydub.effects import normalize, compress_dynamic_range # Will be used carefully or noted
 import os
 import glob
 import shutil # For cleaning up temporary directories
@@ -16,8 +15,14 @@ from pyproj import CRS, Transformer # For coordinate transformations
 import json # For saving geospatial metadata
 import rasterio.merge # For mosaicking DTM tiles
 import re # For regex to parse DTM file prefixes
+import zlib # Stable transect hash for per-cell RNG seeding
+import hashlib # Fingerprints of cached feature tables and cell audio keys
+import inspect # Source of the synthesis functions goes into the cell audio cache key
+import functools
+from concurrent.futures import ProcessPoolExecutor # For parallel sonification across transects/row bands
+from itertools import repeat
+from collections import deque # Bounded window of in-flight pool tasks
 from rasterio.transform import array_bounds # Import for calculating bounds from profile
-import os
 from config import (
     LIDAR_DTM_TILES_DIR,
     HYDRO_GLOBAL_BASE_DIR,
@@ -25,7 +30,28 @@ from config import (
     SONIFIED_AUDIO_BASE_DIR,
     AUDIO_SAMPLE_RATE,
     DURATION_PER_GRID_CELL,
+    SONIFICATION_WORKERS,
+    SONIFICATION_BANDS_PER_WORKER,
+    SONIFICATION_RANDOM_SEED,
+    SONIFICATION_BATCH_CELLS,
+    SONIFICATION_CUTOFF_BINS_PER_OCTAVE,
+    SONIFICATION_WINDOWED_READS,
+    SONIFICATION_STRIP_CELL_ROWS,
+    SONIFICATION_VIZ_MAX_DIM,
+    SONIFICATION_ANCILLARY_MODE,
+    SONIFICATION_CELL_CACHE,
+    SONIFICATION_CELL_CACHE_MAX_BYTES,
 )
+from utils.cell_features import (ANCILLARY_FIELDS, build_cell_feature_table, cell_grid_shape, load_feature_table, save_feature_table,
+                                 spectral_index_rasters)
+from utils.audio_utils import StreamingAudioWriter
+from utils.audio_cache import CellAudioCache
+from utils.grid_alignment import GridAlignmentIndex, alignment_index_key, load_or_build_alignment_index
+from utils.raster_strips import (Resampling, cell_grid_transform, decimated_shape, iter_row_strips, layer_window, mosaic_profile,
+                                 read_layer, read_mosaic_overview, read_mosaic_strip, reproject_nan_percent_to_cells,
+                                 reproject_to_cells, strip_bounds, window_profile)
+from utils.mixing import constant_power_gains, db_to_gain, overlay
+from utils.synth_kernels import adsr_envelope, click_template, fast_sine, glissando_table, rich_click_template, sine_bank, time_base
 
 # New: Class to store cell geometry and audio timing (Moved to global scope)
 class CellGeom:
@@ -71,15 +97,12 @@ AOI_CENTERS_DEGREES = {
 }
 
 # --- Output Directories ---
-output_audio_base_dir = "sonified_outputs" # Master output for all sonified WAVs
+# Directories are created on first use, so importing this module has no side effects.
+output_audio_base_dir = SONIFIED_AUDIO_BASE_DIR # Master output for all sonified WAVs (read by the embedding stage)
 output_viz_base_dir = "geospatial_visualizations" # Master output for all visualization images
 output_clipped_hydro_dir = "clipped_hydrosheds_50km" # Output for clipped HydroSHEDS files
 output_gee_exports_dir = "/kaggle/input/sonic-geetiffs-50km" # EXPECT GEE exports to be downloaded here in Kaggle datasets
 
-os.makedirs(output_audio_base_dir, exist_ok=True)
-os.makedirs(output_viz_base_dir, exist_ok=True)
-os.makedirs(output_clipped_hydro_dir, exist_ok=True)
-
 
 # --- Site Categorization for Sonification & Naming ---
 # THESE GLOBAL LISTS MUST BE DEFINED AT THE TOP LEVEL OF THE CELL
@@ -136,8 +159,6 @@ HYDRO_BOOST_GAIN_DB = 5.0
 # --- NEW: Global cache for CRS Transformers ---
 crs_transformers_cache = {}
 
-print("Cell 1: Setup & Global Configuration Complete.")
-
 
 # -----------------------------------------------------------------------------
 # Configuration & File Paths (YOU MUST UPDATE THESE PATHS TO YOUR ACTUAL FILES)
@@ -387,8 +408,6 @@ TRANSECT_FILE_PATHS = {
 # --- NEW: Global cache for CRS Transformers ---
 crs_transformers_cache = {}
 
-print("Cell 1: Setup & Global Configuration Complete.")
-
 
 # -----------------------------------------------------------------------------
 # Helper Functions for Audio Generation (Significantly Enhanced)
@@ -398,41 +417,20 @@ def midi_to_hz(midi_note):
 
 def generate_adsr_sine_wave(frequency, duration, amplitude, sample_rate=SAMPLE_RATE, attack=0.05, decay=0.1, sustain=0.7, release=0.1):
     total_samples = int(sample_rate * duration)
-    t = np.linspace(0, duration, total_samples, endpoint=False)
-    wave = amplitude * np.sin(2 * np.pi * frequency * t)
-    attack_samples = int(attack * sample_rate)
-    samples_after_attack = total_samples - attack_samples
-    decay_samples = int(decay * sample_rate)
-    release_samples = int(release * sample_rate)
-    sustain_samples = total_samples - attack_samples - decay_samples - release_samples
-
-    # CORRECTED: Multi-line if/else for clarity and to fix SyntaxError
-    if sustain_samples < 0:
-        sustain_samples = 0
-        release_samples = max(0, total_samples - attack_samples - decay_samples) # Ensure release_samples is not negative
-        # If still too short for attack+decay, scale them down
-        if attack_samples + decay_samples > total_samples:
-            attack_samples = int(total_samples * 0.5)
-            decay_samples = total_samples - attack_samples
-            release_samples = 0
-            sustain_samples = 0
-
-    envelope = np.zeros(total_samples)
-    if attack_samples > 0: envelope[:attack_samples] = np.linspace(0, 1, attack_samples)
-    else: envelope[:1] = 1.0
-
-    if decay_samples > 0: envelope[attack_samples : attack_samples + decay_samples] = np.linspace(1, sustain, decay_samples)
-    else: envelope[attack_samples : min(attack_samples + 1, total_samples)] = sustain # Instant decay, ensure bounds
-
-    envelope[attack_samples + decay_samples : attack_samples + decay_samples + sustain_samples] = sustain
-
-    if release_samples > 0: envelope[total_samples - release_samples:] = np.linspace(sustain, 0, release_samples)
-    else: envelope[-1:] = 0.0
-
-    return (wave * envelope).astype(np.float32)
-
-def generate_noise_wave(duration, amplitude, sample_rate=SAMPLE_RATE):
-    return (np.random.rand(int(sample_rate * duration)) * 2 - 1) * amplitude
+    t = time_base(total_samples, duration)
+    envelope = adsr_envelope(total_samples, sample_rate, attack, decay, sustain, release)
+    return (amplitude * np.sin(2 * np.pi * frequency * t) * envelope).astype(np.float32)
+
+def generate_adsr_sine_bank(frequencies, duration, amplitudes, sample_rate=SAMPLE_RATE, attack=0.05, decay=0.1, sustain=0.7, release=0.1):
+    # Sum of several sines sharing one ADSR envelope (chords, harmonic stacks), rendered as a batch.
+    total_samples = int(sample_rate * duration)
+    t = time_base(total_samples, duration)
+    envelope = adsr_envelope(total_samples, sample_rate, attack, decay, sustain, release)
+    return (sine_bank(frequencies, amplitudes, t) * envelope).astype(np.float32)
+
+def generate_noise_wave(duration, amplitude, sample_rate=SAMPLE_RATE, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    return (rng.random(int(sample_rate * duration)) * 2 - 1) * amplitude
 
 def butter_lowpass(cutoff, fs, order=5):
     nyquist = 0.5 * fs
@@ -440,8 +438,8 @@ def butter_lowpass(cutoff, fs, order=5):
     b, a = butter(order, normal_cutoff, btype='low', analog=False)
     return b, a
 
-def generate_filtered_noise(duration, amplitude, cutoff_freq, sample_rate=SAMPLE_RATE, order=4):
-    noise = generate_noise_wave(duration, amplitude, sample_rate)
+def generate_filtered_noise(duration, amplitude, cutoff_freq, sample_rate=SAMPLE_RATE, order=4, rng=None):
+    noise = generate_noise_wave(duration, amplitude, sample_rate, rng=rng)
     if cutoff_freq <= 0 or cutoff_freq >= sample_rate / 2: return noise
     b, a = butter_lowpass(cutoff_freq, sample_rate, order=order)
     filtered_noise = lfilter(b, a, noise)
@@ -450,23 +448,12 @@ def generate_filtered_noise(duration, amplitude, cutoff_freq, sample_rate=SAMPLE
     return filtered_noise.astype(np.float32)
 
 def generate_glissando(start_midi, end_midi, duration, amplitude, sample_rate=SAMPLE_RATE, attack=0.05, release=0.1):
-    start_freq = midi_to_hz(start_midi)
-    end_freq = midi_to_hz(end_midi)
     total_samples = int(sample_rate * duration)
-    t = np.linspace(0, duration, total_samples, endpoint=False)
-    frequencies = np.exp(np.linspace(np.log(start_freq), np.log(end_freq), total_samples))
-    wave = amplitude * np.sin(2 * np.pi * frequencies * t)
-    attack_samples = int(attack * sample_rate)
-    release_samples = int(release * sample_rate)
-    envelope = np.ones(total_samples)
-    envelope[:attack_samples] *= np.linspace(0, 1, attack_samples)
-    envelope[total_samples - release_samples:] *= np.linspace(1, 0, release_samples)
-    return (wave * envelope).astype(np.float32)
+    gliss = glissando_table(midi_to_hz(start_midi), midi_to_hz(end_midi), total_samples, duration, sample_rate, attack, release)
+    return (amplitude * gliss).astype(np.float32)
 
 def generate_click(duration, amplitude, sample_rate=SAMPLE_RATE):
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    click_wave = amplitude * np.exp(-500 * t) * np.sin(2 * np.pi * 5000 * t)
-    return click_wave.astype(np.float32)
+    return (amplitude * click_template(int(sample_rate * duration), duration)).astype(np.float32)
 
 def generate_pulse(bpm, duration, amplitude, sample_rate=SAMPLE_RATE, click_duration=0.05):
     bpm_scalar = bpm.item() if isinstance(bpm, np.ndarray) and bpm.size == 1 else float(bpm)
@@ -487,13 +474,11 @@ def generate_pulse(bpm, duration, amplitude, sample_rate=SAMPLE_RATE, click_dura
                 else: pulse_wave[start_idx:total_samples] += click[:total_samples - start_idx]
     return pulse_wave
 
-def generate_chord(root_midi, scale_midi, duration, amplitude, sample_rate=SAMPLE_RATE, chord_intervals=[0, 4, 7]):
-    chord_wave = np.zeros(int(sample_rate * duration), dtype=np.float32)
-    for interval in chord_intervals:
-        note_freq = midi_to_hz(root_midi + interval)
-        detune_factor = 1 + (np.random.rand() - 0.5) * 0.005
-        chord_wave += generate_adsr_sine_wave(note_freq * detune_factor, duration, amplitude / len(chord_intervals), sample_rate, attack=0.5, decay=0.8, sustain=0.4, release=0.5)
-    return chord_wave
+def generate_chord(root_midi, scale_midi, duration, amplitude, sample_rate=SAMPLE_RATE, chord_intervals=[0, 4, 7], rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    # One detune draw per note, in interval order, then all notes rendered as a single batch
+    note_freqs = [midi_to_hz(root_midi + interval) * (1 + (rng.random() - 0.5) * 0.005) for interval in chord_intervals]
+    return generate_adsr_sine_bank(note_freqs, duration, amplitude / len(chord_intervals), sample_rate, attack=0.5, decay=0.8, sustain=0.4, release=0.5)
 
 def calculate_slope(dem_array, resolution):
     if dem_array.size == 0 or np.all(np.isnan(dem_array)): return 0.0
@@ -514,6 +499,12 @@ def calculate_roughness(dem_array, window_size_pixels=3):
     roughness = np.nanstd(diff)
     return float(roughness)
 
+def cell_rng(transect_id, cell_row, cell_col, seed=SONIFICATION_RANDOM_SEED):
+    # Independent random stream per cell, derived from (global seed, transect, row, col), so a cell
+    # renders bit-identical audio regardless of run, worker count or processing order.
+    transect_key = zlib.crc32(transect_id.encode("utf-8"))
+    return np.random.default_rng(np.random.SeedSequence([seed, transect_key, int(cell_row), int(cell_col)]))
+
 def convert_float_to_int16(audio_array_float):
     # Ensure clipping to avoid overflow before converting to int16
     return (np.clip(audio_array_float, -1.0, 1.0) * 32767).astype(np.int16)
@@ -586,73 +577,188 @@ crs_transformers_cache = {}
 # -----------------------------------------------------------------------------
 # Helper Functions for data alignment and extraction (Moved from Main Loop for clarity)
 # -----------------------------------------------------------------------------
-def get_aligned_cell(raster_data, raster_profile, master_profile, row_idx, col_idx, pixels_per_grid_cell_master, processing_grid_size_meters):
-    # DEBUG_MODE = True # Uncomment to enable debug prints for this function
-    if False: # Use False by default unless you need to debug alignment
-        if raster_profile and raster_profile.get('crs'):
-            print(f"  Debug get_aligned_cell: Processing layer (CRS: {raster_profile['crs']}) for cell ({row_idx},{col_idx})")
-        else:
-            print(f"  Debug get_aligned_cell: Processing layer (No CRS info or data) for cell ({row_idx},{col_idx}). Returning empty.")
+def get_crs_transformer(src_crs, dst_crs):
+    # Cached always_xy pyproj Transformer, or None if it cannot be created.
+    transformer_key = (str(src_crs), str(dst_crs))
+    if transformer_key not in crs_transformers_cache:
+        try: crs_transformers_cache[transformer_key] = Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+        except Exception as e: print(f"Warning: Failed to create CRS transformer from {src_crs} to {dst_crs}: {e}. Returning empty array."); return None
+    return crs_transformers_cache[transformer_key]
+
+def get_alignment_index(raster_shape, raster_profile, master_profile, n_cell_rows, n_cell_cols, pixels_per_grid_cell, row_offset=0, index_cache_dir=None):
+    # Grid-alignment index of the master cell grid against one target raster, built with a single
+    # vectorized corner transform and cached on disk under index_cache_dir. None if the CRS pair
+    # cannot be transformed.
+    master_crs, target_crs = master_profile['crs'], raster_profile['crs']
+    transformer = None
+    if str(master_crs) != str(target_crs):
+        transformer = get_crs_transformer(master_crs, target_crs)
+        if transformer is None:
+            return None
+    key = alignment_index_key(master_crs, master_profile['transform'], pixels_per_grid_cell, n_cell_rows, n_cell_cols, row_offset,
+                              target_crs, raster_profile['transform'], raster_shape)
+    try:
+        return load_or_build_alignment_index(index_cache_dir, key, lambda: GridAlignmentIndex.build(
+            master_profile['transform'], pixels_per_grid_cell, n_cell_rows, n_cell_cols,
+            raster_profile['transform'], raster_shape, transformer=transformer, row_offset=row_offset))
+    except Exception as e:
+        print(f"Warning: Error building alignment index from {master_crs} to {target_crs}: {e}.")
+        return None
 
-    if raster_data is None or raster_profile is None or raster_profile.get('crs') is None:
-        if False: print(f"  Debug: get_aligned_cell - raster_data, raster_profile or CRS is None for cell ({row_idx},{col_idx}). Returning empty array.")
-        return np.array([])
+def get_aligned_window(raster_shape, raster_profile, master_profile, row_idx, col_idx, pixels_per_grid_cell_master):
+    # Returns the clamped (row_start, row_end, col_start, col_end) window of a target raster covering
+    # one master grid cell, or None if the cell falls outside the raster.
+    if raster_profile is None or raster_profile.get('crs') is None:
+        return None
 
     master_transform = master_profile['transform']
     master_min_x, master_max_y = master_transform * (col_idx, row_idx)
     master_max_x, master_min_y = master_transform * (col_idx + pixels_per_grid_cell_master, row_idx + pixels_per_grid_cell_master)
-    if False: print(f"  Debug: Master Cell Bounds (Master CRS {master_profile['crs']}): min_x={master_min_x:.2f}, min_y={master_min_y:.2f}, max_x={master_max_x:.2f}, max_y={master_max_y:.2f}")
 
-    transformer_key = (str(master_profile['crs']), str(raster_profile['crs']))
-    if transformer_key not in crs_transformers_cache:
-        try: crs_transformers_cache[transformer_key] = Transformer.from_crs(master_profile['crs'], raster_profile['crs'], always_xy=True)
-        except Exception as e: print(f"Warning: Failed to create CRS transformer from {master_profile['crs']} to {raster_profile['crs']}: {e}. Returning empty array."); return np.array([])
-    transformer = crs_transformers_cache[transformer_key]
+    transformer = get_crs_transformer(master_profile['crs'], raster_profile['crs'])
+    if transformer is None:
+        return None
 
     try:
         transformed_bounds = transformer.transform_bounds(master_min_x, master_min_y, master_max_x, master_max_y)
-        if False: print(f"  Debug: Transformed Cell Bounds (Target CRS {raster_profile['crs']}): {transformed_bounds}")
     except Exception as e:
         print(f"Warning: Error transforming bounds for cell ({row_idx},{col_idx}) from {master_profile['crs']} to {raster_profile['crs']}: {e}. Returning empty array.")
-        return np.array([])
+        return None
 
     try:
         window = rasterio.windows.from_bounds(*transformed_bounds, transform=raster_profile['transform'])
         window = window.round_offsets().round_lengths()
+    except rasterio.errors.WindowError:
+        return None
 
-        rows_limit = raster_data.shape[1] if raster_data.ndim > 2 else raster_data.shape[0]
-        cols_limit = raster_data.shape[2] if raster_data.ndim > 2 else raster_data.shape[1]
+    rows_limit, cols_limit = raster_shape[-2], raster_shape[-1]
+    window_col_start = max(0, window.col_off)
+    window_row_start = max(0, window.row_off)
+    window_col_end = min(cols_limit, window.col_off + window.width)
+    window_row_end = min(rows_limit, window.row_off + window.height)
 
-        window_col_start = max(0, window.col_off)
-        window_row_start = max(0, window.row_off)
-        window_col_end = min(cols_limit, window.col_off + window.width)
-        window_row_end = min(rows_limit, window.row_off + window.height)
+    if window_col_start >= window_col_end or window_row_start >= window_row_end:
+        return None
+    return window_row_start, window_row_end, window_col_start, window_col_end
 
-        if False:
-            print(f"  Debug: Target Raster Shape: ({rows_limit}, {cols_limit})")
-            print(f"  Debug: Clamped Window Coords: ({window_col_start}:{window_col_end}, {window_row_start}:{window_row_end})") # Corrected order for consistency
+def get_aligned_cell(raster_data, raster_profile, master_profile, row_idx, col_idx, pixels_per_grid_cell_master, processing_grid_size_meters):
+    if raster_data is None or raster_profile is None or raster_profile.get('crs') is None:
+        return np.array([])
 
-        if window_col_start >= window_col_end or window_row_start >= window_row_end:
-            if False: print(f"  Debug: Clamped window is empty/invalid for cell ({row_idx},{col_idx}) for {raster_profile.get('crs', 'Unknown CRS')}. Returning empty array.")
+    try:
+        window = get_aligned_window(raster_data.shape, raster_profile, master_profile, row_idx, col_idx, pixels_per_grid_cell_master)
+        if window is None:
             return np.array([])
+        window_row_start, window_row_end, window_col_start, window_col_end = window
 
         if raster_data.ndim > 2: extracted_data = raster_data[:, window_row_start:window_row_end, window_col_start:window_col_end]
         else: extracted_data = raster_data[window_row_start:window_row_end, window_col_start:window_col_end]
 
         if extracted_data.size == 0 or np.all(np.isnan(extracted_data)):
-            if False: print(f"  Debug: Extracted data is empty or all NaNs for cell ({row_idx},{col_idx}) from {raster_profile.get('crs', 'Unknown CRS')}. Returning empty array.")
             return np.array([])
-
-        if False: print(f"  Debug: Successfully extracted data shape: {extracted_data.shape}, is_nan: {np.any(np.isnan(extracted_data))}, min:{np.nanmin(extracted_data)}, max:{np.nanmax(extracted_data)}")
         return extracted_data
 
-    except rasterio.errors.WindowError as e:
-        if False: print(f"  Debug: WindowError for cell ({row_idx},{col_idx}) in {raster_profile.get('crs', 'Unknown CRS')}: {e}. Returning np.array([]).")
-        return np.array([])
     except Exception as e:
         print(f"Warning: Error extracting data for cell ({row_idx},{col_idx}) from {raster_profile.get('crs', 'Unknown CRS')}: {e}. Returning np.array([]).")
         return np.array([])
 
+def nanmean_or_nan(values):
+    # np.nanmean without the "Mean of empty slice" warning for empty/all-NaN windows
+    if values.size == 0 or np.all(np.isnan(values)): return np.nan
+    return np.nanmean(values)
+
+def reduce_ancillary_layers(data_rasters, src_profiles, master_profile, n_cell_rows, n_cell_cols, pixels_per_grid_cell, row_offset=0, index_cache_dir=None):
+    # Per-cell means of the satellite indices and hydro layers, as (n_cell_rows, n_cell_cols) arrays
+    # keyed like utils.cell_features.ANCILLARY_FIELDS. Spectral indices are computed once for the
+    # whole scene, and each source raster gets one grid-alignment index, so a cell's window is an
+    # array lookup rather than a pyproj call.
+    layers = {} # source key -> {feature name: 2D raster}
+    index_rasters = spectral_index_rasters(data_rasters.get('sat_30m_dry'))
+    sat_features = {'ndvi': 'mean_ndvi', 'evi': 'mean_evi', 'bsi': 'mean_bsi', 'brightness': 'mean_brightness', 'ndwi': 'mean_ndwi'}
+    if index_rasters and src_profiles.get('sat_30m_dry') is not None:
+        layers['sat_30m_dry'] = {sat_features[name]: raster for name, raster in index_rasters.items()}
+    for key, feature in [('hydro_dem', 'mean_hydro_dem'), ('hydro_flow_dir', 'mean_flow_dir'), ('hydro_flow_acc', 'mean_flow_acc')]:
+        if data_rasters.get(key) is not None and src_profiles.get(key) is not None:
+            layers[key] = {feature: data_rasters[key]}
+
+    ancillary = {name: np.full((n_cell_rows, n_cell_cols), missing, dtype=np.float64) for name, missing in ANCILLARY_FIELDS.items()}
+    alignment_indexes = {}
+    for key, rasters in layers.items():
+        some_raster = next(iter(rasters.values()))
+        alignment_indexes[key] = get_alignment_index(some_raster.shape, src_profiles[key], master_profile, n_cell_rows, n_cell_cols,
+                                                     pixels_per_grid_cell, row_offset=row_offset, index_cache_dir=index_cache_dir)
+    for cell_row in range(n_cell_rows):
+        for cell_col in range(n_cell_cols):
+            for key, rasters in layers.items():
+                if alignment_indexes[key] is None:
+                    continue
+                window = alignment_indexes[key].window(cell_row, cell_col)
+                if window is None:
+                    continue
+                r0, r1, c0, c1 = window
+                for feature, raster in rasters.items():
+                    values = raster[r0:r1, c0:c1]
+                    ancillary[feature][cell_row, cell_col] = nanmean_or_nan(values)
+                    if feature == 'mean_ndvi':
+                        ancillary['ndvi_nan_percent'][cell_row, cell_col] = get_nan_percentage(values)
+                    elif feature == 'mean_flow_acc':
+                        ancillary['flow_acc_nan_percent'][cell_row, cell_col] = get_nan_percentage(values)
+    return ancillary
+
+def reproject_ancillary_layers(data_rasters, src_profiles, master_profile, n_cell_rows, n_cell_cols, pixels_per_grid_cell, row_offset=0):
+    # Same output as reduce_ancillary_layers, but every layer is warped onto the cell grid in one
+    # rasterio.warp.reproject call: continuous layers and spectral indices use area averaging, flow
+    # direction uses the modal D8 code (averaging direction codes is meaningless), and NaN
+    # percentages come from averaging each layer's NaN mask.
+    cell_transform = cell_grid_transform(master_profile['transform'], pixels_per_grid_cell, row_offset)
+    cell_shape = (n_cell_rows, n_cell_cols)
+    ancillary = {name: np.full(cell_shape, missing, dtype=np.float64) for name, missing in ANCILLARY_FIELDS.items()}
+
+    def warp(raster, key, resampling=Resampling.average):
+        return reproject_to_cells(raster, src_profiles[key], cell_transform, master_profile['crs'], cell_shape, resampling)
+
+    def fill(feature, values):
+        covered = ~np.isnan(values)
+        ancillary[feature][covered] = values[covered]
+
+    if data_rasters.get('sat_30m_dry') is not None and src_profiles.get('sat_30m_dry') is not None:
+        index_rasters = spectral_index_rasters(data_rasters['sat_30m_dry'])
+        for name, feature in [('ndvi', 'mean_ndvi'), ('evi', 'mean_evi'), ('bsi', 'mean_bsi'), ('brightness', 'mean_brightness'), ('ndwi', 'mean_ndwi')]:
+            if name in index_rasters:
+                fill(feature, warp(index_rasters[name], 'sat_30m_dry'))
+        if 'ndvi' in index_rasters:
+            fill('ndvi_nan_percent', reproject_nan_percent_to_cells(index_rasters['ndvi'], src_profiles['sat_30m_dry'], cell_transform, master_profile['crs'], cell_shape))
+    for key, feature, resampling in [('hydro_dem', 'mean_hydro_dem', Resampling.average), ('hydro_flow_dir', 'mean_flow_dir', Resampling.mode),
+                                     ('hydro_flow_acc', 'mean_flow_acc', Resampling.average)]:
+        if data_rasters.get(key) is None or src_profiles.get(key) is None:
+            continue
+        fill(feature, warp(data_rasters[key], key, resampling))
+        if feature == 'mean_flow_acc':
+            fill('flow_acc_nan_percent', reproject_nan_percent_to_cells(data_rasters[key], src_profiles[key], cell_transform, master_profile['crs'], cell_shape))
+    return ancillary
+
+def ancillary_cell_layers(data_rasters, src_profiles, master_profile, n_cell_rows, n_cell_cols, pixels_per_grid_cell, row_offset=0, index_cache_dir=None):
+    # Per-cell ancillary values using SONIFICATION_ANCILLARY_MODE ("reproject" or "window").
+    if SONIFICATION_ANCILLARY_MODE == "window":
+        return reduce_ancillary_layers(data_rasters, src_profiles, master_profile, n_cell_rows, n_cell_cols, pixels_per_grid_cell,
+                                       row_offset=row_offset, index_cache_dir=index_cache_dir)
+    return reproject_ancillary_layers(data_rasters, src_profiles, master_profile, n_cell_rows, n_cell_cols, pixels_per_grid_cell, row_offset=row_offset)
+
+def feature_inputs_fingerprint(current_scenario_files):
+    # Hash of every input file (path, size, mtime) plus the settings that shape the feature table.
+    # A cached table is only reused while this fingerprint is unchanged.
+    files = list(current_scenario_files.get('dtm_tile_paths_list') or [])
+    files += [current_scenario_files.get(key) for key in ['sat_30m_dry', 'sat_30m_wet', 'hydro_dem', 'hydro_flow_dir', 'hydro_flow_acc']]
+    entries = []
+    for path in files:
+        if path and os.path.exists(path):
+            stat = os.stat(path)
+            entries.append([path, stat.st_size, stat.st_mtime_ns])
+        else:
+            entries.append([path, None, None])
+    settings = [PROCESSING_GRID_SIZE_METERS, SONIFICATION_ANCILLARY_MODE, SONIFICATION_WINDOWED_READS]
+    return hashlib.sha1(json.dumps([entries, settings]).encode("utf-8")).hexdigest()
+
 # Define generate_rich_pulse (placeholder if not defined elsewhere)
 def generate_rich_pulse(bpm, duration, amplitude, base_click_freq, sample_rate=SAMPLE_RATE, num_harmonics=3):
     total_samples = int(sample_rate * duration)
@@ -676,13 +782,8 @@ def generate_rich_pulse(bpm, duration, amplitude, base_click_freq, sample_rate=S
         click_duration_seg = min(0.05, duration - click_start_time) # Ensure click doesn't go beyond segment
         if click_duration_seg <= 0: continue
 
-        click_segment = np.zeros(int(click_duration_seg * sample_rate), dtype=np.float32)
-        for h in range(num_harmonics):
-            freq = base_click_freq * (h + 1)
-            # Apply a decaying envelope to each harmonic
-            t_click = np.linspace(0, click_duration_seg, len(click_segment), endpoint=False)
-            envelope = np.exp(-15 * t_click / click_duration_seg) # Faster decay
-            click_segment += amplitude / num_harmonics * np.sin(2 * np.pi * freq * t_click) * envelope
+        # All harmonics share one cached, decaying template; only the final click can be shorter
+        click_segment = (amplitude * rich_click_template(int(click_duration_seg * sample_rate), click_duration_seg, base_click_freq, num_harmonics)).astype(np.float32)
 
         start_sample = int(click_start_time * sample_rate)
         end_sample = start_sample + len(click_segment)
@@ -694,50 +795,463 @@ def generate_rich_pulse(bpm, duration, amplitude, base_click_freq, sample_rate=S
 
     return pulse_wave
 
-# -----------------------------------------------------------------------------
-# Main Processing Loop
-# -----------------------------------------------------------------------------
-
-# Define ARCHAEOLOGICAL_TRANSECTS and JUNGLE_TRANSECTS (already defined globally at the top of the cell)
 DEBUG_MODE = False
 
-for current_transect_id in TRANSECTS_TO_PROCESS:
-    print(f"\n--- Processing Transect: {current_transect_id} ---")
-
-    current_scenario_files = TRANSECT_FILE_PATHS.get(current_transect_id)
-    if not current_scenario_files:
-        print(f"ERROR: File paths not defined for transect '{current_transect_id}'. Skipping.")
-        continue
-
-    output_audio_current_transect_dir = os.path.join(output_audio_base_dir, current_transect_id)
-    os.makedirs(output_audio_current_transect_dir, exist_ok=True)
-
-    # Create a temporary directory for audio chunks within the transect's output folder
-    temp_audio_chunks_dir = os.path.join(output_audio_current_transect_dir, "temp_audio_chunks")
-    os.makedirs(temp_audio_chunks_dir, exist_ok=True)
+# -----------------------------------------------------------------------------
+# Per-cell synthesis (reads one row of the feature table; safe to run in worker processes)
+# -----------------------------------------------------------------------------
+# Helper for ensuring consistent array lengths for mixing
+def ensure_length(arr, target_len):
+    if len(arr) < target_len:
+        return np.pad(arr, (0, target_len - len(arr)), 'constant')
+    elif len(arr) > target_len:
+        return arr[:target_len]
+    return arr
+
+# D8 flow directions: 1 (E), 2 (NE), 4 (N), 8 (NW), 16 (W), 32 (SW), 64 (S), 128 (SE)
+# mapped to pan (-1.0 for hard left, 1.0 for hard right)
+FLOW_DIR_PAN = {1: 1.0, 2: 0.7, 4: 0.0, 8: -0.7, 16: -1.0, 32: -0.7, 64: 0.0, 128: 0.7}
+
+# Anomaly regions (example coordinates based on your problem description's approximate areas),
+# as (first_row, end_row, first_col, end_col) in cell units
+ANOMALY_REGIONS = {
+    'BR_AC_10': (4, 9, 6, 11),
+    'BR_RO_05': (10, 15, 12, 17),
+    'BR_PA_02': (25, 30, 8, 13),
+    'BR_AC_07': (5, 10, 5, 10),
+    'BR_AC_09': (7, 12, 7, 12),
+}
+ANOMALY_NONE, ANOMALY_ARCHAEOLOGICAL, ANOMALY_JUNGLE = 0, 1, 2
+
+NUM_BASS_HARMONICS = 3
+NUM_NOISE_LAYERS = 3 # Layer multiple noise instances for richness
+NUM_CHORD_HITS = 2 # Number of times the chord will be struck per cell
+MAX_CHORD_NOTES = 4 # Root, third, fifth, seventh
+LAYER_NAMES = ("topo", "dtm_perc", "roughness", "melody", "hydro")
+
+# Per-cell synthesis parameters: one row per cell, mapped from the feature table (and the cell's
+# RNG) so that whole batches of cells can be rendered with array operations.
+CELL_SYNTH_PARAM_DTYPE = np.dtype([
+    ("is_valid", np.bool_),
+    ("base_freq_low", np.float64), ("filter_mod_depth", np.float64), ("filter_mod_rate", np.float64),
+    ("pulse_bpm", np.float64), ("pulse_amplitude", np.float64), ("click_base_freq", np.float64),
+    ("noise_cutoff_freqs", np.float64, (NUM_NOISE_LAYERS,)), ("noise_amplitude", np.float64),
+    ("melody_root_midi", np.float64), ("chord_amplitude", np.float64), ("chord_size", np.int32),
+    ("chord_freqs", np.float64, (NUM_CHORD_HITS, MAX_CHORD_NOTES)),
+    ("hydro_drone_freq", np.float64), ("hydro_drone_amplitude", np.float64),
+    ("gains_db", np.float64, (len(LAYER_NAMES),)), ("pan", np.float64), ("anomaly", np.int8),
+])
+
+def anomaly_kind(current_transect_id, cell_row_index, cell_col_index):
+    # Anomaly Detection and Sonification (Archaeological vs. Jungle)
+    region = ANOMALY_REGIONS.get(current_transect_id)
+    if region is None:
+        return ANOMALY_NONE
+    first_row, end_row, first_col, end_col = region
+    if not (first_row <= cell_row_index < end_row and first_col <= cell_col_index < end_col):
+        return ANOMALY_NONE
+    if current_transect_id in ARCHAEOLOGICAL_TRANSECTS:
+        return ANOMALY_ARCHAEOLOGICAL
+    if current_transect_id in JUNGLE_TRANSECTS:
+        return ANOMALY_JUNGLE
+    return ANOMALY_NONE
+
+def map_cell_parameters(cell, current_transect_id, pixels_per_grid_cell, rng):
+    # Maps one feature-table row to its synthesis parameters (a dict of CELL_SYNTH_PARAM_DTYPE fields).
+    # Every scalar random draw for the cell is made here, in a fixed order; the noise layers are
+    # drawn afterwards from the same generator by synthesize_cells.
+    row_idx = int(cell['row_off']); col_idx = int(cell['col_off'])
+    cell_row_index = row_idx // pixels_per_grid_cell; cell_col_index = col_idx // pixels_per_grid_cell
+    mean_ndvi = cell['mean_ndvi']; mean_evi = cell['mean_evi']; mean_ndwi = cell['mean_ndwi']
+
+    print(f"    Cell R{cell_row_index}_C{cell_col_index}: "
+          f"DTM NaN={cell['dtm_nan_percent']:.1f}%, NDVI NaN={cell['ndvi_nan_percent']:.1f}%, FlowAcc NaN={cell['flow_acc_nan_percent']:.1f}%, NDWI={mean_ndwi:.2f}")
+
+    if not cell['is_valid']:
+        print(f"    !!! Cell R{cell_row_index}_C{cell_col_index} is INVALID - generating silent audio. !!!")
+        return {'is_valid': False}
+
+    mean_elevation = cell['mean_elevation']; std_dev_elevation = cell['std_elevation']
+    mean_slope = cell['mean_slope']; mean_roughness = cell['mean_roughness']
+    mean_flow_acc = cell['mean_flow_acc']; mean_hydro_dem = cell['mean_hydro_dem']; mean_flow_dir = cell['mean_flow_dir']
+
+
+    # Sonification parameter mapping
+    clipped_ndvi = np.clip(mean_ndvi, -0.2, 0.8); ndvi_normalized_for_pitch = np.interp(clipped_ndvi, [-0.2, 0.8], [0.0, 1.0])
+    pitch_interpolation_factor = 1.0 - ndvi_normalized_for_pitch # Invert for lower NDVI = higher pitch
+    current_base_freq_min_midi = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_NDVI_PITCH_LOW_MIN_MIDI, GLOBAL_NDVI_PITCH_HIGH_MIN_MIDI])
+    current_base_freq_max_midi = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_NDVI_PITCH_LOW_MAX_MIDI, GLOBAL_NDVI_PITCH_HIGH_MAX_MIDI])
+    current_base_freq_min_hz = midi_to_hz(current_base_freq_min_midi); current_base_freq_max_hz = midi_to_hz(current_base_freq_max_midi)
+    current_scale = MAJOR_SCALE_MIDI if pitch_interpolation_factor > 0.5 else MINOR_PENTATONIC_MIDI
+    current_roughness_filter_min = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_ROUGHNESS_FILTER_LOW_MIN, GLOBAL_ROUGHNESS_FILTER_HIGH_MIN])
+    current_roughness_filter_max = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_ROUGHNESS_FILTER_LOW_MAX, GLOBAL_ROUGHNESS_FILTER_HIGH_MAX])
+    current_hydro_drone_freq_min = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_HYDRO_DRONE_LOW_MIN, GLOBAL_HYDRO_DRONE_HIGH_MIN])
+    current_hydro_drone_freq_max = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_HYDRO_DRONE_LOW_MAX, GLOBAL_HYDRO_DRONE_HIGH_MAX])
+
+    params = {'is_valid': True}
+
+    # 1. Topography Bass/Drone (Elevation)
+    params['base_freq_low'] = np.interp(mean_elevation, [0, 500], [current_base_freq_min_hz, current_base_freq_max_hz])
+    params['filter_mod_depth'] = np.interp(std_dev_elevation, [0, 20], [0, 0.2]); params['filter_mod_rate'] = 0.5 + rng.random() * 1.5
+
+    # 2. Slope Percussion / Rhythmic Element
+    params['pulse_bpm'] = np.interp(mean_slope, [0, 45], [60, 180]); params['pulse_amplitude'] = np.interp(mean_slope, [0, 45], [0.0, 0.4])
+    params['click_base_freq'] = np.interp(mean_roughness, [0, 10], [current_roughness_filter_min, current_roughness_filter_max])
+
+    # 3. Roughness Texture (Filtered Noise)
+    noise_cutoff_freq = np.interp(mean_roughness, [0, 10], [current_roughness_filter_min, current_roughness_filter_max])
+    params['noise_amplitude'] = np.interp(std_dev_elevation, [0, 20], [0.0, 0.4])
+    params['noise_cutoff_freqs'] = [noise_cutoff_freq * (1 + (rng.random() - 0.5) * 0.1) for _ in range(NUM_NOISE_LAYERS)] # Slight detuning for depth
+
+    # 4. NDVI/EVI Melody/Chord Layer
+    scaled_ndvi_midi_for_melody = np.interp(ndvi_normalized_for_pitch, [0.0, 1.0], [current_base_freq_min_midi, current_base_freq_max_midi])
+    # Snap to nearest note in the current scale
+    closest_scale_note_midi_relative = current_scale[np.argmin(np.abs(np.array(current_scale) % 12 - (scaled_ndvi_midi_for_melody % 12)))]
+    target_octave = int(scaled_ndvi_midi_for_melody // 12)
+    melody_root_midi = closest_scale_note_midi_relative + target_octave * 12
+    params['melody_root_midi'] = melody_root_midi
+
+    evi_chord_density = np.interp(mean_evi, [0.0, 0.8], [0, 1])
+    chord_intervals = [0] # Always include the root
+    if evi_chord_density > 0.3: chord_intervals.append(rng.choice([3,4])); # Minor or Major third
+    if evi_chord_density > 0.6: chord_intervals.append(7); # Perfect fifth
+    if evi_chord_density > 0.8: chord_intervals.append(10) # Minor seventh for more complex chords
+    params['chord_size'] = len(chord_intervals)
+    params['chord_amplitude'] = np.interp(mean_ndvi, [0.0, 0.8], [0.3, 0.6])
+    # Each hit re-detunes every note of the chord; unused note slots stay at 0 Hz / 0 amplitude
+    chord_freqs = np.zeros((NUM_CHORD_HITS, MAX_CHORD_NOTES))
+    for hit in range(NUM_CHORD_HITS):
+        for note, interval in enumerate(chord_intervals):
+            chord_freqs[hit, note] = midi_to_hz(melody_root_midi + interval) * (1 + (rng.random() - 0.5) * 0.005)
+    params['chord_freqs'] = chord_freqs
+
+    # 5. Hydrological Drone (Flow Accumulation and DEM)
+    log_flow_acc_scaled = np.interp(np.log1p(mean_flow_acc), [0, np.log1p(100000)], [0.0, 1.0]) # Log scale for large range
+    hydro_drone_freq = np.interp(mean_hydro_dem, [0, 200], [current_hydro_drone_freq_min, current_hydro_drone_freq_max])
+    params['hydro_drone_amplitude'] = log_flow_acc_scaled * 0.6
+    pitch_bend = (rng.random() - 0.5) * 0.02 # Small random pitch variation
+    params['hydro_drone_freq'] = hydro_drone_freq * (1 + pitch_bend)
+
+    # Apply gain adjustments based on water body detection (NDWI)
+    gain_topo, gain_dtm_perc, gain_roughness, gain_melody, gain_hydro = 0.0, 0.0, 0.0, 0.0, -5 # Default gains
+    if mean_ndwi > NDWI_WATER_THRESHOLD:
+        print(f"        !!! Water body detected (NDWI={mean_ndwi:.2f}) - suppressing other layers and boosting hydro. !!!")
+        gain_topo = WATER_BODY_SUPPRESSION_GAIN_DB
+        gain_dtm_perc = WATER_BODY_SUPPRESSION_GAIN_DB
+        gain_roughness = WATER_BODY_SUPPRESSION_GAIN_DB
+        gain_melody = WATER_BODY_SUPPRESSION_GAIN_DB
+        gain_hydro = HYDRO_BOOST_GAIN_DB # Boost hydro for water bodies
+    else: # Default gains for non-water areas
+        gain_topo, gain_dtm_perc, gain_roughness, gain_melody = -6, -12, -9, -4 # Fine-tune these for overall mix
+    params['gains_db'] = [gain_topo, gain_dtm_perc, gain_roughness, gain_melody, gain_hydro]
+
+    # Panning based on flow direction (simplified for effect)
+    params['pan'] = FLOW_DIR_PAN.get(mean_flow_dir, 0.0) if mean_flow_dir > 0 else 0.0
+
+    params['anomaly'] = anomaly_kind(current_transect_id, cell_row_index, cell_col_index)
+    if params['anomaly'] == ANOMALY_ARCHAEOLOGICAL:
+        print(f"    !!! ANOMALY TRIGGERED and PIERCING PING ADDED for {current_transect_id} at cell R{cell_row_index}_C{cell_col_index} !!!")
+    elif params['anomaly'] == ANOMALY_JUNGLE:
+        print(f"    !!! ANOMALY TRIGGERED (Jungle type - subtle) for {current_transect_id} at cell R{cell_row_index}_C{cell_col_index} !!!")
+    return params
+
+def build_synthesis_params(cells, current_transect_id, pixels_per_grid_cell):
+    # Returns (params, rngs): a CELL_SYNTH_PARAM_DTYPE array with one row per cell, plus each
+    # cell's generator, positioned just after its scalar draws.
+    params = np.zeros(len(cells), dtype=CELL_SYNTH_PARAM_DTYPE)
+    rngs = []
+    for i, cell in enumerate(cells):
+        rng = cell_rng(current_transect_id, cell['cell_row'], cell['cell_col'])
+        for field, value in map_cell_parameters(cell, current_transect_id, pixels_per_grid_cell, rng).items():
+            params[field][i] = value
+        rngs.append(rng)
+    return params, rngs
+
+def quantize_cutoffs(cutoff_freqs, bins_per_octave=SONIFICATION_CUTOFF_BINS_PER_OCTAVE):
+    # Snaps cutoffs to a log-frequency grid so cells can share one filter; None keeps them exact.
+    cutoff_freqs = np.asarray(cutoff_freqs, dtype=np.float64)
+    if bins_per_octave is None:
+        return cutoff_freqs
+    positive = cutoff_freqs > 0
+    quantized = cutoff_freqs.copy()
+    quantized[positive] = 2.0 ** (np.round(np.log2(cutoff_freqs[positive]) * bins_per_octave) / bins_per_octave)
+    return quantized
+
+def generate_filtered_noise_batch(noise, amplitudes, cutoff_freqs, sample_rate=SAMPLE_RATE, order=4, bins_per_octave=SONIFICATION_CUTOFF_BINS_PER_OCTAVE):
+    # Batched generate_filtered_noise for an (N, samples) matrix of white noise already scaled to
+    # `amplitudes`. Rows sharing a (quantized) cutoff go through one lfilter call along axis=1 and
+    # are then peak-normalized back to their amplitude; out-of-range cutoffs pass noise through.
+    cutoff_freqs = quantize_cutoffs(cutoff_freqs, bins_per_octave)
+    amplitudes = np.asarray(amplitudes, dtype=np.float64)
+    filtered_noise = np.array(noise, dtype=np.float32)
+    filterable = (cutoff_freqs > 0) & (cutoff_freqs < sample_rate / 2)
+    for cutoff_freq in np.unique(cutoff_freqs[filterable]):
+        rows = np.flatnonzero(filterable & (cutoff_freqs == cutoff_freq))
+        b, a = butter_lowpass(cutoff_freq, sample_rate, order=order)
+        filtered = lfilter(b, a, noise[rows], axis=1)
+        peaks = np.max(np.abs(filtered), axis=1)
+        scale = np.ones_like(peaks)
+        np.divide(amplitudes[rows], peaks, out=scale, where=peaks > 1e-6)
+        filtered_noise[rows] = filtered * scale[:, None]
+    return filtered_noise
+
+def synthesize_cells(params, rngs, sample_rate=SAMPLE_RATE, duration=DURATION_PER_GRID_CELL):
+    # Batch synthesis: renders the five layers for N cells as (N, samples) float32 arrays and
+    # mixes them with each cell's gains. Returns the (N, samples) float32 mono mix (invalid cells are silent).
+    total_cell_samples = int(sample_rate * duration)
+    n_cells = len(params)
+    mixed_cells = np.zeros((n_cells, total_cell_samples), dtype=np.float32)
+    valid = np.flatnonzero(params['is_valid'])
+    if len(valid) == 0:
+        return mixed_cells
+    p = params[valid]
+    t = time_base(total_cell_samples, duration)
+    gains = db_to_gain(p['gains_db']).astype(np.float32)
+    mix = np.zeros((len(valid), total_cell_samples), dtype=np.float32)
+
+    def column(values):
+        # Per-cell scalars as a float32 (N, 1) column that broadcasts over samples.
+        return np.asarray(values, dtype=np.float32)[:, None]
+
+    # 1. Topography Bass/Drone: three harmonics under one envelope, with a slow amplitude wobble
+    bass_freqs = p['base_freq_low'][:, None] * np.array([0.5, 1.0, 1.5])
+    bass_envelope = adsr_envelope(total_cell_samples, sample_rate, 0.8, 1.0, 0.7, 1.0).astype(np.float32)
+    topography_bass = fast_sine(bass_freqs[:, 0, None] * t)
+    for k in range(1, NUM_BASS_HARMONICS):
+        topography_bass += fast_sine(bass_freqs[:, k, None] * t)
+    topography_bass *= bass_envelope * np.float32(0.4 / NUM_BASS_HARMONICS)
+    topography_bass *= 1 + column(p['filter_mod_depth']) * fast_sine(p['filter_mod_rate'][:, None] * t)
+    mix += topography_bass * column(gains[:, 0])
+    del topography_bass
+
+    # 2. Slope Percussion: clicks come from cached templates, so each cell is a few slice-adds
+    for i, (bpm, amplitude, click_freq) in enumerate(zip(p['pulse_bpm'], p['pulse_amplitude'], p['click_base_freq'])):
+        mix[i] += generate_rich_pulse(bpm, duration, amplitude, click_freq, sample_rate=sample_rate) * gains[i, 1]
+
+    # 3. Roughness Texture: all noise layers of the batch filtered together
+    noise_amplitudes = np.repeat(p['noise_amplitude'] / NUM_NOISE_LAYERS, NUM_NOISE_LAYERS)
+    white_noise = np.empty((len(valid) * NUM_NOISE_LAYERS, total_cell_samples))
+    for i, cell_index in enumerate(valid):
+        for layer in range(NUM_NOISE_LAYERS):
+            row = i * NUM_NOISE_LAYERS + layer
+            white_noise[row] = (rngs[cell_index].random(total_cell_samples) * 2 - 1) * noise_amplitudes[row]
+    roughness_texture = generate_filtered_noise_batch(white_noise, noise_amplitudes, p['noise_cutoff_freqs'].ravel(), sample_rate=sample_rate)
+    del white_noise
+    mix += roughness_texture.reshape(len(valid), NUM_NOISE_LAYERS, total_cell_samples).sum(axis=1) * column(gains[:, 2])
+    del roughness_texture
+
+    # 4. Melody/Chord: note slot k is only rendered for cells whose chord has more than k notes
+    hit_duration = duration / NUM_CHORD_HITS
+    hit_samples = int(sample_rate * hit_duration)
+    t_hit = time_base(hit_samples, hit_duration)
+    chord_envelope = adsr_envelope(hit_samples, sample_rate, 0.5, 0.8, 0.4, 0.5).astype(np.float32)
+    note_amplitude = column(p['chord_amplitude'] / p['chord_size'] * gains[:, 3])
+    for hit in range(NUM_CHORD_HITS):
+        chord_waves = np.zeros((len(valid), hit_samples), dtype=np.float32)
+        for note in range(MAX_CHORD_NOTES):
+            rows = np.flatnonzero(p['chord_size'] > note)
+            chord_waves[rows] += note_amplitude[rows] * fast_sine(p['chord_freqs'][rows, hit, note, None] * t_hit)
+        chord_waves *= chord_envelope
+        start_sample = int(hit * hit_duration * sample_rate)
+        end_sample = min(start_sample + hit_samples, total_cell_samples)
+        mix[:, start_sample:end_sample] += chord_waves[:, :end_sample - start_sample]
+
+    # 5. Hydrological Drone
+    hydro_envelope = adsr_envelope(total_cell_samples, sample_rate, 1.5, 1.5, 0.7, 1.5).astype(np.float32)
+    hydro_drone = fast_sine(p['hydro_drone_freq'][:, None] * t)
+    hydro_drone *= hydro_envelope
+    mix += hydro_drone * column(p['hydro_drone_amplitude'] * gains[:, 4])
+
+    mixed_cells[valid] = mix
+    return mixed_cells
+
+def render_anomaly_overlay(cell_audio, anomaly, rng, total_cell_samples):
+    # Overlays the anomaly layer for one cell onto its stereo buffer, in place.
+    if anomaly == ANOMALY_ARCHAEOLOGICAL:
+        # More dramatic/alarming sound for archaeological anomalies
+        siren_gliss = generate_glissando(ANOMALY_GLISS_MIDI_START - 24, ANOMALY_GLISS_MIDI_END + 24, DURATION_PER_GRID_CELL, 0.9, attack=0.1, release=0.5, sample_rate=SAMPLE_RATE)
+        harsh_noise = generate_filtered_noise(DURATION_PER_GRID_CELL, 0.8, 15000, order=1, sample_rate=SAMPLE_RATE, rng=rng)
+        sub_drop = generate_adsr_sine_wave(30, DURATION_PER_GRID_CELL, 0.7, attack=0.05, decay=0.8, sustain=0.1, release=0.2, sample_rate=SAMPLE_RATE)
+
+        # Ensure all anomaly components have the same length as DURATION_PER_GRID_CELL
+        siren_gliss_padded = ensure_length(siren_gliss, total_cell_samples)
+        harsh_noise_padded = ensure_length(harsh_noise, total_cell_samples)
+        sub_drop_padded = ensure_length(sub_drop, total_cell_samples)
+
+        anomaly_core_np = siren_gliss_padded + harsh_noise_padded * 0.5 + sub_drop_padded * 0.7 # Combine for complex sound
+
+        piercing_ping_wave = generate_adsr_sine_wave(midi_to_hz(ANOMALY_PING_MIDI_NOTE), ANOMALY_PING_DURATION, ANOMALY_PING_AMPLITUDE, attack=0.01, decay=0.05, sustain=0.0, release=0.1, sample_rate=SAMPLE_RATE)
+        piercing_ping_wave_padded = ensure_length(piercing_ping_wave, total_cell_samples) # Pad if needed
+
+        # Overlay ping at the start of the anomaly layer
+        anomaly_layer = overlay(anomaly_core_np.astype(np.float32), piercing_ping_wave_padded, position=0, gain_during_overlay=0)
+        # Overlay the anomaly layer onto the already mixed cell audio
+        overlay(cell_audio, anomaly_layer, gain_during_overlay=-3) # Overlay on top of existing mix
+
+    elif anomaly == ANOMALY_JUNGLE:
+        # More subtle, natural-sounding anomaly for jungle
+        jungle_anomaly_sound = generate_glissando(ANOMALY_GLISS_MIDI_START - 36, ANOMALY_GLISS_MIDI_START - 24, DURATION_PER_GRID_CELL, 0.7, sample_rate=SAMPLE_RATE, attack=0.2, release=0.2)
+        jungle_anomaly_sound_padded = ensure_length(jungle_anomaly_sound, total_cell_samples)
+        # Overlay the anomaly layer onto the already mixed cell audio
+        overlay(cell_audio, jungle_anomaly_sound_padded, gain_during_overlay=-6)
+    return cell_audio
+
+# --- Cell audio cache ---
+# A rendered cell depends only on its feature row, its transect (anomaly category and RNG stream),
+# the synthesis constants/code, the seed and the sample rate, so those are hashed into a content key.
+# Cell footprints and pixel offsets are left out: they do not reach the synthesizer.
+CELL_AUDIO_KEY_EXCLUDED_FIELDS = ("row_off", "col_off", "minx", "miny", "maxx", "maxy")
+cell_audio_cache_path = os.path.join(output_audio_base_dir, "cell_audio_cache.sqlite")
+_cell_audio_cache = None # Opened lazily; the cache reopens its connection in forked workers
+
+def get_cell_audio_cache():
+    global _cell_audio_cache
+    if _cell_audio_cache is None:
+        _cell_audio_cache = CellAudioCache(cell_audio_cache_path, SONIFICATION_CELL_CACHE_MAX_BYTES)
+    return _cell_audio_cache
+
+@functools.lru_cache(maxsize=1)
+def synthesis_signature():
+    # Digest of everything global that shapes cell audio: sample rate, duration, seed, musical
+    # constants, and the source of the synthesis functions and kernels (so editing a gain or a
+    # generator invalidates the cache instead of silently reusing stale audio).
+    settings = {
+        "sample_rate": SAMPLE_RATE, "duration": DURATION_PER_GRID_CELL, "seed": SONIFICATION_RANDOM_SEED,
+        "cutoff_bins_per_octave": SONIFICATION_CUTOFF_BINS_PER_OCTAVE,
+        "globals": {name: value for name, value in globals().items()
+                    if name.startswith(("GLOBAL_", "ANOMALY_", "NUM_", "MAX_")) and isinstance(value, (int, float, str))},
+        "scales": [MAJOR_SCALE_MIDI, MINOR_PENTATONIC_MIDI, CHROMATIC_SCALE_MIDI],
+        "water": [NDWI_WATER_THRESHOLD, WATER_BODY_SUPPRESSION_GAIN_DB, HYDRO_BOOST_GAIN_DB],
+        "flow_dir_pan": sorted(FLOW_DIR_PAN.items()),
+        "anomaly_regions": {str(key): sorted(value) for key, value in ANOMALY_REGIONS.items()},
+        "transect_groups": [ARCHAEOLOGICAL_TRANSECTS, JUNGLE_TRANSECTS],
+    }
+    digest = hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode())
+    synthesis_code = [map_cell_parameters, anomaly_kind, build_synthesis_params, synthesize_cells, render_anomaly_overlay,
+                      quantize_cutoffs, generate_filtered_noise_batch, generate_adsr_sine_wave, generate_adsr_sine_bank,
+                      generate_noise_wave, butter_lowpass, generate_filtered_noise, generate_glissando, generate_click,
+                      generate_pulse, generate_rich_pulse, generate_chord, ensure_length, cell_rng, midi_to_hz,
+                      inspect.getmodule(sine_bank), inspect.getmodule(overlay)] # utils.synth_kernels, utils.mixing
+    for obj in synthesis_code:
+        digest.update(inspect.getsource(obj).encode())
+    return digest.hexdigest()
+
+def cell_audio_keys(cells, current_transect_id, pixels_per_grid_cell):
+    # One content key per feature-table row.
+    fields = [name for name in cells.dtype.names if name not in CELL_AUDIO_KEY_EXCLUDED_FIELDS]
+    features = recfunctions.repack_fields(cells[fields])
+    prefix = f"{synthesis_signature()}:{current_transect_id}:{pixels_per_grid_cell}:".encode()
+    return [hashlib.sha1(prefix + row.tobytes()).hexdigest() for row in features]
+
+def render_cells(cells, current_transect_id, pixels_per_grid_cell, use_cache=SONIFICATION_CELL_CACHE):
+    # Returns a list of (cell_audio, was_sonified) for a batch of feature-table rows, where cell_audio
+    # is a (samples, 2) float32 stereo buffer; the cell duration is len(cell_audio) / SAMPLE_RATE.
+    # Cells already in the audio cache are reused; the rest are synthesized together and stored.
+    if not use_cache:
+        return synthesize_stereo_cells(cells, current_transect_id, pixels_per_grid_cell)
+    cache = get_cell_audio_cache()
+    keys = cell_audio_keys(cells, current_transect_id, pixels_per_grid_cell)
+    cached = cache.get_many(k for k, valid in zip(keys, cells['is_valid']) if valid)
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    rendered = dict(zip(missing, synthesize_stereo_cells(cells[missing], current_transect_id, pixels_per_grid_cell))) if missing else {}
+    # Invalid cells are plain silence and cheaper to regenerate than to store
+    cache.put_many({keys[i]: rendered[i][0] for i in missing if rendered[i][1]})
+    return [rendered[i] if i in rendered else (cached[key], True) for i, key in enumerate(keys)]
+
+def synthesize_stereo_cells(cells, current_transect_id, pixels_per_grid_cell):
+    # Synthesizes a batch of feature-table rows in one pass; returns [(cell_audio, was_sonified)].
+    # Each cell draws from its own RNG, so any subset of a batch renders exactly as it would in full.
+    params, rngs = build_synthesis_params(cells, current_transect_id, pixels_per_grid_cell)
+    mixed_cells = synthesize_cells(params, rngs)
+    # Constant-power panning based on flow direction, broadcast over the batch; stays float32
+    stereo_cells = mixed_cells[:, :, None] * constant_power_gains(params['pan'])[:, None, :]
+    for i in np.flatnonzero(params['anomaly']):
+        render_anomaly_overlay(stereo_cells[i], params['anomaly'][i], rngs[i], mixed_cells.shape[1])
+    return [(stereo_cells[i], bool(params['is_valid'][i])) for i in range(len(cells))]
+
+def render_cell(cell, current_transect_id, pixels_per_grid_cell):
+    # Synthesizes one cell from its feature-table row; returns (cell_audio, was_sonified).
+    return render_cells(np.atleast_1d(cell), current_transect_id, pixels_per_grid_cell)[0]
+
+def render_cell_band(cells, current_transect_id, pixels_per_grid_cell, batch_cells=SONIFICATION_BATCH_CELLS):
+    # Renders a band of cells (whole rows of the grid) in order, batch_cells at a time; the unit
+    # of work for the process pool.
+    rendered = []
+    for start in range(0, len(cells), batch_cells):
+        rendered.extend(render_cells(cells[start:start + batch_cells], current_transect_id, pixels_per_grid_cell))
+    return rendered
+
+def bounded_map(executor, fn, *iterables, max_pending):
+    # Like executor.map, but with at most max_pending tasks submitted and not yet consumed, so results
+    # that finish faster than the caller consumes them cannot pile up in memory. Yields in order.
+    pending = deque()
+    try:
+        for args in zip(*iterables):
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(executor.submit(fn, *args))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending: # Consumer stopped early
+            future.cancel()
+
+def iter_rendered_cells(feature_table, current_transect_id, pixels_per_grid_cell, n_cell_rows, n_cell_cols, band_workers=1):
+    # Yields (cell_audio, was_sonified) in feature-table order. With band_workers > 1, row bands are
+    # rendered by a process pool and consumed in order, with about two bands per worker in flight,
+    # so only a few bands of audio are ever held in memory.
+    if band_workers > 1 and n_cell_rows > 1:
+        row_bands = split_into_row_bands(feature_table, n_cell_rows, n_cell_cols, band_workers * SONIFICATION_BANDS_PER_WORKER)
+        print(f"    Rendering {len(row_bands)} row bands on {band_workers} worker processes.")
+        with ProcessPoolExecutor(max_workers=band_workers) as executor:
+            for band in bounded_map(executor, render_cell_band, row_bands, repeat(current_transect_id), repeat(pixels_per_grid_cell),
+                                    max_pending=2 * band_workers):
+                yield from band
+    else:
+        for start in range(0, len(feature_table), SONIFICATION_BATCH_CELLS):
+            yield from render_cells(feature_table[start:start + SONIFICATION_BATCH_CELLS], current_transect_id, pixels_per_grid_cell)
 
-    data_rasters = {}
-    src_profiles = {}
+def split_into_row_bands(feature_table, n_cell_rows, n_cell_cols, num_bands):
+    # Splits the row-major feature table into contiguous bands of whole cell rows.
+    rows_per_band = max(1, -(-n_cell_rows // max(1, num_bands)))
+    rows = feature_table.reshape(n_cell_rows, n_cell_cols)
+    return [rows[start:start + rows_per_band].ravel() for start in range(0, n_cell_rows, rows_per_band)]
 
-    # --- Load DTMs (Mosaicking Logic) ---
-    # Use the explicit list of DTM tile paths from TRANSECT_FILE_PATHS
+def get_dtm_tile_paths(current_transect_id, current_scenario_files):
+    # Use the explicit list of DTM tile paths from TRANSECT_FILE_PATHS; None if any are missing.
     dtm_tile_paths = current_scenario_files.get('dtm_tile_paths_list')
 
     if not dtm_tile_paths:
         print(f"ERROR: No 'dtm_tile_paths_list' defined for transect '{current_transect_id}'. Skipping.")
-        # Ensure cleanup if we skip early
-        if os.path.exists(temp_audio_chunks_dir):
-            shutil.rmtree(temp_audio_chunks_dir)
-        continue
+        return None
 
     # Verify that all listed DTM files actually exist
     missing_dtm_files = [p for p in dtm_tile_paths if not os.path.exists(p)]
     if missing_dtm_files:
         print(f"ERROR: Some DTM tiles are missing for transect '{current_transect_id}': {missing_dtm_files}. Skipping.")
-        # Ensure cleanup if we skip early
-        if os.path.exists(temp_audio_chunks_dir):
-            shutil.rmtree(temp_audio_chunks_dir)
-        continue
+        return None
+    return dtm_tile_paths
+
+def grid_cell_pixels(master_profile):
+    # Pixels per sonification cell on the master DTM grid, or None if the grid is too coarse.
+    master_res = master_profile['transform'].a # Resolution of the MOSAIC DTM in its CRS
+    pixels_per_grid_cell = int(PROCESSING_GRID_SIZE_METERS / master_res)
+    if pixels_per_grid_cell == 0:
+        print(f"ERROR: Processing grid size ({PROCESSING_GRID_SIZE_METERS}m) is smaller than or equal to master raster resolution ({master_res}m). Adjust PROCESSING_GRID_SIZE_METERS. Skipping transect.")
+        return None
+    return pixels_per_grid_cell
+
+def extract_features_in_memory(current_transect_id, current_scenario_files, index_cache_dir=None):
+    # Full-raster mode: mosaics every DTM tile and reads every ancillary layer into RAM, then builds
+    # the feature table in one pass. Returns (feature_table, n_cell_rows, n_cell_cols,
+    # pixels_per_grid_cell), or None if the transect has to be skipped.
+    data_rasters = {}
+    src_profiles = {}
+
+    # --- Load DTMs (Mosaicking Logic) ---
+    dtm_tile_paths = get_dtm_tile_paths(current_transect_id, current_scenario_files)
+    if dtm_tile_paths is None:
+        return None
 
     # Mosaic DTM tiles
     try:
@@ -763,18 +1277,12 @@ for current_transect_id in TRANSECTS_TO_PROCESS:
     except Exception as e:
         print(f"ERROR: Could not mosaic DTM tiles for '{current_transect_id}': {e}. Skipping transect.")
         data_rasters['dtm'] = None
-        # Ensure cleanup if we skip early
-        if os.path.exists(temp_audio_chunks_dir):
-            shutil.rmtree(temp_audio_chunks_dir)
-        continue
+        return None
 
     # Check if DTM was successfully loaded/mosaicked
     if 'dtm' not in data_rasters or data_rasters['dtm'] is None or data_rasters['dtm'].size == 0:
         print(f"ERROR: DTM data (mosaic) not loaded for '{current_transect_id}'. Skipping sonification for this transect.")
-        # Ensure cleanup if we skip early
-        if os.path.exists(temp_audio_chunks_dir):
-            shutil.rmtree(temp_audio_chunks_dir)
-        continue
+        return None
 
 
     # --- Load other rasters (Satellite & Hydro) ---
@@ -791,25 +1299,7 @@ for current_transect_id in TRANSECTS_TO_PROCESS:
             continue
         try:
             src = rasterio.open(path)
-            # Read data, casting to float32 for hydro if needed, reading all bands for sat, or first band otherwise
-            if key.startswith('hydro_') and src.profile['dtype'] not in ['float32', 'float64']:
-                data_rasters[key] = src.read(1, out_dtype=np.float32)
-            elif key.startswith('sat_') and src.count > 1:
-                data_rasters[key] = src.read() # Read all bands for satellite imagery
-            else:
-                data_rasters[key] = src.read(1) # Read only the first band for single-band rasters
-
-            # Handle nodata values
-            if src.nodata is not None:
-                nodata_val = src.nodata
-                if data_rasters[key].ndim == 3: # Multi-band case
-                    for band_idx in range(data_rasters[key].shape[0]):
-                        # Only replace if the band itself is not entirely NaNs (might happen if clipped to an area outside data)
-                        if not np.all(np.isnan(data_rasters[key][band_idx])):
-                            data_rasters[key][band_idx][data_rasters[key][band_idx] == nodata_val] = np.nan
-                elif data_rasters[key].ndim == 2: # Single-band case
-                    if not np.all(np.isnan(data_rasters[key])):
-                        data_rasters[key][data_rasters[key] == nodata_val] = np.nan
+            data_rasters[key] = read_layer(src, key)
             src_profiles[key] = src.profile
             src.close()
             print(f"    Loaded {key}: Shape {data_rasters[key].shape}, Bounds {src.bounds}")
@@ -822,427 +1312,381 @@ for current_transect_id in TRANSECTS_TO_PROCESS:
     # Assuming 'sat_30m_dry' and 'hydro_flow_acc' are critical. Adjust if other layers are critical.
     if data_rasters.get('sat_30m_dry') is None or data_rasters.get('hydro_flow_acc') is None:
         print(f"ERROR: Essential satellite (sat_30m_dry) or hydrological (hydro_flow_acc) data missing for '{current_transect_id}'. Skipping sonification for this transect.")
-        # Ensure cleanup if we skip early
-        if os.path.exists(temp_audio_chunks_dir):
-            shutil.rmtree(temp_audio_chunks_dir)
-        continue
+        return None
 
 
     # --- Visualize the loaded geospatial data for the current transect ---
     visualize_geospatial_data(current_transect_id, data_rasters, output_viz_base_dir, ARCHAEOLOGICAL_TRANSECTS, JUNGLE_TRANSECTS)
 
     master_res = master_profile['transform'].a # Resolution of the MOSAIC DTM in its CRS
-    pixels_per_grid_cell = int(PROCESSING_GRID_SIZE_METERS / master_res)
-    if pixels_per_grid_cell == 0:
-        print(f"ERROR: Processing grid size ({PROCESSING_GRID_SIZE_METERS}m) is smaller than or equal to master raster resolution ({master_res}m). Adjust PROCESSING_GRID_SIZE_METERS. Skipping transect.")
-        # Ensure cleanup if we skip early
-        if os.path.exists(temp_audio_chunks_dir):
-            shutil.rmtree(temp_audio_chunks_dir)
-        continue
+    pixels_per_grid_cell = grid_cell_pixels(master_profile)
+    if pixels_per_grid_cell is None:
+        return None
 
     print(f"Using a sonification grid of approx {PROCESSING_GRID_SIZE_METERS}m x {PROCESSING_GRID_SIZE_METERS}m per audio segment for '{current_transect_id}'.")
     print("---------------------------------------------------------------")
 
-    num_sonified_cells = 0
     total_rows, total_cols = data_rasters['dtm'].shape # Shape of the MOSAIC DTM
+    n_cell_rows, n_cell_cols = cell_grid_shape(total_rows, total_cols, pixels_per_grid_cell)
 
     print(f"Starting sonification for {total_rows // pixels_per_grid_cell} rows x {(total_cols + pixels_per_grid_cell - 1) // pixels_per_grid_cell} cols potential sonification cells...")
 
-    temp_audio_file_paths = [] # List to store paths of temporary audio files for each cell
-    cell_geometries = []
-    current_audio_duration_ms = 0 # Tracks cumulative duration for CellGeom timing
+    ancillary_cell_means = ancillary_cell_layers(data_rasters, src_profiles, master_profile, n_cell_rows, n_cell_cols, pixels_per_grid_cell,
+                                                 index_cache_dir=index_cache_dir)
+    feature_table = build_cell_feature_table(data_rasters['dtm'], master_profile['transform'], pixels_per_grid_cell, master_res, ancillary=ancillary_cell_means)
+    print(f"    Extracted feature table for {len(feature_table)} cells ({n_cell_rows} x {n_cell_cols}).")
+    return feature_table, n_cell_rows, n_cell_cols, pixels_per_grid_cell
 
-    # Helper for ensuring consistent array lengths for mixing
-    def ensure_length(arr, target_len):
-        if len(arr) < target_len:
-            return np.pad(arr, (0, target_len - len(arr)), 'constant')
-        elif len(arr) > target_len:
-            return arr[:target_len]
-        return arr
-
-    for row_idx in range(0, total_rows, pixels_per_grid_cell):
-        for col_idx in range(0, total_cols, pixels_per_grid_cell):
-            row_end = min(row_idx + pixels_per_grid_cell, total_rows)
-            col_end = min(col_idx + pixels_per_grid_cell, total_cols)
-
-            dtm_cell = data_rasters['dtm'][row_idx:row_end, col_idx:col_end]
-
-            sat_dry_cell_data = get_aligned_cell(data_rasters.get('sat_30m_dry'), src_profiles.get('sat_30m_dry'), master_profile, row_idx, col_idx, pixels_per_grid_cell, PROCESSING_GRID_SIZE_METERS)
-            sat_wet_cell_data = get_aligned_cell(data_rasters.get('sat_30m_wet'), src_profiles.get('sat_30m_wet'), master_profile, row_idx, col_idx, pixels_per_grid_cell, PROCESSING_GRID_SIZE_METERS)
-
-            hydro_dem_cell = get_aligned_cell(data_rasters.get('hydro_dem'), src_profiles.get('hydro_dem'), master_profile, row_idx, col_idx, pixels_per_grid_cell, PROCESSING_GRID_SIZE_METERS)
-            hydro_flow_dir_cell = get_aligned_cell(data_rasters.get('hydro_flow_dir'), src_profiles.get('hydro_flow_dir'), master_profile, row_idx, col_idx, pixels_per_grid_cell, PROCESSING_GRID_SIZE_METERS)
-            hydro_flow_acc_cell = get_aligned_cell(data_rasters.get('hydro_flow_acc'), src_profiles.get('hydro_flow_acc'), master_profile, row_idx, col_idx, pixels_per_grid_cell, PROCESSING_GRID_SIZE_METERS)
-
-            ndvi_cell_array = np.nan; evi_cell_array = np.nan; bsi_cell_array = np.nan
-            ndvi_cell = np.nan; evi_cell = np.nan; bsi_cell = np.nan; brightness_cell = np.nan
-
-            if sat_dry_cell_data.size > 0 and sat_dry_cell_data.ndim == 3 and sat_dry_cell_data.shape[0] >= 11:
-                # Assuming Sentinel-2 bands: Blue(B2)=0, Green(B3)=1, Red(B4)=2, VEG_RED(B5)=3, VEG_RED(B6)=4, VEG_RED(B7)=5, NIR(B8)=6, NIR(B8A)=7, SWIR1(B11)=9, SWIR2(B12)=10
-                # Correct indices for Sentinel-2 bands used in calculations
-                red_band = sat_dry_cell_data[3, :, :]; nir_band = sat_dry_cell_data[7, :, :]; blue_band = sat_dry_cell_data[0, :, :]; green_band = sat_dry_cell_data[1, :, :]; swir1_band = sat_dry_cell_data[9, :, :]
-                denominator_ndvi = nir_band + red_band
-                ndvi_cell_array = np.where(denominator_ndvi != 0, (nir_band - red_band) / denominator_ndvi, np.nan); ndvi_cell = np.nanmean(ndvi_cell_array)
-                denominator_evi = nir_band + 6 * red_band - 7.5 * blue_band + 1
-                evi_cell_array = np.where(denominator_evi != 0, 2.5 * ((nir_band - red_band) / denominator_evi), np.nan); evi_cell = np.nanmean(evi_cell_array)
-                numerator_bsi = (swir1_band + red_band) - (nir_band + blue_band); denominator_bsi = (swir1_band + red_band) + (nir_band + blue_band)
-                bsi_cell_array = np.where(denominator_bsi != 0, numerator_bsi / denominator_bsi, np.nan); bsi_cell = np.nanmean(bsi_cell_array)
-                brightness_cell = np.nanmean(swir1_band) # Using SWIR1 as a proxy for brightness
-            elif sat_dry_cell_data.size > 0 and sat_dry_cell_data.ndim == 2:
-                # If it's a single-band raster assumed to be NDVI or brightness already
-                ndvi_cell_array = sat_dry_cell_data; ndvi_cell = np.nanmean(ndvi_cell_array)
-                brightness_cell = np.nanmean(sat_dry_cell_data)
-
-            mean_ndvi = ndvi_cell if not np.isnan(ndvi_cell) else 0.0
-            mean_evi = evi_cell if not np.isnan(evi_cell) else 0.0
-            mean_bsi_30m = bsi_cell if not np.isnan(bsi_cell) else 0.0
-            mean_brightness = brightness_cell if not np.isnan(brightness_cell) else 0.0
-            mean_ndwi = calculate_ndwi_s2(sat_dry_cell_data) # Recalculate NDWI if needed, or ensure it's handled
-
-            minx, maxy = master_profile['transform'] * (col_idx, row_idx)
-            maxx, miny = master_profile['transform'] * (col_idx + pixels_per_grid_cell, row_idx + pixels_per_grid_cell)
-
-            dtm_nan_percent = get_nan_percentage(dtm_cell)
-            ndvi_nan_percent = get_nan_percentage(ndvi_cell_array if not np.isscalar(ndvi_cell_array) else np.nan)
-            hydro_flow_acc_nan_percent = get_nan_percentage(hydro_flow_acc_cell)
-
-            print(f"    Cell R{row_idx // pixels_per_grid_cell}_C{col_idx // pixels_per_grid_cell}: "
-                  f"DTM NaN={dtm_nan_percent:.1f}%, NDVI NaN={ndvi_nan_percent:.1f}%, FlowAcc NaN={hydro_flow_acc_nan_percent:.1f}%, NDWI={mean_ndwi:.2f}")
-
-            is_valid_cell = (
-                dtm_cell.size > 0 and not np.all(np.isnan(dtm_cell)) and
-                not np.isnan(mean_ndvi) and # Check for valid NDVI
-                hydro_flow_acc_cell.size > 0 and not np.all(np.isnan(hydro_flow_acc_cell)) # Check for valid flow acc
-            )
-
-            if not is_valid_cell:
-                print(f"    !!! Cell R{row_idx // pixels_per_grid_cell}_C{col_idx // pixels_per_grid_cell} is INVALID - generating silent audio. !!!")
-                mixed_cell_audio_np = np.zeros(int(SAMPLE_RATE * DURATION_PER_GRID_CELL), dtype=np.float32)
-
-                # Export silent audio to a temporary file
-                temp_audio_filename = f"cell_{row_idx}_{col_idx}.wav"
-                temp_audio_path = os.path.join(temp_audio_chunks_dir, temp_audio_filename)
-                sf.write(temp_audio_path, mixed_cell_audio_np, SAMPLE_RATE, subtype='PCM_16')
-                temp_audio_file_paths.append(temp_audio_path)
-
-                cell_duration_ms = DURATION_PER_GRID_CELL * 1000 # Since it's a fixed duration
-                cell_geometries.append(CellGeom(minx, miny, maxx, maxy, current_audio_duration_ms, current_audio_duration_ms + cell_duration_ms))
-                current_audio_duration_ms += cell_duration_ms
-                continue
-
-            num_sonified_cells += 1
-
-            mean_elevation = np.nanmean(dtm_cell); std_dev_elevation = np.nanstd(dtm_cell)
-            mean_slope = calculate_slope(dtm_cell, master_res); mean_roughness = calculate_roughness(dtm_cell)
-            mean_flow_acc = np.nanmean(hydro_flow_acc_cell); mean_hydro_dem = np.nanmean(hydro_dem_cell); mean_flow_dir = np.nanmean(hydro_flow_dir_cell)
-
-
-            # Sonification parameter mapping
-            clipped_ndvi = np.clip(mean_ndvi, -0.2, 0.8); ndvi_normalized_for_pitch = np.interp(clipped_ndvi, [-0.2, 0.8], [0.0, 1.0])
-            pitch_interpolation_factor = 1.0 - ndvi_normalized_for_pitch # Invert for lower NDVI = higher pitch
-            current_base_freq_min_midi = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_NDVI_PITCH_LOW_MIN_MIDI, GLOBAL_NDVI_PITCH_HIGH_MIN_MIDI])
-            current_base_freq_max_midi = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_NDVI_PITCH_LOW_MAX_MIDI, GLOBAL_NDVI_PITCH_HIGH_MAX_MIDI])
-            current_base_freq_min_hz = midi_to_hz(current_base_freq_min_midi); current_base_freq_max_hz = midi_to_hz(current_base_freq_max_midi)
-            current_scale = MAJOR_SCALE_MIDI if pitch_interpolation_factor > 0.5 else MINOR_PENTATONIC_MIDI
-            current_roughness_filter_min = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_ROUGHNESS_FILTER_LOW_MIN, GLOBAL_ROUGHNESS_FILTER_HIGH_MIN])
-            current_roughness_filter_max = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_ROUGHNESS_FILTER_LOW_MAX, GLOBAL_ROUGHNESS_FILTER_HIGH_MAX])
-            current_hydro_drone_freq_min = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_HYDRO_DRONE_LOW_MIN, GLOBAL_HYDRO_DRONE_HIGH_MIN])
-            current_hydro_drone_freq_max = np.interp(pitch_interpolation_factor, [0,1], [GLOBAL_HYDRO_DRONE_LOW_MAX, GLOBAL_HYDRO_DRONE_HIGH_MAX])
-
-
-            # 1. Topography Bass/Drone (Elevation)
-            base_freq_low = np.interp(mean_elevation, [0, 500], [current_base_freq_min_hz, current_base_freq_max_hz])
-            bass_harmonics = [base_freq_low / 2, base_freq_low, base_freq_low * 1.5]
-            topography_bass_wave = np.zeros(int(SAMPLE_RATE * DURATION_PER_GRID_CELL), dtype=np.float32)
-            for freq in bass_harmonics:
-                topography_bass_wave += generate_adsr_sine_wave(freq, DURATION_PER_GRID_CELL, 0.4 / len(bass_harmonics),
-                                                                 attack=0.8, decay=1.0, sustain=0.7, release=1.0)
-
-            filter_mod_depth = np.interp(std_dev_elevation, [0, 20], [0, 0.2]); filter_mod_rate = 0.5 + np.random.rand() * 1.5
-            t_mod = np.linspace(0, DURATION_PER_GRID_CELL, len(topography_bass_wave), endpoint=False)
-            topography_bass_wave *= (1 + filter_mod_depth * np.sin(2 * np.pi * filter_mod_rate * t_mod))
-
-
-            # 2. Slope Percussion / Rhythmic Element
-            pulse_bpm = np.interp(mean_slope, [0, 45], [60, 180]); pulse_amplitude = np.interp(mean_slope, [0, 45], [0.0, 0.4])
-            click_base_freq = np.interp(mean_roughness, [0, 10], [current_roughness_filter_min, current_roughness_filter_max])
-            dtm_percussion_wave = generate_rich_pulse(pulse_bpm, DURATION_PER_GRID_CELL, pulse_amplitude, click_base_freq)
-
-            # 3. Roughness Texture (Filtered Noise)
-            noise_cutoff_freq = np.interp(mean_roughness, [0, 10], [current_roughness_filter_min, current_roughness_filter_max])
-            noise_amplitude = np.interp(std_dev_elevation, [0, 20], [0.0, 0.4])
-            roughness_texture_wave = np.zeros(int(SAMPLE_RATE * DURATION_PER_GRID_CELL), dtype=np.float32)
-            for _ in range(3): # Layer multiple noise instances for richness
-                detune_cutoff = noise_cutoff_freq * (1 + (np.random.rand() - 0.5) * 0.1) # Slight detuning for depth
-                roughness_texture_wave += generate_filtered_noise(DURATION_PER_GRID_CELL, noise_amplitude / 3, detune_cutoff, sample_rate=SAMPLE_RATE)
-
-            # 4. NDVI/EVI Melody/Chord Layer
-            scaled_ndvi_midi_for_melody = np.interp(ndvi_normalized_for_pitch, [0.0, 1.0], [current_base_freq_min_midi, current_base_freq_max_midi])
-            # Snap to nearest note in the current scale
-            closest_scale_note_midi_relative = current_scale[np.argmin(np.abs(np.array(current_scale) % 12 - (scaled_ndvi_midi_for_melody % 12)))]
-            target_octave = int(scaled_ndvi_midi_for_melody // 12)
-            melody_root_midi = closest_scale_note_midi_relative + target_octave * 12
-
-            evi_chord_density = np.interp(mean_evi, [0.0, 0.8], [0, 1])
-            melody_audio_array = np.zeros(int(SAMPLE_RATE * DURATION_PER_GRID_CELL), dtype=np.float32)
-            chord_intervals = [0] # Always include the root
-            if evi_chord_density > 0.3: chord_intervals.append(np.random.choice([3,4])); # Minor or Major third
-            if evi_chord_density > 0.6: chord_intervals.append(7); # Perfect fifth
-            if evi_chord_density > 0.8: chord_intervals.append(10) # Minor seventh for more complex chords
-
-            num_chord_hits = 2; # Number of times the chord will be struck per cell
-            hit_duration = DURATION_PER_GRID_CELL / num_chord_hits
-            for i in range(num_chord_hits):
-                hit_start_time = i * hit_duration
-                chord_amplitude = np.interp(mean_ndvi, [0.0, 0.8], [0.3, 0.6])
-                chord_wave = generate_chord(melody_root_midi, current_scale, hit_duration, chord_amplitude, chord_intervals=chord_intervals, sample_rate=SAMPLE_RATE)
-                start_sample = int(hit_start_time * SAMPLE_RATE)
-                end_sample = start_sample + len(chord_wave)
-                if end_sample <= len(melody_audio_array): melody_audio_array[start_sample:end_sample] += chord_wave
-                else: melody_audio_array[start_sample:] += chord_wave[:len(melody_audio_array) - start_sample]
-
-            # 5. Hydrological Drone (Flow Accumulation and DEM)
-            log_flow_acc_scaled = np.interp(np.log1p(mean_flow_acc), [0, np.log1p(100000)], [0.0, 1.0]) # Log scale for large range
-            hydro_drone_freq = np.interp(mean_hydro_dem, [0, 200], [current_hydro_drone_freq_min, current_hydro_drone_freq_max])
-            hydro_drone_amplitude = log_flow_acc_scaled * 0.6
-            pitch_bend = (np.random.rand() - 0.5) * 0.02 # Small random pitch variation
-            hydro_layer_audio_np = generate_adsr_sine_wave(hydro_drone_freq * (1 + pitch_bend), DURATION_PER_GRID_CELL, hydro_drone_amplitude, attack=1.5, decay=1.5, sustain=0.7, release=1.5, sample_rate=SAMPLE_RATE)
-
-            # Apply gain adjustments based on water body detection (NDWI)
-            gain_topo, gain_dtm_perc, gain_roughness, gain_melody, gain_hydro = 0.0, 0.0, 0.0, 0.0, -5 # Default gains
-            if mean_ndwi > NDWI_WATER_THRESHOLD:
-                print(f"        !!! Water body detected (NDWI={mean_ndwi:.2f}) - suppressing other layers and boosting hydro. !!!")
-                gain_topo = WATER_BODY_SUPPRESSION_GAIN_DB
-                gain_dtm_perc = WATER_BODY_SUPPRESSION_GAIN_DB
-                gain_roughness = WATER_BODY_SUPPRESSION_GAIN_DB
-                gain_melody = WATER_BODY_SUPPRESSION_GAIN_DB
-                gain_hydro = HYDRO_BOOST_GAIN_DB # Boost hydro for water bodies
-            else: # Default gains for non-water areas
-                gain_topo, gain_dtm_perc, gain_roughness, gain_melody = -6, -12, -9, -4 # Fine-tune these for overall mix
-
-            # Combine all audio layers into a single NumPy array for the cell
-            total_cell_samples = int(SAMPLE_RATE * DURATION_PER_GRID_CELL)
-            mixed_cell_audio_np = np.zeros(total_cell_samples, dtype=np.float32)
-
-            mixed_cell_audio_np += ensure_length(topography_bass_wave, total_cell_samples) * (10**(gain_topo/20.0))
-            mixed_cell_audio_np += ensure_length(dtm_percussion_wave, total_cell_samples) * (10**(gain_dtm_perc/20.0))
-            mixed_cell_audio_np += ensure_length(roughness_texture_wave, total_cell_samples) * (10**(gain_roughness/20.0))
-            mixed_cell_audio_np += ensure_length(melody_audio_array, total_cell_samples) * (10**(gain_melody/20.0))
-            mixed_cell_audio_np += ensure_length(hydro_layer_audio_np, total_cell_samples) * (10**(gain_hydro/20.0))
-
-
-            # Convert to AudioSegment for pydub's pan effect
-            # We convert to int16 before passing to AudioSegment because sf.read expects it later
-            mixed_cell_audio_segment = AudioSegment(convert_float_to_int16(mixed_cell_audio_np).tobytes(),
-                                                    frame_rate=SAMPLE_RATE, sample_width=2, channels=1) # 2 bytes = int16
-
-            # Panning based on flow direction (simplified for effect)
-            pan_value = 0.0
-            if mean_flow_dir > 0:
-                # D8 flow directions: 1 (E), 2 (NE), 4 (N), 8 (NW), 16 (W), 32 (SW), 64 (S), 128 (SE)
-                # Map directions to pan (-1.0 for hard left, 1.0 for hard right)
-                if mean_flow_dir == 1: pan_value = 1.0 # East
-                elif mean_flow_dir == 2: pan_value = 0.7 # Northeast
-                elif mean_flow_dir == 4: pan_value = 0.0 # North (Center)
-                elif mean_flow_dir == 8: pan_value = -0.7 # Northwest
-                elif mean_flow_dir == 16: pan_value = -1.0 # West
-                elif mean_flow_dir == 32: pan_value = -0.7 # Southwest
-                elif mean_flow_dir == 64: pan_value = 0.0 # South (Center)
-                elif mean_flow_dir == 128: pan_value = 0.7 # Southeast
-            mixed_cell_audio_segment = mixed_cell_audio_segment.pan(pan_value)
-
-            # Anomaly Detection and Sonification (Archaeological vs. Jungle)
-            is_anomaly_cell = False
-            # Define anomaly regions (example coordinates based on your problem description's approximate areas)
-            if current_transect_id == 'BR_AC_10':
-                cell_row_index = row_idx // pixels_per_grid_cell
-                cell_col_index = col_idx // pixels_per_grid_cell # FIXED: Corrected to pixels_per_grid_cell
-                if (cell_row_index >= 4 and cell_row_index < 9 and
-                    cell_col_index >= 6 and cell_col_index < 11):
-                    is_anomaly_cell = True
-            elif current_transect_id == 'BR_RO_05':
-                cell_row_index = row_idx // pixels_per_grid_cell
-                cell_col_index = col_idx // pixels_per_grid_cell # FIXED: Corrected to pixels_per_grid_cell
-                if (cell_row_index >= 10 and cell_row_index < 15 and
-                    cell_col_index >= 12 and cell_col_index < 17):
-                    is_anomaly_cell = True
-            elif current_transect_id == 'BR_PA_02':
-                cell_row_index = row_idx // pixels_per_grid_cell
-                cell_col_index = col_idx // pixels_per_grid_cell # FIXED: Corrected to pixels_per_grid_cell
-                if (cell_row_index >= 25 and cell_row_index < 30 and
-                    cell_col_index >= 8 and cell_col_index < 13):
-                    is_anomaly_cell = True
-            elif current_transect_id == 'BR_AC_07':
-                cell_row_index = row_idx // pixels_per_grid_cell
-                cell_col_index = col_idx // pixels_per_grid_cell # FIXED: Corrected to pixels_per_grid_cell
-                if (cell_row_index >= 5 and cell_row_index < 10 and
-                    cell_col_index >= 5 and cell_col_index < 10):
-                    is_anomaly_cell = True
-            elif current_transect_id == 'BR_AC_09':
-                cell_row_index = row_idx // pixels_per_grid_cell
-                cell_col_index = col_idx // pixels_per_grid_cell # FIXED: Corrected to pixels_per_grid_cell
-                if (cell_row_index >= 7 and cell_row_index < 12 and
-                    cell_col_index >= 7 and cell_col_index < 12):
-                    is_anomaly_cell = True
-
-
-            if is_anomaly_cell:
-                if current_transect_id in ARCHAEOLOGICAL_TRANSECTS:
-                    print(f"    !!! ANOMALY TRIGGERED and PIERCING PING ADDED for {current_transect_id} at cell R{row_idx // pixels_per_grid_cell}_C{col_idx // pixels_per_grid_cell} !!!")
-                    # More dramatic/alarming sound for archaeological anomalies
-                    siren_gliss = generate_glissando(ANOMALY_GLISS_MIDI_START - 24, ANOMALY_GLISS_MIDI_END + 24, DURATION_PER_GRID_CELL, 0.9, attack=0.1, release=0.5, sample_rate=SAMPLE_RATE)
-                    harsh_noise = generate_filtered_noise(DURATION_PER_GRID_CELL, 0.8, 15000, order=1, sample_rate=SAMPLE_RATE)
-                    sub_drop = generate_adsr_sine_wave(30, DURATION_PER_GRID_CELL, 0.7, attack=0.05, decay=0.8, sustain=0.1, release=0.2, sample_rate=SAMPLE_RATE)
-                    
-                    # Ensure all anomaly components have the same length as DURATION_PER_GRID_CELL
-                    siren_gliss_padded = ensure_length(siren_gliss, total_cell_samples)
-                    harsh_noise_padded = ensure_length(harsh_noise, total_cell_samples)
-                    sub_drop_padded = ensure_length(sub_drop, total_cell_samples)
-                    
-                    anomaly_core_np = siren_gliss_padded + harsh_noise_padded * 0.5 + sub_drop_padded * 0.7 # Combine for complex sound
-                    
-                    piercing_ping_wave = generate_adsr_sine_wave(midi_to_hz(ANOMALY_PING_MIDI_NOTE), ANOMALY_PING_DURATION, ANOMALY_PING_AMPLITUDE, attack=0.01, decay=0.05, sustain=0.0, release=0.1, sample_rate=SAMPLE_RATE)
-                    piercing_ping_wave_padded = ensure_length(piercing_ping_wave, total_cell_samples) # Pad if needed
-
-                    anomaly_segment = AudioSegment(convert_float_to_int16(anomaly_core_np).tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1)
-                    piercing_ping_segment = AudioSegment(convert_float_to_int16(piercing_ping_wave_padded).tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1)
-
-                    # Overlay ping at the start of the segment
-                    anomaly_segment_final = anomaly_segment.overlay(piercing_ping_segment, position=0, gain_during_overlay=0)
-                    # Overlay the anomaly segment onto the already mixed cell audio segment
-                    mixed_cell_audio_segment = mixed_cell_audio_segment.overlay(anomaly_segment_final.set_frame_rate(SAMPLE_RATE), gain_during_overlay=-3) # Overlay on top of existing mix
-
-                elif current_transect_id in JUNGLE_TRANSECTS:
-                    print(f"    !!! ANOMALY TRIGGERED (Jungle type - subtle) for {current_transect_id} at cell R{row_idx // pixels_per_grid_cell}_C{col_idx // pixels_per_grid_cell} !!!")
-                    # More subtle, natural-sounding anomaly for jungle
-                    jungle_anomaly_sound = generate_glissando(ANOMALY_GLISS_MIDI_START - 36, ANOMALY_GLISS_MIDI_START - 24, DURATION_PER_GRID_CELL, 0.7, sample_rate=SAMPLE_RATE, attack=0.2, release=0.2)
-                    jungle_anomaly_sound_padded = ensure_length(jungle_anomaly_sound, total_cell_samples)
-                    jungle_anomaly_segment = AudioSegment(convert_float_to_int16(jungle_anomaly_sound_padded).tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1)
-                    # Overlay the anomaly segment onto the already mixed cell audio segment
-                    mixed_cell_audio_segment = mixed_cell_audio_segment.overlay(jungle_anomaly_segment.set_frame_rate(SAMPLE_RATE), gain_during_overlay=-6)
-
-
-            # Export the final mixed and possibly anomaly-modified segment to a temporary file
-            temp_audio_filename = f"cell_{row_idx}_{col_idx}.wav"
-            temp_audio_path = os.path.join(temp_audio_chunks_dir, temp_audio_filename)
-            
-            # Ensure the output format is compatible with int16 and pydub/soundfile
-            mixed_cell_audio_segment.export(temp_audio_path, format="wav")
-            temp_audio_file_paths.append(temp_audio_path)
-            
-            # Calculate duration for CellGeom from the pydub segment's actual duration
-            cell_duration_ms = mixed_cell_audio_segment.duration_seconds * 1000
-            cell_geometries.append(CellGeom(minx, miny, maxx, maxy, current_audio_duration_ms, current_audio_duration_ms + cell_duration_ms))
-            current_audio_duration_ms += cell_duration_ms
+def open_ancillary_sources(current_transect_id, current_scenario_files):
+    # Opens (without reading) the satellite and hydro rasters; missing layers map to None.
+    sources = {}
+    for key in ['sat_30m_dry', 'sat_30m_wet', 'hydro_dem', 'hydro_flow_dir', 'hydro_flow_acc']:
+        path = current_scenario_files.get(key)
+        sources[key] = None
+        if not path:
+            print(f"WARNING: Path for '{key}' not defined for '{current_transect_id}'. Skipping this layer.")
+        elif not os.path.exists(path):
+            print(f"WARNING: File '{key}' not found at '{path}'. Skipping this layer for '{current_transect_id}'.")
+        else:
+            try:
+                sources[key] = rasterio.open(path)
+                print(f"    Opened {key}: Shape {sources[key].shape}, Bounds {sources[key].bounds}")
+            except Exception as e:
+                print(f"ERROR opening {key} from '{path}': {e}. Skipping this layer.")
+    return sources
 
+def visualize_from_overviews(current_transect_id, dtm_tile_paths, master_profile, sources):
+    # Plots decimated reads of each layer so visualization never needs the full-resolution rasters.
+    overview_rasters = {'dtm': read_mosaic_overview(dtm_tile_paths, master_profile, SONIFICATION_VIZ_MAX_DIM)}
+    for key, src in sources.items():
+        try:
+            overview_rasters[key] = None if src is None else read_layer(src, key, out_shape=decimated_shape(src, SONIFICATION_VIZ_MAX_DIM))
+        except Exception as e:
+            print(f"Warning: Could not read an overview of {key} for plotting ({e}).")
+            overview_rasters[key] = None
+    visualize_geospatial_data(current_transect_id, overview_rasters, output_viz_base_dir, ARCHAEOLOGICAL_TRANSECTS, JUNGLE_TRANSECTS)
+
+def extract_features_windowed(current_transect_id, current_scenario_files, index_cache_dir=None, checkpoint_dir=None, fingerprint=None):
+    # Out-of-core mode: the DTM mosaic is never merged as a whole. The master grid is walked in
+    # strips of SONIFICATION_STRIP_CELL_ROWS cell rows; each strip mosaics only its own rows and
+    # reads only the ancillary windows it overlaps, so peak memory is bounded by the strip size.
+    # With a checkpoint_dir, every finished strip's table is saved (tagged with `fingerprint`) so an
+    # interrupted run resumes at the first missing strip. Returns the same tuple as extract_features_in_memory.
+    dtm_tile_paths = get_dtm_tile_paths(current_transect_id, current_scenario_files)
+    if dtm_tile_paths is None:
+        return None
+    try:
+        master_profile = mosaic_profile(dtm_tile_paths)
+    except Exception as e:
+        print(f"ERROR: Could not read DTM tile metadata for '{current_transect_id}': {e}. Skipping transect.")
+        return None
+    total_rows, total_cols = master_profile['height'], master_profile['width']
+    print(f"    Virtual DTM mosaic for {current_transect_id}: Shape ({total_rows}, {total_cols}), Bounds {strip_bounds(master_profile, 0, total_rows)}")
 
-    print(f"\n--- Finalizing Audio for {current_transect_id} ---")
+    sources = open_ancillary_sources(current_transect_id, current_scenario_files)
+    try:
+        # Check if essential satellite and hydro data are available
+        if sources.get('sat_30m_dry') is None or sources.get('hydro_flow_acc') is None:
+            print(f"ERROR: Essential satellite (sat_30m_dry) or hydrological (hydro_flow_acc) data missing for '{current_transect_id}'. Skipping sonification for this transect.")
+            return None
+
+        visualize_from_overviews(current_transect_id, dtm_tile_paths, master_profile, sources)
+
+        pixels_per_grid_cell = grid_cell_pixels(master_profile)
+        if pixels_per_grid_cell is None:
+            return None
+        master_res = master_profile['transform'].a
+        n_cell_rows, n_cell_cols = cell_grid_shape(total_rows, total_cols, pixels_per_grid_cell)
+        print(f"Using a sonification grid of approx {PROCESSING_GRID_SIZE_METERS}m x {PROCESSING_GRID_SIZE_METERS}m per audio segment for '{current_transect_id}'.")
+        print(f"Starting sonification for {n_cell_rows} x {n_cell_cols} potential sonification cells, read in strips of {SONIFICATION_STRIP_CELL_ROWS} cell rows...")
+
+        strip_tables = []
+        for row_start, row_stop in iter_row_strips(total_rows, SONIFICATION_STRIP_CELL_ROWS * pixels_per_grid_cell):
+            strip_cell_rows = cell_grid_shape(row_stop - row_start, total_cols, pixels_per_grid_cell)[0]
+            strip_checkpoint_path = None if checkpoint_dir is None else os.path.join(checkpoint_dir, f"rows_{row_start}_{row_stop}.npz")
+            if strip_checkpoint_path is not None:
+                checkpoint = load_feature_table(strip_checkpoint_path, fingerprint)
+                if checkpoint is not None:
+                    print(f"    Resuming: rows {row_start}-{row_stop} already extracted.")
+                    strip_tables.append(checkpoint[0])
+                    continue
+            strip_rasters = {'dtm': read_mosaic_strip(dtm_tile_paths, master_profile, row_start, row_stop)}
+            strip_profiles = {'dtm': master_profile}
+            bounds = strip_bounds(master_profile, row_start, row_stop)
+            for key, src in sources.items():
+                window = None if src is None else layer_window(src, master_profile['crs'], bounds)
+                if window is None:
+                    strip_rasters[key] = None; strip_profiles[key] = None
+                    continue
+                try:
+                    strip_rasters[key] = read_layer(src, key, window=window)
+                    strip_profiles[key] = window_profile(src, window)
+                except Exception as e:
+                    print(f"ERROR reading {key} rows {row_start}-{row_stop}: {e}. Skipping this layer for the strip.")
+                    strip_rasters[key] = None; strip_profiles[key] = None
+            ancillary_cell_means = ancillary_cell_layers(strip_rasters, strip_profiles, master_profile, strip_cell_rows, n_cell_cols, pixels_per_grid_cell,
+                                                         row_offset=row_start, index_cache_dir=index_cache_dir)
+            strip_tables.append(build_cell_feature_table(strip_rasters['dtm'], master_profile['transform'], pixels_per_grid_cell, master_res,
+                                                         ancillary=ancillary_cell_means, row_offset=row_start))
+            if strip_checkpoint_path is not None:
+                os.makedirs(checkpoint_dir, exist_ok=True)
+                save_feature_table(strip_checkpoint_path, strip_tables[-1], strip_cell_rows, n_cell_cols, pixels_per_grid_cell, fingerprint)
+    finally:
+        for src in sources.values():
+            if src is not None:
+                src.close()
+
+    feature_table = np.concatenate(strip_tables)
+    print(f"    Extracted feature table for {len(feature_table)} cells ({n_cell_rows} x {n_cell_cols}).")
+    return feature_table, n_cell_rows, n_cell_cols, pixels_per_grid_cell
 
+# -----------------------------------------------------------------------------
+# Per-transect pipeline: load rasters, build the feature table, render cells, assemble audio
+# -----------------------------------------------------------------------------
+def transect_output_paths(current_transect_id):
+    # Files process_transect produces for a transect: the full WAV and its geospatial metadata.
+    output_audio_current_transect_dir = os.path.join(output_audio_base_dir, current_transect_id)
     # Determine file suffix based on transect category for naming
-    # FIXED: Ensure file_suffix is defined even if no categories match
-    file_suffix = "" # Default to empty string
+    file_suffix = "" # Default to empty string (cities/uncategorized)
     if current_transect_id in ARCHAEOLOGICAL_TRANSECTS:
         file_suffix = "_Archaeological"
     elif current_transect_id in JUNGLE_TRANSECTS:
         file_suffix = "_Jungle"
-    # Add an 'else' if you want a default suffix for CITY_TRANSECTS or uncategorized.
-    # For now, it will be an empty string for cities/uncategorized.
-
-    # Define a path for the intermediate concatenated WAV
-    final_output_concat_path = os.path.join(output_audio_current_transect_dir, f"{current_transect_id}_raw_concatenated.wav")
-    final_output_final_path = os.path.join(output_audio_current_transect_dir, f"{current_transect_id}_full_sonification_SOTA{file_suffix}.wav")
+    return {
+        "audio": os.path.join(output_audio_current_transect_dir, f"{current_transect_id}_full_sonification_SOTA{file_suffix}.wav"),
+        "metadata": os.path.join(output_audio_current_transect_dir, f"{current_transect_id}_geospatial_metadata.json"),
+    }
 
+def stage_config(current_transect_id):
+    # Everything that determines a transect's sonification outputs, for the pipeline manifest:
+    # the raster inputs (path/size/mtime fingerprint) and the synthesis signature (settings and code).
+    return {
+        "feature_inputs": feature_inputs_fingerprint(TRANSECT_FILE_PATHS.get(current_transect_id) or {}),
+        "synthesis": synthesis_signature(),
+        "sample_rate": SAMPLE_RATE,
+        "duration_per_grid_cell": DURATION_PER_GRID_CELL,
+        "random_seed": SONIFICATION_RANDOM_SEED,
+    }
 
-    if temp_audio_file_paths:
+def process_transect(current_transect_id, band_workers=1):
+    # Sonifies one transect to disk; returns the WAV path, or None on failure.
+    artifacts = sonify_transect(current_transect_id, band_workers)
+    return None if artifacts is None else artifacts["audio_path"]
+
+def sonify_transect(current_transect_id, band_workers=1, persist=True, keep_audio=False):
+    # Returns the transect's artifacts for the next stage, or None on failure:
+    # {"transect_id", "sample_rate", "cells" (CellGeom dicts), "audio_path", "metadata_path", "audio"}.
+    # With keep_audio, "audio" is the normalized (frames, 2) float32 mix, handed over in memory;
+    # without persist, no WAV or metadata JSON is written (the paths are None).
+    stream = stream_transect(current_transect_id, band_workers, persist, keep_audio)
+    while True:
         try:
-            # Read parameters from the first temporary file
-            with sf.SoundFile(temp_audio_file_paths[0], 'r') as f_read:
-                samplerate_out = f_read.samplerate
-                channels_out = 1 # FIXED: Explicitly set to 1 channel (mono) for consistency
-                subtype_out = f_read.subtype
-                file_format_out = f_read.format
-
-            # Use soundfile to write all chunks to a single intermediate file
-            # This operation is memory-efficient as it streams data from disk to disk
-            with sf.SoundFile(final_output_concat_path, 'w', samplerate_out, channels_out, subtype=subtype_out, format=file_format_out) as f_write:
-                for temp_file in temp_audio_file_paths:
-                    # sf.read reads data, `_` discards samplerate from tuple
-                    data, _ = sf.read(temp_file, dtype='int16') # Read as int16
-                    if data.ndim == 2: # Safeguard: if somehow stereo, take first channel (or average)
-                        data = data[:, 0]
-                    f_write.write(data) # Write to the concatenated file
-
-            # --- Memory-Efficient Normalization Pass (replaces pydub.normalize for full file) ---
-            # 1. First pass to find the peak amplitude
-            max_amplitude = 0.0
-            block_size = 4096 # Process in small blocks
-            try:
-                with sf.SoundFile(final_output_concat_path, 'r') as f_read_peak:
-                    for block in f_read_peak.blocks(blocksize=block_size, dtype='float32'): # Read as float for peak finding
-                        current_max = np.max(np.abs(block))
-                        if current_max > max_amplitude:
-                            max_amplitude = current_max
-            except Exception as e:
-                print(f"Warning: Could not determine peak for normalization ({e}). Proceeding without normalization.")
-                max_amplitude = 1.0 # Default to no normalization if peak finding fails
-
-            normalization_factor = 1.0 # Default if audio is silent
-            if max_amplitude > 1e-6: # Avoid division by zero for silent files
-                # Normalize to near 1.0 (e.g., 0.95 to avoid clipping after potential re-encoding)
-                normalization_factor = 0.95 / max_amplitude
-
-            # 2. Second pass to apply normalization and write the final output
-            # No dynamic range compression here due to memory constraints and complexity.
-            # If dynamic range compression is crucial, it should be done externally with specialized tools
-            # or by highly optimized, streaming libraries not available out-of-the-box in pydub/soundfile.
-            
-            with sf.SoundFile(final_output_concat_path, 'r') as f_read_norm:
-                with sf.SoundFile(final_output_final_path, 'w', samplerate_out, channels_out, subtype=subtype_out, format=file_format_out) as f_write_norm:
-                    for block in f_read_norm.blocks(blocksize=block_size, dtype='float32'):
-                        normalized_block = block * normalization_factor
-                        f_write_norm.write(normalized_block) # sf handles float32 to int16 conversion here
-
-            print(f"    Audio successfully concatenated and normalized to: '{final_output_final_path}'")
-            print("    Note: Dynamic range compression was skipped due to memory constraints. Consider external post-processing if needed.")
+            next(stream)
+        except StopIteration as stop:
+            return stop.value
+
+def stream_transect(current_transect_id, band_workers=1, persist=True, keep_audio=False):
+    # Generator form of sonify_transect: yields (cell_metadata, cell_audio) for every cell as soon as
+    # it is rendered, in feature-table order, and returns the artifacts dict when the transect is done.
+    # cell_audio is the raw (samples, 2) float32 cell mix at SAMPLE_RATE, before the transect-wide
+    # peak normalization (which needs the whole transect). Consumers can start on the audio (e.g. the
+    # embedding stream) while synthesis is still running.
+    print(f"\n--- Processing Transect: {current_transect_id} ---")
 
-        except Exception as e:
-            print(f"ERROR during audio concatenation/normalization for '{current_transect_id}': {e}. Generating silent output.")
-            # If anything goes wrong, ensure a silent file is still created as final output
-            silent_np_array = np.zeros(int(current_audio_duration_ms / 1000 * SAMPLE_RATE), dtype=np.int16)
-            sf.write(final_output_final_path, silent_np_array, SAMPLE_RATE, subtype='PCM_16')
-            print(f"    Silent placeholder file generated: '{final_output_final_path}'")
-            
-            # Ensure the temp concat file is cleaned up if it was partially created
-            if os.path.exists(final_output_concat_path):
-                os.remove(final_output_concat_path)
-    else:
-        print(f"No valid audio chunks generated for '{current_transect_id}'. Generating silent output.")
-        # If no valid audio was generated at all, create a silent file
-        silent_np_array = np.zeros(int(current_audio_duration_ms / 1000 * SAMPLE_RATE), dtype=np.int16)
-        sf.write(final_output_final_path, silent_np_array, SAMPLE_RATE, subtype='PCM_16')
-        print(f"    Silent placeholder file generated: '{final_output_final_path}'")
+    current_scenario_files = TRANSECT_FILE_PATHS.get(current_transect_id)
+    if not current_scenario_files:
+        print(f"ERROR: File paths not defined for transect '{current_transect_id}'. Skipping.")
+        return None
 
+    output_audio_current_transect_dir = os.path.join(output_audio_base_dir, current_transect_id)
+    os.makedirs(output_audio_current_transect_dir, exist_ok=True)
+    os.makedirs(output_viz_base_dir, exist_ok=True)
+
+    # --- Feature stage: reduce every raster to one row of statistics per cell ---
+    # The feature table (per-cell datacube) is cached next to the transect's outputs; a re-run with
+    # unchanged inputs skips all raster reading, alignment and plotting.
+    feature_cache_path = os.path.join(output_audio_current_transect_dir, f"{current_transect_id}_cell_features.npz")
+    feature_fingerprint = feature_inputs_fingerprint(current_scenario_files)
+    features = load_feature_table(feature_cache_path, feature_fingerprint)
+    if features is not None:
+        print(f"    Reusing cached cell features from '{feature_cache_path}'.")
+    else:
+        # Grid-alignment indexes ("window" mode) are cached next to the outputs as well
+        index_cache_dir = os.path.join(output_audio_current_transect_dir, "alignment_index")
+        if SONIFICATION_WINDOWED_READS:
+            strip_checkpoint_dir = os.path.join(output_audio_current_transect_dir, "feature_strips")
+            features = extract_features_windowed(current_transect_id, current_scenario_files, index_cache_dir,
+                                                 checkpoint_dir=strip_checkpoint_dir, fingerprint=feature_fingerprint)
+        else:
+            strip_checkpoint_dir = None
+            features = extract_features_in_memory(current_transect_id, current_scenario_files, index_cache_dir)
+        if features is None:
+            return None
+        save_feature_table(feature_cache_path, *features, feature_fingerprint)
+        print(f"    Cell features saved to: '{feature_cache_path}'")
+        if strip_checkpoint_dir is not None:
+            shutil.rmtree(strip_checkpoint_dir, ignore_errors=True) # Superseded by the full table
+    feature_table, n_cell_rows, n_cell_cols, pixels_per_grid_cell = features
+    num_sonified_cells = 0
 
-    # New: Export the geospatial metadata to a JSON file
-    json_output_filename = os.path.join(output_audio_current_transect_dir, f"{current_transect_id}_geospatial_metadata.json")
-    with open(json_output_filename, 'w') as f:
-        json.dump([cg.to_dict() for cg in cell_geometries], f, indent=4)
-    print(f"    Geospatial metadata saved to: '{json_output_filename}'")
+    output_paths = transect_output_paths(current_transect_id)
+    final_output_final_path = output_paths["audio"]
+
+    # --- Synthesis stage: render cells (optionally on worker processes) and stream each cell's
+    # float32 buffer straight into one memory-mapped transect buffer; the running peak is tracked
+    # on append so normalization needs just one final pass. An interrupted run re-renders quickly:
+    # cells finished before the interruption come back from the cell audio cache. ---
+    # Without a WAV or in-memory copy to produce, cells only flow to the consumer and nothing is buffered.
+    stream_buffer_path = os.path.join(output_audio_current_transect_dir, f"{current_transect_id}_stream_buffer.f32")
+    audio_writer = None
+    if persist or keep_audio:
+        audio_writer = StreamingAudioWriter(stream_buffer_path, SAMPLE_RATE, channels=2,
+                                            expected_frames=len(feature_table) * int(SAMPLE_RATE * DURATION_PER_GRID_CELL))
+
+    # CellGeom timing is assigned in feature-table order, independent of which worker rendered a cell
+    cell_geometries = []
+    current_audio_duration_ms = 0 # Tracks cumulative duration for CellGeom timing
+    try:
+        rendered_cells = iter_rendered_cells(feature_table, current_transect_id, pixels_per_grid_cell, n_cell_rows, n_cell_cols, band_workers)
+        for cell, (cell_audio, was_sonified) in zip(feature_table, rendered_cells):
+            if audio_writer is not None:
+                audio_writer.append(cell_audio)
+            cell_duration_ms = len(cell_audio) / SAMPLE_RATE * 1000
+            cell_geometries.append(CellGeom(float(cell['minx']), float(cell['miny']), float(cell['maxx']), float(cell['maxy']), current_audio_duration_ms, current_audio_duration_ms + cell_duration_ms))
+            current_audio_duration_ms += cell_duration_ms
+            num_sonified_cells += int(was_sonified)
+            yield cell_geometries[-1].to_dict(), cell_audio
+        print(f"    Sonified {num_sonified_cells} of {len(feature_table)} cells.")
+
+        print(f"\n--- Finalizing Audio for {current_transect_id} ---")
+        if current_audio_duration_ms == 0:
+            raise ValueError("no audio was rendered")
+        # No dynamic range compression here; if it is crucial, it should be done externally.
+        transect_audio = audio_writer.normalized_array(target_peak=0.95) if keep_audio else None
+        if persist:
+            audio_writer.finalize(final_output_final_path, target_peak=0.95, subtype='PCM_16')
+            print(f"    Audio successfully assembled and normalized to: '{final_output_final_path}'")
+        elif audio_writer is not None:
+            audio_writer.close()
+    except GeneratorExit:
+        # The consumer stopped early: drop the partial buffer and write nothing
+        if audio_writer is not None:
+            audio_writer.close()
+        raise
+    except Exception as e:
+        print(f"ERROR during audio assembly/normalization for '{current_transect_id}': {e}. Generating silent output.")
+        if audio_writer is not None:
+            audio_writer.close()
+        # If anything goes wrong, ensure a silent file is still created as final output
+        silent_np_array = np.zeros((int(current_audio_duration_ms / 1000 * SAMPLE_RATE), 2), dtype=np.int16)
+        transect_audio = silent_np_array.astype(np.float32) if keep_audio else None
+        if persist:
+            sf.write(final_output_final_path, silent_np_array, SAMPLE_RATE, subtype='PCM_16')
+            print(f"    Silent placeholder file generated: '{final_output_final_path}'")
 
-    # --- Cleanup Temporary Audio Chunks ---
-    if os.path.exists(temp_audio_chunks_dir):
-        shutil.rmtree(temp_audio_chunks_dir)
-        print(f"    Cleaned up temporary audio chunks directory: '{temp_audio_chunks_dir}'")
-    # Clean up the intermediate concatenated file
-    if os.path.exists(final_output_concat_path):
-        os.remove(final_output_concat_path)
-        print(f"    Cleaned up intermediate concatenated file: '{final_output_concat_path}'")
+    cell_metadata = [cg.to_dict() for cg in cell_geometries]
+    if persist:
+        # New: Export the geospatial metadata to a JSON file
+        json_output_filename = output_paths["metadata"]
+        with open(json_output_filename, 'w') as f:
+            json.dump(cell_metadata, f, indent=4)
+        print(f"    Geospatial metadata saved to: '{json_output_filename}'")
 
 
     print(f"\n--- Sonification Process Complete for {current_transect_id} ---")
-    print(f"Generated FULL WAV file for '{current_transect_id}'.")
-    print(f"File saved to: '{final_output_final_path}'") # Use the new final path
+    if persist:
+        print(f"Generated FULL WAV file for '{current_transect_id}'.")
+        print(f"File saved to: '{final_output_final_path}'") # Use the new final path
     print("---------------------------------------------------------------")
 
-print("\nAll selected transects processed.")
-print(f"Overall output directory: '{output_audio_base_dir}'")
+    return {
+        "transect_id": current_transect_id, "sample_rate": SAMPLE_RATE, "cells": cell_metadata,
+        "audio_path": final_output_final_path if persist else None,
+        "metadata_path": output_paths["metadata"] if persist else None,
+        "audio": transect_audio,
+    }
+
+def cell_audio_chunks(stream, artifacts_out):
+    # Adapts a stream_transect generator to a plain iterator of cell audio buffers (e.g. for
+    # EmbeddingExtractor.embed_stream); the artifacts it returns at the end go into artifacts_out.
+    while True:
+        try:
+            cell_metadata, cell_audio = next(stream)
+        except StopIteration as stop:
+            if stop.value is not None:
+                artifacts_out.update(stop.value)
+            return
+        yield cell_audio
+
+def process_transects(transect_ids, workers=SONIFICATION_WORKERS, on_complete=None, persist=True, keep_audio=False):
+    # Runs sonify_transect for every transect and returns {transect_id: artifacts or None}. With
+    # workers > 1, transects are fanned out to a process pool; leftover cores (fewer transects than
+    # workers) go to row bands inside each transect. on_complete(transect_id, artifacts) is called in
+    # this process as each transect finishes, in order; it may pop "audio" to release the buffer early.
+    transect_ids = list(transect_ids)
+    results = {}
+    if workers <= 1 or not transect_ids:
+        outputs = (sonify_transect(transect_id, 1, persist, keep_audio) for transect_id in transect_ids)
+        executor = None
+    else:
+        transect_workers = min(workers, len(transect_ids))
+        band_workers = max(1, workers // transect_workers)
+        print(f"Parallel sonification: {transect_workers} transect workers x {band_workers} band workers.")
+        executor = ProcessPoolExecutor(max_workers=transect_workers)
+        outputs = bounded_map(executor, sonify_transect, transect_ids, repeat(band_workers), repeat(persist), repeat(keep_audio),
+                              max_pending=2 * transect_workers)
+    try:
+        for transect_id, output_path in zip(transect_ids, outputs):
+            results[transect_id] = output_path
+            if on_complete is not None:
+                on_complete(transect_id, output_path)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+class Sonifier:
+    # Stage API: turns transects into a full WAV plus per-cell geospatial metadata.
+    # Inputs come from TRANSECT_FILE_PATHS; outputs are listed by output_paths(transect_id).
+    def __init__(self, workers=SONIFICATION_WORKERS):
+        self.workers = workers
+
+    def output_paths(self, transect_id):
+        return transect_output_paths(transect_id)
+
+    def process_transect(self, transect_id, band_workers=1):
+        # Sonifies a single transect in this process; returns the WAV path, or None on failure.
+        return process_transect(transect_id, band_workers)
+
+    def run(self, transect_ids=None, on_complete=None):
+        # Sonifies the given transects (default TRANSECTS_TO_PROCESS) to disk; returns {transect_id: wav_path}.
+        # on_complete(transect_id, wav_path) is called as each transect finishes.
+        def report(transect_id, artifacts):
+            if on_complete is not None:
+                on_complete(transect_id, None if artifacts is None else artifacts["audio_path"])
+        results = process_transects(TRANSECTS_TO_PROCESS if transect_ids is None else transect_ids, self.workers, report)
+        return {transect_id: None if artifacts is None else artifacts["audio_path"] for transect_id, artifacts in results.items()}
+
+    def stream(self, transect_id, persist=True, band_workers=None):
+        # Generator over (cell_metadata, cell_audio) while the transect renders (see stream_transect);
+        # row bands use all of this sonifier's workers.
+        return stream_transect(transect_id, self.workers if band_workers is None else band_workers, persist)
+
+    def run_in_memory(self, transect_ids=None, persist=True, on_complete=None):
+        # Like run, but returns {transect_id: artifacts} with the normalized audio kept in memory for
+        # the embedding stage (see sonify_transect); writing the WAV/metadata is optional.
+        return process_transects(TRANSECTS_TO_PROCESS if transect_ids is None else transect_ids, self.workers, on_complete,
+                                 persist=persist, keep_audio=True)
+
+def run(transect_ids=None, workers=SONIFICATION_WORKERS, on_complete=None):
+    # Pipeline entry point (see Sonifier.run).
+    return Sonifier(workers).run(transect_ids, on_complete)
+
+# -----------------------------------------------------------------------------
+# Main Processing Loop
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    run()
+
+    print("\nAll selected transects processed.")
+    print(f"Overall output directory: '{output_audio_base_dir}'")
@@ -1,56 +1,337 @@
 # Cell 2: Sonic Embedding with VGGish
 
-import tensorflow_hub as hub
 import numpy as np
 import soundfile as sf # Used for efficient chunked reading of audio files
 import os
 import glob # Needed to find your generated audio files
 import json # To load metadata if needed
+import hashlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor # Warm embedding workers / resampling threads
+from config import (
+    SONIFIED_AUDIO_BASE_DIR, EMBEDDING_OUTPUT_DIR, VGGISH_SAMPLE_RATE, VGGISH_BATCH_EXAMPLES,
+    VGGISH_RESAMPLE_THREADS, VGGISH_PREFETCH_BLOCKS,
+    VGGISH_MODEL_DIR, VGGISH_MODEL_CACHE_DIR, VGGISH_OFFLINE, VGGISH_WARMUP, VGGISH_WORKERS, EMBEDDING_STORE_DTYPE,
+)
+from utils.audio_utils import Prefetcher, StreamingFramer, StreamingResampler
+from utils.embedding_store import EmbeddingStore, assign_cells
 
 # --- Configuration for Embedding Module ---
-# Path to the directory where your sonified audio files are saved
-# This should match your 'output_audio_base_dir' from the previous cell
-SONIFIED_AUDIO_BASE_DIR = "/kaggle/input/openai-competition-dataset/sonified_outputs"
-EMBEDDING_OUTPUT_DIR = "audio_embeddings" # Directory to save extracted embeddings
-
-os.makedirs(EMBEDDING_OUTPUT_DIR, exist_ok=True)
+# SONIFIED_AUDIO_BASE_DIR (input WAVs, as written by the sonification stage), EMBEDDING_OUTPUT_DIR
+# and VGGISH_SAMPLE_RATE (16 kHz, as VGGish expects) come from config.
 
 # VGGish model URL from TensorFlow Hub
 VGGISH_MODEL_URL = "https://tfhub.dev/google/vggish/1"
 
-# VGGish expects audio at 16kHz
-VGGISH_SAMPLE_RATE = 16000
+# VGGish framing: log-mel frames use a 25 ms window every 10 ms, and each example (one embedding)
+# is 96 consecutive frames, with examples following each other every 0.96 s.
+VGGISH_STFT_WINDOW_S = 0.025
+VGGISH_STFT_HOP_S = 0.010
+VGGISH_EXAMPLE_HOP_S = 0.96
+
+
+def vggish_example_framing(sample_rate=VGGISH_SAMPLE_RATE):
+    """(window, hop) in samples of one VGGish example: 0.96 s of frames plus the last frame's overhang."""
+    hop = int(round(VGGISH_EXAMPLE_HOP_S * sample_rate))
+    window = hop + int(round(VGGISH_STFT_WINDOW_S * sample_rate)) - int(round(VGGISH_STFT_HOP_S * sample_rate))
+    return window, hop
+
+
+def vggish_frame_times_ms(num_frames, duration_ms=None, sample_rate=VGGISH_SAMPLE_RATE, first_frame=0):
+    """
+    (num_frames, 2) array of [start_ms, end_ms] per embedding on the audio timeline. Example k starts
+    at k * 0.96 s (k from first_frame on); ends are clipped to duration_ms, so a zero-padded tail
+    example only claims the audio it actually covers.
+    """
+    window, hop = vggish_example_framing(sample_rate)
+    starts = np.arange(first_frame, first_frame + num_frames) * (hop * 1000.0 / sample_rate)
+    ends = starts + window * 1000.0 / sample_rate
+    if duration_ms is not None:
+        ends = np.minimum(ends, max(float(duration_ms), 0.0))
+    return np.stack((starts, ends), axis=1)
+
+
+def audio_duration_ms(audio_filepath):
+    """Duration of an audio file in milliseconds (from its header)."""
+    info = sf.info(audio_filepath)
+    return info.frames * 1000.0 / info.samplerate
+
+
+def stored_frame_times(store, transect_id, num_frames):
+    """Frame index of a stored transect, or the nominal VGGish grid for embeddings stored without one."""
+    index = store.index(transect_id)
+    if index is not None and len(index) == num_frames:
+        return index
+    return vggish_frame_times_ms(num_frames)
+
+
+# Models already loaded by this process, by source (a process pays the graph-load cost once)
+_loaded_models = {}
+
+
+def is_saved_model_dir(path):
+    return bool(path) and os.path.isfile(os.path.join(path, "saved_model.pb"))
+
+
+def hub_cache_dir(cache_dir=VGGISH_MODEL_CACHE_DIR):
+    """
+    The cache directory TF Hub will actually use: TFHUB_CACHE_DIR when the environment sets it,
+    else cache_dir (exported to TFHUB_CACHE_DIR, so hub downloads land in and are served from it).
+    """
+    os.environ.setdefault("TFHUB_CACHE_DIR", cache_dir)
+    return os.environ["TFHUB_CACHE_DIR"]
+
+
+def hub_cache_path(model_url=VGGISH_MODEL_URL, cache_dir=VGGISH_MODEL_CACHE_DIR):
+    """Directory TF Hub caches `model_url` in under the hub cache (named by the SHA-1 of the URL)."""
+    return os.path.join(hub_cache_dir(cache_dir), hashlib.sha1(model_url.encode("utf8")).hexdigest())
+
+
+def resolve_vggish_source(model_url=VGGISH_MODEL_URL, model_dir=VGGISH_MODEL_DIR, cache_dir=VGGISH_MODEL_CACHE_DIR,
+                          offline=VGGISH_OFFLINE):
+    """
+    Where to load VGGish from: the local SavedModel in model_dir if there is one, else the hub URL
+    (served from cache_dir when cached). Offline, a model that is not available locally is an error
+    rather than a download attempt.
+    """
+    if is_saved_model_dir(model_dir):
+        return model_dir
+    if is_saved_model_dir(model_url): # A local path given in place of the URL
+        return model_url
+    if offline and not is_saved_model_dir(hub_cache_path(model_url, cache_dir)):
+        raise FileNotFoundError(f"VGGish model not available offline: no SavedModel in '{model_dir}' and "
+                                f"'{model_url}' is not cached in '{hub_cache_dir(cache_dir)}'. Run fetch_vggish_model() on a connected node.")
+    return model_url
+
+
+def load_vggish_model(model_url=VGGISH_MODEL_URL, model_dir=VGGISH_MODEL_DIR, cache_dir=VGGISH_MODEL_CACHE_DIR,
+                      offline=VGGISH_OFFLINE, warmup=VGGISH_WARMUP):
+    """
+    Load the VGGish model once per process (see resolve_vggish_source for where it comes from).
+    With warmup, one inference on silence runs right away so the first real batch does not pay for
+    graph tracing.
+    """
+    source = resolve_vggish_source(model_url, model_dir, cache_dir, offline)
+    if source in _loaded_models:
+        return _loaded_models[source]
+    hub_cache_dir(cache_dir) # The same cache resolve_vggish_source checked
+    import tensorflow_hub as hub # Imported here so importing this module stays cheap
+    print(f"Loading VGGish model from: {source}")
+    try:
+        vggish_model = hub.load(source)
+        print("VGGish model loaded successfully.")
+    except Exception as e:
+        print(f"ERROR: Could not load VGGish model. Please check the local model directory, your internet connection or TF Hub installation: {e}")
+        raise # Raise the exception to halt execution if model load fails
+    if warmup:
+        vggish_model(np.zeros(vggish_example_framing()[0], dtype=np.float32))
+    _loaded_models[source] = vggish_model
+    return vggish_model
+
+
+def fetch_vggish_model(model_dir=VGGISH_MODEL_DIR, model_url=VGGISH_MODEL_URL, cache_dir=VGGISH_MODEL_CACHE_DIR):
+    """Download the hub model (if not cached) and copy the SavedModel into model_dir, for offline nodes."""
+    if is_saved_model_dir(model_dir):
+        return model_dir
+    hub_cache_dir(cache_dir)
+    import tensorflow_hub as hub
+    resolved_path = hub.resolve(model_url)
+    shutil.copytree(resolved_path, model_dir, dirs_exist_ok=True)
+    print(f"VGGish SavedModel copied to: {model_dir}")
+    return model_dir
+
+
+def warm_embedding_worker(model_url, model_dir, cache_dir, offline, warmup):
+    """Process pool initializer: load (and warm up) the model before the worker takes any task."""
+    load_vggish_model(model_url, model_dir, cache_dir, offline, warmup)
+
+
+class BatchedEmbedder:
+    """Runs VGGish on many waveforms at once, packed into fixed-size batches of examples.
+
+    VGGish cuts a waveform into independent examples (example k reads samples
+    [k * hop, k * hop + window)), so runs of examples from different blocks and transects can share
+    one model call: each run is laid out on the example grid of a batch waveform, with one spare
+    slot between runs so neighbouring runs never overlap. The embeddings are then scattered back to
+    (key, example index). Full batches always hold `batch_examples` slots; only the last batch of a
+    flush is shorter.
+    """
+
+    def __init__(self, model, batch_examples=VGGISH_BATCH_EXAMPLES, sample_rate=VGGISH_SAMPLE_RATE):
+        self.model = model
+        self.batch_examples = max(1, int(batch_examples))
+        self.window, self.hop = vggish_example_framing(sample_rate)
+        self._pending = [] # [key, first_example, waveform, n_examples] runs waiting for a batch
+        self._pending_slots = 0
+
+    def num_examples(self, num_samples):
+        """Number of complete VGGish examples in a waveform of num_samples."""
+        return 0 if num_samples < self.window else 1 + (num_samples - self.window) // self.hop
+
+    def add(self, key, waveform, first_example=0):
+        """Queue a mono 16 kHz waveform whose first example is `first_example` of `key`.
+
+        Returns [(key, first_example, embeddings)] for the batches this filled (possibly none).
+        """
+        n_examples = self.num_examples(len(waveform))
+        if n_examples == 0:
+            return []
+        self._pending.append([key, first_example, np.asarray(waveform, dtype=np.float32), n_examples])
+        self._pending_slots += n_examples + 1
+        results = []
+        while self._pending_slots >= self.batch_examples:
+            results.extend(self._run_batch())
+        return results
+
+    def flush(self):
+        """Embed everything still queued; returns [(key, first_example, embeddings)]."""
+        results = []
+        while self._pending:
+            results.extend(self._run_batch())
+        return results
+
+    def _run_batch(self):
+        slots = min(self.batch_examples, self._pending_slots)
+        batch = np.zeros((slots - 1) * self.hop + self.window, dtype=np.float32)
+        placements = []
+        slot = 0
+        while self._pending and slot < slots:
+            run = self._pending[0]
+            key, first_example, waveform, n_examples = run
+            take = min(n_examples, slots - slot)
+            length = (take - 1) * self.hop + self.window
+            batch[slot * self.hop:slot * self.hop + length] = waveform[:length]
+            placements.append((key, first_example, slot, take))
+            if take == n_examples:
+                self._pending.pop(0)
+                self._pending_slots -= n_examples + 1
+                slot += take + 1 # Spare slot keeps the next run clear of this run's overhang
+            else:
+                run[1], run[2], run[3] = first_example + take, waveform[take * self.hop:], n_examples - take
+                self._pending_slots -= take
+                slot += take
+        embeddings = self.model(batch).numpy()
+        return [(key, first_example, embeddings[slot:slot + take]) for key, first_example, slot, take in placements]
+
+
+def resampled_blocks(audio_blocks, original_sr, num_channels, target_sample_rate=VGGISH_SAMPLE_RATE):
+    """
+    Yields consecutive (samples, channels) float32 blocks downmixed to mono and resampled to
+    target_sample_rate. One polyphase resampler (with a cached filter bank, see
+    utils.audio_utils.StreamingResampler) runs across all blocks, so block boundaries leave no seams.
+    """
+    resampler = StreamingResampler(original_sr, target_sample_rate)
+    for audio_block_orig_sr in audio_blocks:
+        # Ensure block is mono. If original is stereo, average across channels.
+        if num_channels > 1:
+            audio_block_orig_sr = np.mean(audio_block_orig_sr, axis=1) # Convert to mono (1D array)
+        # VGGish model expects float32 input in the range [-1.0, 1.0], as a 1D tensor (shape=(N,))
+        audio_block_orig_sr = np.reshape(audio_block_orig_sr, -1)
+        if audio_block_orig_sr.size > 0:
+            yield resampler.process(audio_block_orig_sr)
+    yield resampler.flush()
+
+
+def file_resampled_blocks(audio_filepath, chunk_duration_sec=10, target_sample_rate=VGGISH_SAMPLE_RATE):
+    """resampled_blocks for an audio file read in chunk_duration_sec blocks (the file stays open while iterating)."""
+    with sf.SoundFile(audio_filepath, 'r') as f_read:
+        # `always_2d=True` ensures stereo files give (samples, channels), mono files give (samples, 1)
+        audio_blocks = f_read.blocks(blocksize=int(chunk_duration_sec * f_read.samplerate), dtype='float32', always_2d=True)
+        for block in resampled_blocks(audio_blocks, f_read.samplerate, f_read.channels, target_sample_rate):
+            yield block
+
+
+# Threads shared by every resampling producer in this process (created on first use)
+_resample_executor = None
+
+
+def resample_executor():
+    global _resample_executor
+    if _resample_executor is None:
+        _resample_executor = ThreadPoolExecutor(max_workers=VGGISH_RESAMPLE_THREADS, thread_name_prefix="vggish-resample")
+    return _resample_executor
+
+
+def prefetch_blocks(blocks, max_ahead=VGGISH_PREFETCH_BLOCKS):
+    """Produce `blocks` (e.g. reading + resampling) on the resampling threads, ahead of inference."""
+    return Prefetcher(blocks, resample_executor(), max_ahead)
+
+
+def vggish_segments(vggish_blocks, target_sample_rate=VGGISH_SAMPLE_RATE):
+    """
+    Yields (first_example, segment) runs of complete VGGish examples from consecutive mono blocks at
+    target_sample_rate. The framer carries the overlap between blocks, so examples straddling a block
+    boundary are kept, and a tail not covered by any example is zero-padded into one last example.
+    """
+    framer = StreamingFramer(*vggish_example_framing(target_sample_rate))
+    for audio_block_vggish_sr in vggish_blocks:
+        for first_example, segment in framer.push(audio_block_vggish_sr):
+            yield first_example, segment
+    for first_example, segment in framer.flush(pad=True):
+        yield first_example, segment
 
-print("Cell 2: Sonic Embedding Setup Complete.")
 
-# --- Load the VGGish model ---
-# This will download the model weights if not already cached
-print(f"Loading VGGish model from: {VGGISH_MODEL_URL}")
-try:
-    vggish_model = hub.load(VGGISH_MODEL_URL)
-    print("VGGish model loaded successfully.")
-except Exception as e:
-    print(f"ERROR: Could not load VGGish model. Please check your internet connection or TF Hub installation: {e}")
-    # Exit or handle gracefully if the model cannot be loaded
-    raise # Raise the exception to halt execution if model load fails
+def collect_embeddings(results, embeddings_by_key):
+    """Scatter BatchedEmbedder results into {key: {first_example: embeddings}}."""
+    for key, first_example, embeddings in results:
+        embeddings_by_key.setdefault(key, {})[first_example] = embeddings
+
+
+def ordered_embeddings(pieces):
+    """Embedding pieces {first_example: embeddings} of one key, in example order."""
+    return [pieces[first_example] for first_example in sorted(pieces)]
+
 
 # --- Function to extract VGGish embeddings (Updated for chunked processing) ---
-def extract_vggish_embeddings(audio_filepath, target_sample_rate=VGGISH_SAMPLE_RATE, chunk_duration_sec=10):
+def embed_audio_blocks(audio_blocks, original_sr, num_channels, model, target_sample_rate=VGGISH_SAMPLE_RATE, source_name="",
+                       batch_examples=VGGISH_BATCH_EXAMPLES):
+    """
+    Downmixes each (samples, channels) float32 block to mono and resamples it to target_sample_rate
+    on a resampling thread (see resampled_blocks), while this thread runs VGGish on the examples of
+    the whole block sequence (see vggish_segments), with many examples packed into each model call
+    (see BatchedEmbedder). Returns the list of embedding arrays in example order. Shared by the file
+    reader and the in-memory handoff so both paths embed audio identically.
+    """
+    embedder = BatchedEmbedder(model, batch_examples, target_sample_rate)
+    pieces = {}
+    vggish_blocks = prefetch_blocks(resampled_blocks(audio_blocks, original_sr, num_channels, target_sample_rate))
+    try:
+        for first_example, segment in vggish_segments(vggish_blocks, target_sample_rate):
+            collect_embeddings(embedder.add(source_name, segment, first_example), pieces)
+    finally:
+        vggish_blocks.close()
+    collect_embeddings(embedder.flush(), pieces)
+    return ordered_embeddings(pieces.get(source_name, {}))
+
+
+def finish_embeddings(all_embeddings, source_name):
+    """Concatenate per-block embeddings into one array (empty if there are none)."""
+    if all_embeddings:
+        final_embeddings = np.concatenate(all_embeddings, axis=0)
+        print(f"    Extracted {final_embeddings.shape[0]} total embeddings (128-dim each) from '{source_name}'.")
+        return final_embeddings
+    print(f"    No embeddings extracted from '{source_name}'. File might be too short or processing failed.")
+    return np.array([])
+
+
+def extract_vggish_embeddings(audio_filepath, model, target_sample_rate=VGGISH_SAMPLE_RATE, chunk_duration_sec=10,
+                              batch_examples=VGGISH_BATCH_EXAMPLES):
     """
     Loads an audio file in chunks, resamples each chunk to the target_sample_rate (16kHz for VGGish),
     and extracts VGGish embeddings. This is memory-efficient for large audio files.
 
     Args:
         audio_filepath (str): Path to the input audio file (.wav).
+        model: Loaded VGGish model (see load_vggish_model).
         target_sample_rate (int): The sample rate expected by VGGish (default 16000 Hz).
         chunk_duration_sec (int): Duration of audio chunks to process at a time (in seconds).
+        batch_examples (int): VGGish examples packed into one model call.
 
     Returns:
         np.ndarray: A 2D array of VGGish embeddings. Each row is a 128-dimensional embedding
                     for a segment of audio. Returns an empty array if processing fails.
     """
-    all_embeddings = []
-    
+    source_name = os.path.basename(audio_filepath)
     try:
         with sf.SoundFile(audio_filepath, 'r') as f_read:
             original_sr = f_read.samplerate
@@ -60,57 +341,14 @@ def extract_vggish_embeddings(audio_filepath, target_sample_rate=VGGISH_SAMPLE_R
             # Aim for blocks of around `chunk_duration_sec` at the original sample rate
             block_size_samples_orig = int(chunk_duration_sec * original_sr)
             
-            print(f"    Processing '{os.path.basename(audio_filepath)}' in {chunk_duration_sec}s blocks (original SR: {original_sr} Hz, channels: {num_channels}).")
+            print(f"    Processing '{source_name}' in {chunk_duration_sec}s blocks (original SR: {original_sr} Hz, channels: {num_channels}).")
 
             # Iterate over audio in blocks
             # `always_2d=True` ensures stereo files give (samples, channels), mono files give (samples, 1)
-            for audio_block_orig_sr in f_read.blocks(blocksize=block_size_samples_orig, dtype='float32', always_2d=True):
-                # Ensure block is mono. If original is stereo, average across channels.
-                if num_channels > 1:
-                    audio_block_orig_sr = np.mean(audio_block_orig_sr, axis=1) # Convert to mono (1D array)
-
-                if audio_block_orig_sr.size == 0:
-                    continue
-
-                # Resample the current block if necessary
-                audio_block_vggish_sr = audio_block_orig_sr
-                if original_sr != target_sample_rate:
-                    try:
-                        import resampy
-                        audio_block_vggish_sr = resampy.resample(audio_block_orig_sr, sr_orig=original_sr, sr_new=target_sample_rate)
-                    except ImportError:
-                        from scipy.signal import resample
-                        num_samples_resampled = int(len(audio_block_orig_sr) * (target_sample_rate / original_sr))
-                        audio_block_vggish_sr = resample(audio_block_orig_sr, num_samples_resampled)
-                    except Exception as e:
-                        print(f"    Error during resampling block: {e}. Skipping this block.")
-                        continue
-
-                # VGGish model expects float32 input in the range [-1.0, 1.0]
-                audio_block_vggish_sr = audio_block_vggish_sr.astype(np.float32)
-
-                # FIXED: Ensure the tensor is 1D (shape=(N,)) as expected by VGGish model
-                audio_block_vggish_sr = np.squeeze(audio_block_vggish_sr)
-                # If audio_block_vggish_sr was (samples, 1), squeeze makes it (samples,)
-                # If it was already (samples,), squeeze does nothing.
-
-                # Only process if the block is long enough for at least one VGGish frame (0.96 sec = 15360 samples at 16kHz)
-                min_samples_for_vggish = int(VGGISH_SAMPLE_RATE * 0.96)
-                if len(audio_block_vggish_sr) >= min_samples_for_vggish:
-                    embeddings_block = vggish_model(audio_block_vggish_sr).numpy()
-                    all_embeddings.append(embeddings_block)
-                # else:
-                #    Optionally print if blocks are too short:
-                #    print(f"    Skipping too-short block ({len(audio_block_vggish_sr)} samples) for embedding in {os.path.basename(audio_filepath)}.")
-
-
-        if all_embeddings:
-            final_embeddings = np.concatenate(all_embeddings, axis=0)
-            print(f"    Extracted {final_embeddings.shape[0]} total embeddings (128-dim each) from '{os.path.basename(audio_filepath)}'.")
-            return final_embeddings
-        else:
-            print(f"    No embeddings extracted from '{os.path.basename(audio_filepath)}'. File might be too short or processing failed.")
-            return np.array([])
+            audio_blocks = f_read.blocks(blocksize=block_size_samples_orig, dtype='float32', always_2d=True)
+            all_embeddings = embed_audio_blocks(audio_blocks, original_sr, num_channels, model, target_sample_rate, source_name,
+                                                batch_examples)
+        return finish_embeddings(all_embeddings, source_name)
 
     except sf.LibsndfileError as e:
         print(f"    Error reading audio file '{audio_filepath}': {e}. This might mean the file is corrupted or not a valid WAV.")
@@ -120,53 +358,329 @@ def extract_vggish_embeddings(audio_filepath, target_sample_rate=VGGISH_SAMPLE_R
         return np.array([])
 
 
-# --- Main script to process sonified audio files ---
-print(f"\n--- Starting VGGish Embedding Extraction from {SONIFIED_AUDIO_BASE_DIR} ---")
+def extract_vggish_embeddings_from_array(audio, sample_rate, model, target_sample_rate=VGGISH_SAMPLE_RATE, chunk_duration_sec=10,
+                                         source_name="in-memory audio", batch_examples=VGGISH_BATCH_EXAMPLES):
+    """
+    Same as extract_vggish_embeddings, for audio already in memory: a (samples,) or
+    (samples, channels) float array at `sample_rate`, cut into the same chunk_duration_sec blocks.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim == 1:
+        audio = audio[:, None]
+    block_size_samples_orig = int(chunk_duration_sec * sample_rate)
+    audio_blocks = (audio[start:start + block_size_samples_orig] for start in range(0, audio.shape[0], block_size_samples_orig))
+    try:
+        all_embeddings = embed_audio_blocks(audio_blocks, sample_rate, audio.shape[1], model, target_sample_rate, source_name,
+                                            batch_examples)
+    except Exception as e:
+        print(f"    An unexpected error occurred during VGGish embedding for {source_name}: {e}")
+        return np.array([])
+    return finish_embeddings(all_embeddings, source_name)
+
+
+class EmbeddingExtractor:
+    """VGGish embedding stage: sonified WAV in, `{transect}_embeddings.npy` plus its frame index out
+    (see utils.embedding_store).
+
+    The model is loaded on first use and shared by every extractor in the process, so a
+    long-lived worker pays for it once and an extractor that is never used costs nothing. With
+    workers > 1, transects are embedded on a pool of worker processes that is kept (with a warm
+    model in each worker) until close().
+    """
 
-for transect_folder in os.listdir(SONIFIED_AUDIO_BASE_DIR):
-    transect_path = os.path.join(SONIFIED_AUDIO_BASE_DIR, transect_folder)
-    if os.path.isdir(transect_path):
-        # Find the full sonification WAV file
-        wav_files = glob.glob(os.path.join(transect_path, f"{transect_folder}_full_sonification_SOTA*.wav"))
-        
-        if not wav_files:
-            print(f"No sonified WAV file found for transect '{transect_folder}'. Skipping embedding.")
-            continue
-        
+    def __init__(self, audio_dir=SONIFIED_AUDIO_BASE_DIR, output_dir=EMBEDDING_OUTPUT_DIR, model_url=VGGISH_MODEL_URL,
+                 target_sample_rate=VGGISH_SAMPLE_RATE, chunk_duration_sec=10, batch_examples=VGGISH_BATCH_EXAMPLES,
+                 model_dir=VGGISH_MODEL_DIR, cache_dir=VGGISH_MODEL_CACHE_DIR, offline=VGGISH_OFFLINE, warmup=VGGISH_WARMUP,
+                 workers=VGGISH_WORKERS, store_dtype=EMBEDDING_STORE_DTYPE):
+        self.audio_dir = audio_dir
+        self.output_dir = output_dir
+        self.model_url = model_url
+        self.target_sample_rate = target_sample_rate
+        self.chunk_duration_sec = chunk_duration_sec
+        self.batch_examples = batch_examples
+        self.model_dir = model_dir
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.warmup = warmup
+        self.workers = workers
+        self.store = EmbeddingStore(output_dir, store_dtype)
+        self._model = None
+        self._pool = None
+
+    def __getstate__(self):
+        # Sent to pool workers without the model or the pool; each worker uses its own warm model
+        state = self.__dict__.copy()
+        state.update(_model=None, _pool=None)
+        return state
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load_vggish_model(self.model_url, self.model_dir, self.cache_dir, self.offline, self.warmup)
+        return self._model
+
+    def pool(self):
+        """The persistent worker pool (created on first use)."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_embedding_worker,
+                                             initargs=(self.model_url, self.model_dir, self.cache_dir, self.offline, self.warmup))
+        return self._pool
+
+    def close(self):
+        """Shut down the worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def audio_path(self, transect_id):
+        """Path of the transect's full sonification WAV, or None if there is none."""
+        wav_files = glob.glob(os.path.join(self.audio_dir, transect_id, f"{transect_id}_full_sonification_SOTA*.wav"))
         # Assuming there's only one relevant WAV file per transect folder
-        audio_file_path = wav_files[0]
-        print(f"\nProcessing audio for Transect: {transect_folder}")
+        return sorted(wav_files)[0] if wav_files else None
+
+    def output_path(self, transect_id):
+        return self.store.embeddings_path(transect_id)
+
+    def metadata_path(self, transect_id):
+        return os.path.join(self.audio_dir, transect_id, f"{transect_id}_geospatial_metadata.json")
+
+    def load_cells(self, transect_id):
+        """The transect's geospatial cell metadata, or None if it has none."""
+        metadata_filepath = self.metadata_path(transect_id)
+        if not os.path.exists(metadata_filepath):
+            return None
+        with open(metadata_filepath, 'r') as f:
+            return json.load(f)
+
+    def available_transects(self):
+        """Transect folders present in the audio directory."""
+        if not os.path.isdir(self.audio_dir):
+            return []
+        return sorted(d for d in os.listdir(self.audio_dir) if os.path.isdir(os.path.join(self.audio_dir, d)))
+
+    def extract(self, audio_filepath):
+        """Embeddings (n_frames, 128) for one audio file; empty array on failure."""
+        return extract_vggish_embeddings(audio_filepath, self.model, self.target_sample_rate, self.chunk_duration_sec,
+                                         self.batch_examples)
+
+    def extract_many(self, transect_ids):
+        """Embed several transects' WAVs with shared batches, so short files still fill model calls.
+
+        Yields (transect_id, embeddings, frame_times) in input order as soon as each transect's last
+        batch has run; transects without audio yield empty arrays.
+        """
+        transect_ids = list(transect_ids)
+        embedder = BatchedEmbedder(self.model, self.batch_examples, self.target_sample_rate)
+        pieces = {}
+        queued = [] # (transect_id, n_examples, duration_ms) in input order, waiting for their batches
+        streams = {} # Input index -> (audio path, prefetched 16 kHz blocks) of transects being read
+        try:
+            for i, transect_id in enumerate(transect_ids):
+                # Keep the next transects' files reading and resampling on the spare resampling threads
+                for j in range(i, min(i + VGGISH_RESAMPLE_THREADS, len(transect_ids))):
+                    if j not in streams:
+                        streams[j] = self._open_stream(transect_ids[j])
+                audio_file_path, vggish_blocks = streams.pop(i)
+                n_examples, duration_ms = 0, 0.0
+                if audio_file_path is None:
+                    print(f"No sonified WAV file found for transect '{transect_id}'. Skipping embedding.")
+                else:
+                    print(f"\nEmbedding audio for Transect: {transect_id} ({audio_file_path})")
+                    try:
+                        duration_ms = audio_duration_ms(audio_file_path)
+                        for first_example, segment in vggish_segments(vggish_blocks, self.target_sample_rate):
+                            collect_embeddings(embedder.add(transect_id, segment, first_example), pieces)
+                            n_examples = first_example + embedder.num_examples(len(segment))
+                    except Exception as e:
+                        print(f"    Error reading audio file '{audio_file_path}': {e}")
+                        pieces.pop(transect_id, None)
+                        n_examples = -1 # Never complete; reported empty below
+                    finally:
+                        vggish_blocks.close()
+                queued.append((transect_id, n_examples, duration_ms))
+                while queued and self._is_complete(pieces, *queued[0][:2]):
+                    yield self._finish_transect(pieces, *queued.pop(0))
+        finally:
+            for _, vggish_blocks in streams.values():
+                if vggish_blocks is not None:
+                    vggish_blocks.close()
+        collect_embeddings(embedder.flush(), pieces)
+        for transect_id, n_examples, duration_ms in queued:
+            yield self._finish_transect(pieces, transect_id, n_examples, duration_ms)
+
+    def _open_stream(self, transect_id):
+        # (audio path, prefetched 16 kHz blocks), or (None, None) if the transect has no WAV
+        audio_file_path = self.audio_path(transect_id)
+        if audio_file_path is None:
+            return None, None
+        return audio_file_path, prefetch_blocks(file_resampled_blocks(audio_file_path, self.chunk_duration_sec, self.target_sample_rate))
+
+    @staticmethod
+    def _finish_transect(pieces, transect_id, n_examples, duration_ms):
+        blocks = ordered_embeddings(pieces.pop(transect_id, {})) if n_examples > 0 else []
+        embeddings = finish_embeddings(blocks, transect_id)
+        return transect_id, embeddings, vggish_frame_times_ms(len(embeddings), duration_ms)
+
+    @staticmethod
+    def _is_complete(pieces, transect_id, n_examples):
+        if n_examples <= 0:
+            return True
+        return sum(len(embeddings) for embeddings in pieces.get(transect_id, {}).values()) == n_examples
+
+    def embed_stream(self, audio_chunks, sample_rate):
+        """Embed audio that arrives as chunks, e.g. cells straight from the sonifier.
+
+        Chunks are (samples,) or (samples, channels) float arrays at `sample_rate`. They are
+        downmixed, resampled to 16 kHz on the fly (audio already at 16 kHz passes through the
+        resampler unchanged) and framed across chunk boundaries, so the
+        result equals embedding the concatenated audio in one call. Examples are packed into
+        batch_examples-sized model calls (BatchedEmbedder); yields (first_example_index, embeddings)
+        in example order as each batch completes, then the remainder at the end of the stream.
+        The audio is embedded as given: the sonifier's cell stream is the raw mix, before the
+        transect-wide peak normalization and PCM quantization of the WAV.
+        """
+        resampler = StreamingResampler(sample_rate, self.target_sample_rate)
+        framer = StreamingFramer(*vggish_example_framing(self.target_sample_rate))
+        embedder = BatchedEmbedder(self.model, self.batch_examples, self.target_sample_rate)
+        for chunk in audio_chunks:
+            chunk = np.asarray(chunk, dtype=np.float32)
+            mono = chunk.mean(axis=1) if chunk.ndim == 2 else chunk
+            for first_example, segment in framer.push(resampler.process(mono)):
+                for _, first, embeddings in embedder.add(None, segment, first_example):
+                    yield first, embeddings
+        for first_example, segment in framer.push(resampler.flush()) + framer.flush(pad=True):
+            for _, first, embeddings in embedder.add(None, segment, first_example):
+                yield first, embeddings
+        for _, first, embeddings in embedder.flush():
+            yield first, embeddings
+
+    def process_stream(self, transect_id, audio_chunks, sample_rate, persist=True, on_embeddings=None):
+        """Embed a transect from a stream of audio chunks.
+
+        Returns (embeddings, frame_times); with persist, they are saved with cells from the
+        metadata file (call save_embeddings with in-memory cells instead when there is none yet).
+        on_embeddings(first_example, embeddings) is called for every block as soon as it is
+        embedded, e.g. to score it with a StreamingAnomalyScorer.
+        """
+        print(f"\nEmbedding streamed audio for Transect: {transect_id}")
+        received = [0]
+        def counted(chunks):
+            for chunk in chunks:
+                received[0] += len(chunk)
+                yield chunk
+        blocks = []
+        for first_example, embeddings in self.embed_stream(counted(audio_chunks), sample_rate):
+            if on_embeddings is not None:
+                on_embeddings(first_example, embeddings)
+            blocks.append(embeddings)
+        embeddings = finish_embeddings(blocks, f"{transect_id} (stream)")
+        frame_times = vggish_frame_times_ms(len(embeddings), received[0] * 1000.0 / sample_rate)
+        if persist and embeddings.size > 0:
+            self.save_embeddings(transect_id, embeddings, frame_times)
+        return embeddings, frame_times
+
+    def save_embeddings(self, transect_id, embeddings, frame_times=None, cells=None):
+        """Store the embeddings with their frame index: [start_ms, end_ms] per frame (default: the
+        nominal VGGish grid) and the cell each frame falls in, from `cells` or the metadata file."""
+        if frame_times is None:
+            frame_times = vggish_frame_times_ms(len(embeddings))
+        if cells is None:
+            cells = self.load_cells(transect_id)
+        cell_ids = None
+        if cells:
+            cell_ids = assign_cells(frame_times, [cell['audio_start_ms'] for cell in cells], [cell['audio_end_ms'] for cell in cells])
+        output_filepath = self.store.write(transect_id, embeddings, frame_times, cell_ids)
+        print(f"  Embeddings saved to: {output_filepath}")
+        return output_filepath
+
+    def extract_array(self, audio, sample_rate, source_name="in-memory audio"):
+        """Embeddings (n_frames, 128) for an in-memory audio buffer; empty array on failure."""
+        return extract_vggish_embeddings_from_array(audio, sample_rate, self.model, self.target_sample_rate,
+                                                    self.chunk_duration_sec, source_name, self.batch_examples)
+
+    def process_transect(self, transect_id):
+        """Extract and save one transect's embeddings; returns the .npy path, or None."""
+        audio_file_path = self.audio_path(transect_id)
+        if audio_file_path is None:
+            print(f"No sonified WAV file found for transect '{transect_id}'. Skipping embedding.")
+            return None
+        print(f"\nProcessing audio for Transect: {transect_id}")
         print(f"  Input audio file: {audio_file_path}")
 
-        embeddings = extract_vggish_embeddings(audio_file_path)
+        embeddings = self.extract(audio_file_path)
+        if embeddings.size == 0:
+            return None
+        frame_times = vggish_frame_times_ms(len(embeddings), audio_duration_ms(audio_file_path))
+
+        # Each VGGish embedding covers 0.975 s of audio every 0.96 s; the frame index links each one
+        # to the geospatial cell it falls in
+        cell_metadata = self.load_cells(transect_id)
+        if cell_metadata is not None:
+            print(f"  Loaded {len(cell_metadata)} geospatial cells and {embeddings.shape[0]} VGGish embeddings.")
+        else:
+            print(f"  Warning: Geospatial metadata file not found for {transect_id}. Cannot link embeddings to original cells.")
+        return self.save_embeddings(transect_id, embeddings, frame_times, cell_metadata or [])
+
+    def process_in_memory(self, artifacts, persist=True):
+        """In-memory handoff: embed artifacts["audio"] (from Sonifier.run_in_memory).
+
+        Stores the embeddings in artifacts["embeddings"] and their timestamps in
+        artifacts["embedding_times"], and drops the audio buffer, which no later stage needs. With
+        persist, they are written to the embedding store as well. Returns the embeddings.
+        """
+        transect_id = artifacts["transect_id"]
+        print(f"\nEmbedding in-memory audio for Transect: {transect_id}")
+        audio = artifacts.pop("audio", None)
+        duration_ms = None
+        if audio is None:
+            embeddings = self.extract(artifacts["audio_path"]) if artifacts.get("audio_path") else np.array([])
+            if embeddings.size > 0:
+                duration_ms = audio_duration_ms(artifacts["audio_path"])
+        else:
+            embeddings = self.extract_array(audio, artifacts["sample_rate"], source_name=transect_id)
+            duration_ms = len(audio) * 1000.0 / artifacts["sample_rate"]
+        del audio
+        frame_times = vggish_frame_times_ms(len(embeddings), duration_ms)
+        artifacts.update(embeddings=embeddings, embedding_times=frame_times)
+        if persist and embeddings.size > 0:
+            self.save_embeddings(transect_id, embeddings, frame_times, artifacts.get("cells"))
+        return embeddings
+
+    def run(self, transect_ids=None, on_complete=None):
+        """Process the given transects (default: every transect folder in audio_dir).
+
+        Returns {transect_id: embeddings_path or None}; on_complete(transect_id, path) is called
+        after each transect.
+        """
+        transect_ids = self.available_transects() if transect_ids is None else list(transect_ids)
+        print(f"\n--- Starting VGGish Embedding Extraction from {self.audio_dir} ---")
+        results = {}
+        if self.workers > 1 and len(transect_ids) > 1:
+            # Whole transects go to the warm workers; each batches its own transect's examples
+            print(f"Parallel embedding: {self.workers} workers.")
+            for transect_id, output_path in zip(transect_ids, self.pool().map(self.process_transect, transect_ids)):
+                results[transect_id] = output_path
+                if on_complete is not None:
+                    on_complete(transect_id, output_path)
+        else:
+            # Transects share model batches; each is saved as soon as its last batch has run
+            for transect_id, embeddings, frame_times in self.extract_many(transect_ids):
+                results[transect_id] = self.save_embeddings(transect_id, embeddings, frame_times) if embeddings.size > 0 else None
+                if on_complete is not None:
+                    on_complete(transect_id, results[transect_id])
+        print("\n--- VGGish Embedding Extraction Complete for all processed transects. ---")
+        print(f"All embeddings saved to: '{self.output_dir}'")
+        return results
+
+
+def run(transect_ids=None, on_complete=None):
+    """Pipeline entry point (see EmbeddingExtractor.run)."""
+    extractor = EmbeddingExtractor()
+    try:
+        return extractor.run(transect_ids, on_complete)
+    finally:
+        extractor.close()
 
-        if embeddings.size > 0:
-            output_filepath = os.path.join(EMBEDDING_OUTPUT_DIR, f"{transect_folder}_embeddings.npy")
-            np.save(output_filepath, embeddings)
-            print(f"  Embeddings saved to: {output_filepath}")
-            
-            # Optionally, load and inspect the associated geospatial metadata
-            metadata_filepath = os.path.join(transect_path, f"{transect_folder}_geospatial_metadata.json")
-            if os.path.exists(metadata_filepath):
-                with open(metadata_filepath, 'r') as f:
-                    cell_metadata = json.load(f)
-                
-                # Each embedding corresponds to a segment of audio. VGGish segments are 0.96s long.
-                # You'll need to align these embeddings back to your original CellGeom objects.
-                # This is a crucial step for the anomaly detection module.
-                # A simple approximation: each VGGish embedding represents approx 0.96 seconds,
-                # with a hop of 0.5 seconds.
-                # You'll have N embeddings for an audio of T seconds.
-                # num_vggish_embeddings = (T - 0.96) / 0.5 + 1
-                # Here, your DURATION_PER_GRID_CELL is 6 seconds.
-                # Each 6-second cell would produce (6 - 0.96)/0.5 + 1 = 11.08 -> 11 embeddings
-                
-                print(f"  Loaded {len(cell_metadata)} geospatial cells and {embeddings.shape[0]} VGGish embeddings.")
-                print("  Note: You will need to carefully map VGGish embeddings (0.96s segments) to your original 6-second geospatial cells.")
-                # You might store (embedding_index, cell_id) mappings or similar.
-                # This could involve creating a new metadata file that links embeddings to their original cell_geom.
-            else:
-                print(f"  Warning: Geospatial metadata file not found for {transect_folder}. Cannot link embeddings to original cells.")
 
-print("\n--- VGGish Embedding Extraction Complete for all processed transects. ---")
-print(f"All embeddings saved to: '{EMBEDDING_OUTPUT_DIR}'")
\ No newline at end of file
+if __name__ == "__main__":
+    run()
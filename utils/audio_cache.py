@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import time
+import numpy as np
+
+# Content-addressed store for rendered cell audio. Each entry is a float32 buffer keyed by a hash
+# of everything that determines it (cell features, synthesis settings, seed, sample rate); all
+# entries live in one SQLite file that is trimmed least-recently-used first once it exceeds
+# `max_bytes`. Several processes may share the file; the total stored size is kept in a one-row
+# table by triggers, so eviction checks never scan the entries.
+
+
+class CellAudioCache:
+    """Size-bounded LRU blob store for float32 cell buffers, backed by SQLite."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = None
+        self._pid = None
+        self._connect()
+
+    def _connect(self):
+        # SQLite connections must not cross a fork: each process opens its own
+        self._conn = sqlite3.connect(self.path, timeout=60)
+        self._pid = os.getpid()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cell_audio ("
+            "key TEXT PRIMARY KEY, frames INTEGER, channels INTEGER, size INTEGER, last_used REAL, data BLOB)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cell_audio_lru ON cell_audio (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cell_audio_stats (id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER)")
+        # Seeded once from the entries, so files written before the stats table keep a correct total
+        self._conn.execute("INSERT OR IGNORE INTO cell_audio_stats (id, total_bytes) SELECT 0, COALESCE(SUM(size), 0) FROM cell_audio")
+        self._conn.execute("CREATE TRIGGER IF NOT EXISTS cell_audio_insert AFTER INSERT ON cell_audio BEGIN "
+                           "UPDATE cell_audio_stats SET total_bytes = total_bytes + NEW.size WHERE id = 0; END")
+        self._conn.execute("CREATE TRIGGER IF NOT EXISTS cell_audio_delete AFTER DELETE ON cell_audio BEGIN "
+                           "UPDATE cell_audio_stats SET total_bytes = total_bytes - OLD.size WHERE id = 0; END")
+        self._conn.execute("CREATE TRIGGER IF NOT EXISTS cell_audio_resize AFTER UPDATE OF size ON cell_audio BEGIN "
+                           "UPDATE cell_audio_stats SET total_bytes = total_bytes + NEW.size - OLD.size WHERE id = 0; END")
+        self._conn.commit()
+
+    @property
+    def conn(self):
+        """This process's connection (reopened in a forked child instead of reusing the parent's)."""
+        if self._pid != os.getpid():
+            self._connect()
+        return self._conn
+
+    def get_many(self, keys):
+        """Return {key: (frames, channels) float32 array} for the keys present, marking them as used."""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), 500): # Stay under SQLite's bound-parameter limit
+            chunk = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, frames, channels, data FROM cell_audio WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for key, frames, channels, data in rows:
+                found[key] = np.frombuffer(data, dtype=np.float32).reshape(frames, channels).copy()
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE cell_audio SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self.conn.commit()
+        return found
+
+    def put_many(self, items):
+        """Store {key: audio} buffers (1D mono or (frames, channels)), then evict down to max_bytes."""
+        now = time.time()
+        rows = []
+        for key, audio in items.items():
+            audio = np.ascontiguousarray(audio, dtype=np.float32)
+            if audio.ndim == 1:
+                audio = audio[:, None]
+            rows.append((key, audio.shape[0], audio.shape[1], audio.nbytes, now, audio.tobytes()))
+        if not rows:
+            return
+        # An upsert rather than INSERT OR REPLACE: the implicit delete of REPLACE would skip the delete trigger
+        self.conn.executemany(
+            "INSERT INTO cell_audio (key, frames, channels, size, last_used, data) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET frames = excluded.frames, channels = excluded.channels, size = excluded.size, "
+            "last_used = excluded.last_used, data = excluded.data", rows
+        )
+        self.conn.commit()
+        self.evict()
+
+    def total_bytes(self):
+        return self.conn.execute("SELECT total_bytes FROM cell_audio_stats WHERE id = 0").fetchone()[0]
+
+    def evict(self):
+        """Drop least-recently-used entries until the stored audio fits in max_bytes."""
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+        freed = 0
+        stale_keys = []
+        for key, size in self.conn.execute("SELECT key, size FROM cell_audio ORDER BY last_used ASC"):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self.conn.executemany("DELETE FROM cell_audio WHERE key = ?", stale_keys)
+        self.conn.commit()
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._conn.close()
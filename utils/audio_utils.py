@@ -1,6 +1,11 @@
+import math
+import os
+import queue
+import threading
+from functools import lru_cache
 import numpy as np
 import soundfile as sf
-from scipy.signal import resample
+from scipy.signal import firwin, upfirdn
 
 def midi_to_hz(midi_note):
     return 440.0 * (2.0 ** ((midi_note - 69) / 12.0))
@@ -29,6 +34,267 @@ def write_audio(filename, signal, sr=44100):
     sf.write(filename, normalize_audio(signal), sr)
 
 def resample_audio(audio_array, orig_sr, target_sr=16000):
-    """Resample audio to a target sample rate."""
-    num_samples = int(len(audio_array) * target_sr / orig_sr)
-    return resample(audio_array, num_samples)
+    """Resample audio (along axis 0) to a target sample rate.
+
+    Uses rational polyphase filtering with a cached filter bank (see StreamingResampler), so the
+    fixed ratios of the pipeline (44100 -> 16000, 11025 -> 16000) never redesign a filter; audio
+    already at target_sr is returned unfiltered.
+    """
+    audio_array = np.asarray(audio_array)
+    if audio_array.ndim == 2: # (samples, channels)
+        return np.stack([resample_audio(audio_array[:, c], orig_sr, target_sr) for c in range(audio_array.shape[1])], axis=1)
+    resampler = StreamingResampler(orig_sr, target_sr)
+    return np.concatenate((resampler.process(audio_array), resampler.flush()))
+
+
+class StreamingAudioWriter:
+    """Assemble audio by appending float32 buffers into one memory-mapped array.
+
+    The running peak is tracked on append, so the final WAV is normalized and written in a
+    single pass over the buffer instead of re-reading intermediate files.
+    """
+
+    def __init__(self, buffer_path, sample_rate, channels=1, expected_frames=0):
+        self.buffer_path = buffer_path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames_written = 0
+        self.peak = 0.0
+        self._capacity = 0
+        self._buffer = None
+        self._reserve(max(int(expected_frames), 1))
+
+    def _reserve(self, frames):
+        """Grow the backing file so it can hold at least `frames` frames."""
+        if frames <= self._capacity:
+            return
+        if self._buffer is not None:
+            self._buffer.flush()
+            del self._buffer
+        with open(self.buffer_path, "ab") as f:
+            f.truncate(frames * self.channels * np.dtype(np.float32).itemsize)
+        self._buffer = np.memmap(self.buffer_path, dtype=np.float32, mode="r+", shape=(frames, self.channels))
+        self._capacity = frames
+
+    def append(self, samples):
+        """Append (frames,) or (frames, channels) float samples and update the running peak."""
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        n = samples.shape[0]
+        if n == 0:
+            return self.frames_written
+        if self.frames_written + n > self._capacity:
+            self._reserve(max(self.frames_written + n, 2 * self._capacity))
+        self._buffer[self.frames_written:self.frames_written + n] = samples
+        self.peak = max(self.peak, float(np.max(np.abs(samples))))
+        self.frames_written += n
+        return self.frames_written
+
+    def finalize(self, output_path, target_peak=0.95, subtype="PCM_16", block_size=1 << 16):
+        """Write the peak-normalized audio to `output_path` and remove the buffer file."""
+        normalization_factor = target_peak / self.peak if self.peak > 1e-6 else 1.0
+        with sf.SoundFile(output_path, "w", self.sample_rate, self.channels, subtype=subtype) as f_write:
+            for start in range(0, self.frames_written, block_size):
+                block = self._buffer[start:min(start + block_size, self.frames_written)]
+                f_write.write(block * normalization_factor)
+        self.close()
+        return normalization_factor
+
+    def normalized_array(self, target_peak=0.95):
+        """Return an in-memory float32 copy of the audio, peak-normalized like finalize()."""
+        normalization_factor = target_peak / self.peak if self.peak > 1e-6 else 1.0
+        return np.multiply(self._buffer[:self.frames_written], np.float32(normalization_factor), dtype=np.float32)
+
+    def close(self):
+        """Release and delete the backing buffer file."""
+        if self._buffer is not None:
+            del self._buffer
+            self._buffer = None
+        if os.path.exists(self.buffer_path):
+            os.remove(self.buffer_path)
+
+
+@lru_cache(maxsize=None)
+def polyphase_filter(up, down, window=("kaiser", 5.0)):
+    """Return (h, n_pre_remove): the zero-padded anti-aliasing filter scipy.signal.resample_poly
+    uses for `up`/`down`, and the number of leading outputs it discards to centre the result.
+
+    Filters are designed once per ratio and shared (read-only) by every resampler.
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = firwin(2 * half_len + 1, 1.0 / max_rate, window=window) * up
+    n_pre_pad = down - half_len % down
+    h = np.concatenate((np.zeros(n_pre_pad), h))
+    h.setflags(write=False)
+    return h, (half_len + n_pre_pad) // down
+
+
+class StreamingResampler:
+    """Polyphase resampler for audio that arrives in chunks.
+
+    Chunks may have any length; the concatenated output matches
+    scipy.signal.resample_poly(x, up, down) over the whole stream (zero padding at both ends),
+    so chunk boundaries leave no seams. Only the last few input samples the filter still needs
+    are kept between calls. Equal rates pass samples straight through (no filter is designed).
+    """
+
+    def __init__(self, orig_sr, target_sr):
+        g = math.gcd(int(orig_sr), int(target_sr))
+        self.up = int(target_sr) // g
+        self.down = int(orig_sr) // g
+        self._h, self._n_next = (None, 0) if self.up == self.down else polyphase_filter(self.up, self.down)
+        self._buffer = np.zeros(0)
+        self._offset = 0 # Absolute index of _buffer[0]; kept a multiple of `down`
+        self._received = 0
+        self._emitted = 0
+
+    def _drain(self):
+        # Emit every output whose filter support lies inside the received input
+        n_end = -(-self._received * self.up // self.down)
+        if n_end <= self._n_next:
+            return np.zeros(0, dtype=np.float32)
+        q = self._offset * self.up // self.down
+        z = upfirdn(self._h, self._buffer, self.up, self.down)
+        out = z[self._n_next - q:n_end - q]
+        self._n_next = n_end
+        # Drop input that no future output can reach
+        keep_from = max(self._offset, ((self._n_next * self.down - len(self._h)) // self.up + 1) // self.down * self.down)
+        self._buffer = self._buffer[keep_from - self._offset:]
+        self._offset = keep_from
+        return out.astype(np.float32)
+
+    def process(self, samples):
+        """Resample the next mono chunk; returns the float32 output available so far."""
+        if self.up == self.down:
+            self._emitted += len(samples)
+            return np.asarray(samples, dtype=np.float32)
+        self._buffer = np.concatenate((self._buffer, np.asarray(samples, dtype=np.float64)))
+        self._received += len(samples)
+        out = self._drain()
+        self._emitted += len(out)
+        return out
+
+    def flush(self):
+        """Return the remaining output once the stream has ended."""
+        n_total = -(-self._received * self.up // self.down)
+        if self.up == self.down or self._emitted >= n_total:
+            return np.zeros(0, dtype=np.float32)
+        # Feed zeros until the last output's filter support is covered, then trim to the true length
+        last = self._n_next + (n_total - self._emitted)
+        pad = max(0, (last * self.down) // self.up + 1 - self._received)
+        self._buffer = np.concatenate((self._buffer, np.zeros(pad)))
+        self._received += pad
+        out = self._drain()[:n_total - self._emitted]
+        self._emitted += len(out)
+        return out
+
+
+class StreamingFramer:
+    """Cut a sample stream into fixed windows with a fixed hop, across chunk boundaries.
+
+    Frame k covers samples [k * hop, k * hop + window) of the whole stream. push() returns
+    (first_frame, segment) pairs where `segment` holds exactly the samples of the next run of
+    complete frames, so a model that frames its input with the same window/hop sees every frame
+    once, including those straddling a chunk boundary.
+    """
+
+    def __init__(self, window, hop):
+        self.window = window
+        self.hop = hop
+        self.next_frame = 0
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._offset = 0 # Absolute sample index of _buffer[0]
+
+    def _complete_frames(self):
+        total = self._offset + len(self._buffer)
+        if total < self.window:
+            return 0
+        return (total - self.window) // self.hop + 1 - self.next_frame
+
+    def _take(self, n_frames):
+        start = self.next_frame * self.hop - self._offset
+        segment = self._buffer[start:start + (n_frames - 1) * self.hop + self.window]
+        first_frame = self.next_frame
+        self.next_frame += n_frames
+        # Keep the overlap the next frame shares with this segment
+        keep_from = self.next_frame * self.hop - self._offset
+        self._buffer = self._buffer[keep_from:]
+        self._offset += keep_from
+        return first_frame, segment
+
+    def push(self, samples, min_frames=1):
+        """Append samples; return [(first_frame, segment)] once at least `min_frames` frames are complete."""
+        self._buffer = np.concatenate((self._buffer, np.asarray(samples, dtype=np.float32)))
+        n_frames = self._complete_frames()
+        return [self._take(n_frames)] if n_frames >= max(min_frames, 1) else []
+
+    def flush(self, pad=False):
+        """Return the remaining complete frames at the end of the stream.
+
+        With pad, samples not covered by any frame (a tail shorter than one hop, or a stream
+        shorter than one window) are zero-padded into one last frame instead of being dropped.
+        """
+        n_frames = self._complete_frames()
+        segments = [self._take(n_frames)] if n_frames > 0 else []
+        total = self._offset + len(self._buffer)
+        covered_end = (self.next_frame - 1) * self.hop + self.window if self.next_frame else 0
+        if pad and total > covered_end:
+            missing = self.next_frame * self.hop + self.window - total
+            self._buffer = np.concatenate((self._buffer, np.zeros(missing, dtype=np.float32)))
+            segments.append(self._take(1))
+        return segments
+
+
+class Prefetcher:
+    """Run an iterator on an executor thread, up to `max_ahead` items ahead of the consumer.
+
+    A producer/consumer pair: producing the next items (e.g. reading and resampling audio
+    blocks) overlaps with consuming the current one. Exceptions raised by the producer are
+    re-raised in the consumer; close(), or abandoning the iteration, stops the producer.
+    """
+
+    _DONE = object()
+
+    def __init__(self, iterable, executor, max_ahead=4):
+        self._items = queue.Queue(maxsize=max(1, int(max_ahead)))
+        self._stopped = threading.Event()
+        self._future = executor.submit(self._produce, iterable)
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, iterable):
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not self._put((item, None)):
+                    return
+            self._put((self._DONE, None))
+        except BaseException as e:
+            self._put((None, e))
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    def __iter__(self):
+        try:
+            while True:
+                item, error = self._items.get()
+                if error is not None:
+                    raise error
+                if item is self._DONE:
+                    return
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        self._stopped.set()
@@ -0,0 +1,213 @@
+import json
+import os
+import warnings
+import numpy as np
+from scipy.ndimage import uniform_filter
+
+# Per-cell feature table produced for every sonification cell of a mosaic.
+# Rows are stored in the same row-major order the sonification loop walks the grid.
+CELL_FEATURE_DTYPE = np.dtype([
+    ("cell_row", np.int32), ("cell_col", np.int32),
+    ("row_off", np.int64), ("col_off", np.int64),
+    ("minx", np.float64), ("miny", np.float64), ("maxx", np.float64), ("maxy", np.float64),
+    ("dtm_nan_percent", np.float64),
+    ("mean_elevation", np.float64), ("std_elevation", np.float64),
+    ("mean_slope", np.float64), ("mean_roughness", np.float64),
+    ("mean_ndvi", np.float64), ("mean_evi", np.float64), ("mean_bsi", np.float64),
+    ("mean_brightness", np.float64), ("mean_ndwi", np.float64), ("ndvi_nan_percent", np.float64),
+    ("mean_hydro_dem", np.float64), ("mean_flow_dir", np.float64), ("mean_flow_acc", np.float64),
+    ("flow_acc_nan_percent", np.float64),
+    ("is_valid", np.bool_),
+])
+
+# Ancillary (satellite / hydro) per-cell layers and the value used when a layer is missing.
+ANCILLARY_FIELDS = {
+    "mean_ndvi": np.nan, "mean_evi": np.nan, "mean_bsi": np.nan, "mean_brightness": np.nan,
+    "mean_ndwi": np.nan, "ndvi_nan_percent": 100.0,
+    "mean_hydro_dem": np.nan, "mean_flow_dir": np.nan, "mean_flow_acc": np.nan,
+    "flow_acc_nan_percent": 100.0,
+}
+
+
+def cell_grid_shape(height, width, pixels_per_cell):
+    """Return the number of cell rows and columns needed to cover a raster."""
+    return -(-height // pixels_per_cell), -(-width // pixels_per_cell)
+
+
+def iter_tile_groups(array, pixels_per_cell):
+    """Yield (cell_rows, cell_cols, tiles) groups of equally sized cell tiles.
+
+    Full cells are reshaped into a single (..., rows, cols, p, p) view; ragged cells on the
+    bottom/right edge form their own groups so every tile keeps its true extent.
+    """
+    p = pixels_per_cell
+    height, width = array.shape[-2:]
+    full_rows, rem_h = divmod(height, p)
+    full_cols, rem_w = divmod(width, p)
+    row_groups = [(slice(0, full_rows), 0, full_rows * p, p)] if full_rows else []
+    if rem_h: row_groups.append((slice(full_rows, full_rows + 1), full_rows * p, height, rem_h))
+    col_groups = [(slice(0, full_cols), 0, full_cols * p, p)] if full_cols else []
+    if rem_w: col_groups.append((slice(full_cols, full_cols + 1), full_cols * p, width, rem_w))
+
+    lead = array.shape[:-2]
+    for cell_rows, r0, r1, tile_h in row_groups:
+        for cell_cols, c0, c1, tile_w in col_groups:
+            block = array[..., r0:r1, c0:c1]
+            n_r, n_c = (r1 - r0) // tile_h, (c1 - c0) // tile_w
+            tiles = block.reshape(lead + (n_r, tile_h, n_c, tile_w))
+            yield cell_rows, cell_cols, np.moveaxis(tiles, -3, -2)
+
+
+def block_reduce(array, pixels_per_cell, reducer):
+    """Reduce every cell tile of a (..., H, W) raster with reducer(tiles) -> (..., rows, cols)."""
+    n_rows, n_cols = cell_grid_shape(array.shape[-2], array.shape[-1], pixels_per_cell)
+    out = np.full(array.shape[:-2] + (n_rows, n_cols), np.nan, dtype=np.float64)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        for cell_rows, cell_cols, tiles in iter_tile_groups(array, pixels_per_cell):
+            out[..., cell_rows, cell_cols] = reducer(tiles)
+    return out
+
+
+def tile_nanmean(tiles):
+    """NaN-aware mean of each tile."""
+    return np.nanmean(tiles, axis=(-2, -1), dtype=np.float64)
+
+
+def tile_nanstd(tiles):
+    """NaN-aware standard deviation of each tile."""
+    return np.nanstd(tiles, axis=(-2, -1), dtype=np.float64)
+
+
+def tile_nan_percent(tiles):
+    """Percentage of NaN pixels in each tile."""
+    return np.isnan(tiles).mean(axis=(-2, -1)) * 100.0
+
+
+def tile_all_nan(tiles):
+    """True for tiles without a single valid pixel."""
+    return np.isnan(tiles).all(axis=(-2, -1))
+
+
+def tile_slope(tiles, resolution):
+    """Mean slope in degrees of each tile, with gradients confined to the tile."""
+    tiles = tiles.astype(np.float64)
+    if resolution == 0 or tiles.shape[-2] < 2 or tiles.shape[-1] < 2:
+        return np.zeros(tiles.shape[:-2])
+    dx, dy = np.gradient(tiles, axis=(-2, -1))
+    slope = np.nanmean(np.degrees(np.arctan(np.sqrt(dx**2 + dy**2) / resolution)), axis=(-2, -1))
+    return np.where(tile_all_nan(tiles), 0.0, slope)
+
+
+def tile_roughness(tiles, window_size_pixels=3):
+    """Std of each tile's residual from its local mean (moving window confined to the tile)."""
+    tiles = tiles.astype(np.float64)
+    if tiles.shape[-2] < window_size_pixels or tiles.shape[-1] < window_size_pixels:
+        return np.zeros(tiles.shape[:-2])
+    size = (1,) * (tiles.ndim - 2) + (window_size_pixels, window_size_pixels)
+    diff = tiles - uniform_filter(tiles, size=size, mode='reflect')
+    roughness = np.nanstd(diff, axis=(-2, -1))
+    return np.where(tile_all_nan(diff), 0.0, roughness)
+
+
+def spectral_index_rasters(sat_data):
+    """Compute NDVI, EVI, BSI, NDWI and brightness rasters for a whole Sentinel-2 stack.
+
+    Band conventions follow the per-cell code in sonification: Blue=0, Green=1, Red=3,
+    NIR=7, SWIR1=9 for NDVI/EVI/BSI, and Green=2, NIR=6 for NDWI. A single-band raster is
+    treated as a precomputed NDVI/brightness layer.
+    """
+    indices = {}
+    if sat_data is None or sat_data.size == 0:
+        return indices
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if sat_data.ndim == 3 and sat_data.shape[0] >= 11:
+            red = sat_data[3].astype(np.float64); nir = sat_data[7].astype(np.float64)
+            blue = sat_data[0].astype(np.float64); swir1 = sat_data[9].astype(np.float64)
+            denominator_ndvi = nir + red
+            indices["ndvi"] = np.where(denominator_ndvi != 0, (nir - red) / denominator_ndvi, np.nan)
+            denominator_evi = nir + 6 * red - 7.5 * blue + 1
+            indices["evi"] = np.where(denominator_evi != 0, 2.5 * ((nir - red) / denominator_evi), np.nan)
+            numerator_bsi = (swir1 + red) - (nir + blue); denominator_bsi = (swir1 + red) + (nir + blue)
+            indices["bsi"] = np.where(denominator_bsi != 0, numerator_bsi / denominator_bsi, np.nan)
+            indices["brightness"] = swir1
+        elif sat_data.ndim == 2:
+            indices["ndvi"] = sat_data.astype(np.float64)
+            indices["brightness"] = indices["ndvi"]
+        if sat_data.ndim == 3 and sat_data.shape[0] >= 8:
+            green = sat_data[2].astype(np.float64); nir_ndwi = sat_data[6].astype(np.float64)
+            denominator_ndwi = nir_ndwi + green
+            indices["ndwi"] = np.where(denominator_ndwi != 0, (green - nir_ndwi) / denominator_ndwi, np.nan)
+    return indices
+
+
+def build_cell_feature_table(dtm, master_transform, pixels_per_cell, resolution, ancillary=None, row_offset=0):
+    """Reduce a DTM (plus aligned ancillary layers) to one structured feature row per cell.
+
+    `ancillary` maps ANCILLARY_FIELDS names to (cell_rows, cell_cols) arrays that are already
+    aligned to the DTM cell grid. `row_offset` is the pixel row of `dtm[0]` within the master
+    grid, so the engine can be run strip by strip.
+    """
+    p = pixels_per_cell
+    n_rows, n_cols = cell_grid_shape(dtm.shape[0], dtm.shape[1], p)
+    table = np.zeros(n_rows * n_cols, dtype=CELL_FEATURE_DTYPE)
+
+    cell_rows, cell_cols = np.meshgrid(np.arange(n_rows), np.arange(n_cols), indexing="ij")
+    row_off = row_offset + cell_rows * p
+    col_off = cell_cols * p
+    table["cell_row"] = (row_off // p).ravel()
+    table["cell_col"] = cell_cols.ravel()
+    table["row_off"] = row_off.ravel()
+    table["col_off"] = col_off.ravel()
+
+    # Cell footprints use the nominal cell size, as in the per-cell loop.
+    a, b, c, d, e, f = master_transform.a, master_transform.b, master_transform.c, master_transform.d, master_transform.e, master_transform.f
+    table["minx"] = (a * col_off + b * row_off + c).ravel()
+    table["maxy"] = (d * col_off + e * row_off + f).ravel()
+    table["maxx"] = (a * (col_off + p) + b * (row_off + p) + c).ravel()
+    table["miny"] = (d * (col_off + p) + e * (row_off + p) + f).ravel()
+
+    table["dtm_nan_percent"] = block_reduce(dtm, p, tile_nan_percent).ravel()
+    dtm_valid = ~block_reduce(dtm, p, tile_all_nan).astype(bool).ravel()
+    table["mean_elevation"] = block_reduce(dtm, p, tile_nanmean).ravel()
+    table["std_elevation"] = block_reduce(dtm, p, tile_nanstd).ravel()
+    table["mean_slope"] = block_reduce(dtm, p, lambda tiles: tile_slope(tiles, resolution)).ravel()
+    table["mean_roughness"] = block_reduce(dtm, p, tile_roughness).ravel()
+
+    ancillary = ancillary or {}
+    for name, missing_value in ANCILLARY_FIELDS.items():
+        values = ancillary.get(name)
+        table[name] = missing_value if values is None else np.asarray(values, dtype=np.float64).ravel()
+
+    # Missing spectral means fall back to 0.0, exactly like the per-cell loop did.
+    for name in ("mean_ndvi", "mean_evi", "mean_bsi", "mean_brightness"):
+        table[name] = np.nan_to_num(table[name], nan=0.0)
+
+    table["is_valid"] = dtm_valid & ~np.isnan(table["mean_flow_acc"])
+    return table
+
+
+def save_feature_table(path, feature_table, n_cell_rows, n_cell_cols, pixels_per_cell, fingerprint):
+    """Persist a feature table (the per-cell datacube) with its grid shape and input fingerprint."""
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    meta = {"n_cell_rows": int(n_cell_rows), "n_cell_cols": int(n_cell_cols), "pixels_per_cell": int(pixels_per_cell), "fingerprint": fingerprint}
+    np.savez(tmp_path, feature_table=feature_table, meta=np.array(json.dumps(meta)))
+    os.replace(tmp_path, path)
+
+
+def load_feature_table(path, fingerprint):
+    """Return (feature_table, n_cell_rows, n_cell_cols, pixels_per_cell) if `path` holds a table
+    built from inputs matching `fingerprint`, else None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("fingerprint") != fingerprint:
+                return None
+            feature_table = data["feature_table"]
+    except Exception:
+        return None
+    if feature_table.dtype != CELL_FEATURE_DTYPE:
+        return None
+    return feature_table, meta["n_cell_rows"], meta["n_cell_cols"], meta["pixels_per_cell"]
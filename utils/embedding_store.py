@@ -0,0 +1,192 @@
+import glob
+import os
+import numpy as np
+
+# On-disk store of VGGish embeddings, one memory-mappable array per transect plus a frame index.
+# For transect T the store holds:
+#   {T}_embeddings.npy        (n_frames, dim) float32 or float16 embeddings
+#   {T}_embedding_index.npy   (n_frames,) FRAME_INDEX_DTYPE: frame start/end on the audio timeline
+#                             and the geospatial cell the frame belongs to (-1 for none)
+# Arrays are opened with mmap_mode="r", so slicing by time range or cell is zero-copy and a reader
+# only pages in the frames it touches. Each transect is one chunk of the store: the catalog maps
+# transect ids to their files and time spans, so lookups by transect and time range (or by time
+# range across the whole store) never need file names.
+
+FRAME_INDEX_DTYPE = np.dtype([("start_ms", np.float64), ("end_ms", np.float64), ("cell_id", np.int32)])
+
+EMBEDDINGS_SUFFIX = "_embeddings.npy"
+INDEX_SUFFIX = "_embedding_index.npy"
+
+
+def frame_centres(frame_times_ms):
+    """Centre of each [start_ms, end_ms] frame (accepts (n, 2) arrays or a frame index)."""
+    if getattr(frame_times_ms, "dtype", None) is not None and frame_times_ms.dtype.names:
+        return (frame_times_ms["start_ms"] + frame_times_ms["end_ms"]) / 2.0
+    frame_times_ms = np.asarray(frame_times_ms, dtype=np.float64).reshape(-1, 2)
+    return frame_times_ms.mean(axis=1)
+
+
+def frame_ranges(frame_times_ms, start_ms, end_ms):
+    """Frame index ranges [first, end) of the frames centred in [start_ms, end_ms).
+
+    Works on scalars or arrays of ranges; each frame falls in exactly one of a set of back-to-back
+    ranges.
+    """
+    centres = frame_centres(frame_times_ms)
+    return np.searchsorted(centres, start_ms, side="left"), np.searchsorted(centres, end_ms, side="left")
+
+
+def reduce_segments(ufunc, values, first, end, empty_value=0.0):
+    """ufunc.reduceat of `values` over the segments [first[i], end[i]); empty segments get empty_value.
+
+    One reduceat call handles every segment (e.g. np.add, np.minimum, np.maximum, np.logical_or),
+    so per-cell aggregates cost a few array passes however many cells there are.
+    """
+    values = np.asarray(values)
+    first = np.asarray(first, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    out = np.full(len(first), empty_value, dtype=np.result_type(values.dtype, np.min_scalar_type(empty_value)))
+    nonempty = end > first
+    if not nonempty.any():
+        return out
+    # Interleave (first, end) pairs: reduceat reduces values[first:end] at the even positions; the
+    # odd positions (gaps between segments) are discarded. The pad keeps an end == len(values) in range.
+    bounds = np.stack((first[nonempty], end[nonempty]), axis=1).ravel()
+    padded = np.concatenate((values, values[:1]))
+    out[nonempty] = ufunc.reduceat(padded, bounds)[0::2]
+    return out
+
+
+def assign_cells(frame_times_ms, cell_starts_ms, cell_ends_ms):
+    """Cell id per frame (the cell whose time range contains the frame centre), -1 if none."""
+    first, end = frame_ranges(frame_times_ms, np.asarray(cell_starts_ms, dtype=np.float64), np.asarray(cell_ends_ms, dtype=np.float64))
+    cell_ids = np.full(len(frame_centres(frame_times_ms)), -1, dtype=np.int32)
+    for cell_id in np.flatnonzero(end > first):
+        cell_ids[first[cell_id]:end[cell_id]] = cell_id
+    return cell_ids
+
+
+def build_frame_index(frame_times_ms, cell_ids=None):
+    """Frame index (FRAME_INDEX_DTYPE) from (n, 2) [start_ms, end_ms] times and optional cell ids."""
+    frame_times_ms = np.asarray(frame_times_ms, dtype=np.float64).reshape(-1, 2)
+    index = np.zeros(len(frame_times_ms), dtype=FRAME_INDEX_DTYPE)
+    index["start_ms"] = frame_times_ms[:, 0]
+    index["end_ms"] = frame_times_ms[:, 1]
+    index["cell_id"] = -1 if cell_ids is None else cell_ids
+    return index
+
+
+class EmbeddingStore:
+    """Memory-mapped embeddings and frame indexes of every transect under `root`."""
+
+    def __init__(self, root, dtype="float32"):
+        self.root = root
+        self.dtype = np.dtype(dtype)
+
+    def embeddings_path(self, transect_id):
+        return os.path.join(self.root, f"{transect_id}{EMBEDDINGS_SUFFIX}")
+
+    def index_path(self, transect_id):
+        return os.path.join(self.root, f"{transect_id}{INDEX_SUFFIX}")
+
+    def __contains__(self, transect_id):
+        return os.path.exists(self.embeddings_path(transect_id))
+
+    def transects(self):
+        """Transect ids with embeddings in the store."""
+        paths = glob.glob(os.path.join(glob.escape(self.root), f"*{EMBEDDINGS_SUFFIX}"))
+        return sorted(os.path.basename(path)[:-len(EMBEDDINGS_SUFFIX)] for path in paths)
+
+    def catalog(self):
+        """{transect_id: {"transect_id", "embeddings_path", "index_path", "n_frames", "dim", "dtype", "start_ms",
+        "end_ms", "indexed"}} from array headers ("index_path", "start_ms" and "end_ms" only for indexed transects)."""
+        catalog = {}
+        for transect_id in self.transects():
+            embeddings = self.embeddings(transect_id)
+            index = self.index(transect_id)
+            entry = {"transect_id": transect_id, "embeddings_path": self.embeddings_path(transect_id),
+                     "n_frames": int(embeddings.shape[0]), "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+                     "dtype": str(embeddings.dtype), "indexed": index is not None}
+            if index is not None:
+                entry["index_path"] = self.index_path(transect_id)
+            if index is not None and len(index):
+                entry.update(start_ms=float(index["start_ms"][0]), end_ms=float(index["end_ms"][-1]))
+            catalog[transect_id] = entry
+        return catalog
+
+    def write(self, transect_id, embeddings, frame_times_ms, cell_ids=None):
+        """Store a transect's embeddings (cast to the store dtype) and their frame index.
+
+        Both files are written to temporary paths and moved into place, so readers never see a
+        half-written array. Returns the embeddings path.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        embeddings = np.asarray(embeddings, dtype=self.dtype)
+        index = build_frame_index(frame_times_ms, cell_ids)
+        if len(index) != len(embeddings):
+            raise ValueError(f"{transect_id}: {len(embeddings)} embeddings but {len(index)} frame times.")
+        for path, array in ((self.index_path(transect_id), index), (self.embeddings_path(transect_id), embeddings)):
+            tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+        return self.embeddings_path(transect_id)
+
+    def embeddings(self, transect_id):
+        """Read-only memory map of a transect's (n_frames, dim) embeddings."""
+        return np.load(self.embeddings_path(transect_id), mmap_mode="r")
+
+    def index(self, transect_id):
+        """The transect's frame index, or None for embeddings stored without one."""
+        path = self.index_path(transect_id)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def time_range(self, transect_id, start_ms, end_ms):
+        """Zero-copy view of the embeddings whose frames are centred in [start_ms, end_ms)."""
+        index = self.index(transect_id)
+        if index is None:
+            raise KeyError(f"No frame index for transect '{transect_id}'.")
+        first, end = frame_ranges(index, start_ms, end_ms)
+        return self.embeddings(transect_id)[first:max(first, end)]
+
+    def lookup(self, start_ms, end_ms, transect_ids=None):
+        """{transect_id: (embeddings, frame index)} zero-copy views of the frames centred in
+        [start_ms, end_ms), across the store (or the given transects); transects without such
+        frames, or without a frame index, are left out."""
+        catalog = self.catalog()
+        found = {}
+        for transect_id in catalog if transect_ids is None else transect_ids:
+            entry = catalog.get(transect_id)
+            if entry is None or "start_ms" not in entry or entry["end_ms"] < start_ms or entry["start_ms"] >= end_ms:
+                continue
+            index = self.index(transect_id)
+            first, end = frame_ranges(index, start_ms, end_ms)
+            if end > first:
+                found[transect_id] = (self.embeddings(transect_id)[first:end], index[first:end])
+        return found
+
+    def cell_ranges(self, transect_id, n_cells=None):
+        """[first, end) frame ranges per cell id, as two arrays (empty ranges for cells without frames)."""
+        index = self.index(transect_id)
+        if index is None:
+            raise KeyError(f"No frame index for transect '{transect_id}'.")
+        cell_ids = np.asarray(index["cell_id"])
+        n_cells = int(cell_ids.max()) + 1 if n_cells is None else n_cells
+        if n_cells <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        positions = np.arange(len(cell_ids))
+        valid = cell_ids >= 0
+        first = np.full(n_cells, len(cell_ids), dtype=np.int64)
+        end = np.zeros(n_cells, dtype=np.int64)
+        np.minimum.at(first, cell_ids[valid], positions[valid])
+        np.maximum.at(end, cell_ids[valid], positions[valid] + 1)
+        first = np.minimum(first, end)
+        return first, end
+
+    def cell(self, transect_id, cell_id):
+        """Zero-copy view of the embeddings of one cell (frames of a cell are contiguous)."""
+        first, end = self.cell_ranges(transect_id)
+        if not 0 <= cell_id < len(first):
+            return self.embeddings(transect_id)[0:0]
+        return self.embeddings(transect_id)[first[cell_id]:end[cell_id]]
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import numpy as np
+
+# Grid-alignment index: for every cell of a regular master grid, the clamped pixel window of a
+# target raster (possibly in another CRS) that covers it. All cell corners are transformed in
+# one vectorized call, so per-cell lookups are plain array indexing instead of pyproj calls.
+
+
+def _apply_affine(transform, cols, rows):
+    """Vectorized `transform * (cols, rows)` using the affine coefficients."""
+    return (transform.a * cols + transform.b * rows + transform.c,
+            transform.d * cols + transform.e * rows + transform.f)
+
+
+def _cell_bounds(xs, ys):
+    """Per-cell (left, bottom, right, top) from the (rows + 1, cols + 1) corner lattice."""
+    corner_xs = np.stack([xs[:-1, :-1], xs[:-1, 1:], xs[1:, :-1], xs[1:, 1:]])
+    corner_ys = np.stack([ys[:-1, :-1], ys[:-1, 1:], ys[1:, :-1], ys[1:, 1:]])
+    return corner_xs.min(axis=0), corner_ys.min(axis=0), corner_xs.max(axis=0), corner_ys.max(axis=0)
+
+
+class GridAlignmentIndex:
+    """Clamped (row_start, row_stop, col_start, col_stop) target windows for an (n_rows, n_cols) cell grid."""
+
+    def __init__(self, row_start, row_stop, col_start, col_stop):
+        self.row_start = row_start
+        self.row_stop = row_stop
+        self.col_start = col_start
+        self.col_stop = col_stop
+        self.valid = (row_start < row_stop) & (col_start < col_stop)
+
+    @classmethod
+    def build(cls, master_transform, pixels_per_cell, n_cell_rows, n_cell_cols, target_transform, target_shape,
+              transformer=None, row_offset=0):
+        """Index the cells of a master grid against a target raster.
+
+        `transformer` is a pyproj Transformer (always_xy) from the master CRS to the target CRS, or
+        None when both share a CRS. Cells use their nominal footprint, and window rounding follows
+        rasterio's from_bounds(...).round_offsets().round_lengths().
+        """
+        rows = row_offset + np.arange(n_cell_rows + 1) * pixels_per_cell
+        cols = np.arange(n_cell_cols + 1) * pixels_per_cell
+        lattice_cols, lattice_rows = np.meshgrid(cols, rows)
+        xs, ys = _apply_affine(master_transform, lattice_cols.astype(np.float64), lattice_rows.astype(np.float64))
+        if transformer is not None:
+            xs, ys = transformer.transform(xs, ys)
+            xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+        left, bottom, right, top = _cell_bounds(xs, ys)
+
+        # Target pixel coordinates of each cell's bounding box corners
+        inverse = ~target_transform
+        box_cols, box_rows = _apply_affine(inverse, np.stack([left, right, right, left]), np.stack([top, top, bottom, bottom]))
+        with np.errstate(invalid="ignore"):
+            col_off = np.floor(box_cols.min(axis=0) + 0.001)
+            row_off = np.floor(box_rows.min(axis=0) + 0.001)
+            width = np.floor(np.maximum(box_cols.max(axis=0) - box_cols.min(axis=0), 0.0) + 0.5)
+            height = np.floor(np.maximum(box_rows.max(axis=0) - box_rows.min(axis=0), 0.0) + 0.5)
+
+        finite = np.isfinite(col_off) & np.isfinite(row_off) & np.isfinite(width) & np.isfinite(height)
+        rows_limit, cols_limit = target_shape[-2], target_shape[-1]
+        row_start = np.where(finite, np.clip(row_off, 0, rows_limit), 0).astype(np.int64)
+        col_start = np.where(finite, np.clip(col_off, 0, cols_limit), 0).astype(np.int64)
+        row_stop = np.where(finite, np.clip(row_off + height, 0, rows_limit), 0).astype(np.int64)
+        col_stop = np.where(finite, np.clip(col_off + width, 0, cols_limit), 0).astype(np.int64)
+        return cls(row_start, row_stop, col_start, col_stop)
+
+    def window(self, cell_row, cell_col):
+        """O(1) lookup of one cell's window, or None if the cell misses the target raster."""
+        if not self.valid[cell_row, cell_col]:
+            return None
+        return (int(self.row_start[cell_row, cell_col]), int(self.row_stop[cell_row, cell_col]),
+                int(self.col_start[cell_row, cell_col]), int(self.col_stop[cell_row, cell_col]))
+
+    def save(self, path):
+        np.savez(path, row_start=self.row_start, row_stop=self.row_stop, col_start=self.col_start, col_stop=self.col_stop)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["row_start"], data["row_stop"], data["col_start"], data["col_stop"])
+
+
+def alignment_index_key(master_crs, master_transform, pixels_per_cell, n_cell_rows, n_cell_cols, row_offset,
+                        target_crs, target_transform, target_shape):
+    """Stable hash of everything that determines an index (grids, CRSs and target shape)."""
+    parts = [str(master_crs), tuple(master_transform)[:6], pixels_per_cell, n_cell_rows, n_cell_cols, row_offset,
+             str(target_crs), tuple(target_transform)[:6], tuple(target_shape[-2:])]
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def load_or_build_alignment_index(cache_dir, key, build):
+    """Load the index cached as `<cache_dir>/<key>.npz`, or call `build()` and cache its result.
+
+    With `cache_dir=None` the index is built in memory only.
+    """
+    path = None if cache_dir is None else os.path.join(cache_dir, f"{key}.npz")
+    if path is not None and os.path.exists(path):
+        try:
+            return GridAlignmentIndex.load(path)
+        except Exception:
+            pass # Corrupt or partial cache file; rebuild it below
+    index = build()
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        index.save(tmp_path)
+        os.replace(tmp_path, path)
+    return index
@@ -0,0 +1,104 @@
+import numpy as np
+
+# Streaming Half-Space Trees (Tan, Ting & Liu, 2011) over fixed-size feature vectors, in numpy.
+# Each tree is a complete binary tree of random axis-aligned splits over a workspace drawn around
+# the value range of the first batch, stored heap-ordered (children of node i are 2i+1 and 2i+2).
+# Every node counts the frames that pass through it: `latest` mass for the current window and
+# `reference` mass from the previous complete window. A frame scores reference_mass * 2**depth at
+# the first node on its path with little reference mass (or at the leaf), summed over the trees:
+# frames landing in well-populated regions score high, so lower scores are more anomalous.
+
+
+class HalfSpaceTrees:
+    """Half-Space Trees anomaly detector with partial_fit / score_samples (higher is more normal)."""
+
+    def __init__(self, n_trees=25, depth=15, window_size=250, size_limit=None, random_state=None):
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window_size = window_size
+        self.size_limit = 0.1 * window_size if size_limit is None else size_limit
+        self.random_state = random_state
+        self.split_dims = None # (n_trees, n_internal) feature tested at each internal node
+        self.split_values = None # (n_trees, n_internal) threshold: above goes right
+        self.reference_mass = None # (n_trees, n_nodes) masses of the last complete window
+        self.latest_mass = None # (n_trees, n_nodes) masses of the window being filled
+        self.window_count = 0
+        self.n_windows = 0 # Complete windows seen; scores are NaN before the first one
+
+    def _build(self, X):
+        rng = np.random.default_rng(self.random_state)
+        n_internal = 2 ** self.depth - 1
+        n_features = X.shape[1]
+        low, high = X.min(axis=0), X.max(axis=0)
+        span = np.where(high > low, high - low, 1.0)
+        self.split_dims = np.empty((self.n_trees, n_internal), dtype=np.int32)
+        self.split_values = np.empty((self.n_trees, n_internal), dtype=np.float64)
+        for tree in range(self.n_trees):
+            # Random workspace per tree: centred on a random point, wide enough to cover the range
+            centre = low + rng.random(n_features) * span
+            radius = 2.0 * np.maximum(centre - low, low + span - centre)
+            level_low, level_high = (centre - radius)[None, :], (centre + radius)[None, :]
+            for level in range(self.depth):
+                first = 2 ** level - 1
+                dims = rng.integers(0, n_features, size=len(level_low))
+                nodes = np.arange(len(level_low))
+                mids = (level_low[nodes, dims] + level_high[nodes, dims]) / 2.0
+                self.split_dims[tree, first:first + len(nodes)] = dims
+                self.split_values[tree, first:first + len(nodes)] = mids
+                if level + 1 < self.depth:
+                    # Children in heap order: left (below the split) then right, per node
+                    child_low, child_high = np.repeat(level_low, 2, axis=0), np.repeat(level_high, 2, axis=0)
+                    child_high[2 * nodes, dims] = mids
+                    child_low[2 * nodes + 1, dims] = mids
+                    level_low, level_high = child_low, child_high
+        n_nodes = 2 ** (self.depth + 1) - 1
+        self.reference_mass = np.zeros((self.n_trees, n_nodes), dtype=np.float64)
+        self.latest_mass = np.zeros((self.n_trees, n_nodes), dtype=np.float64)
+
+    def _paths(self, X, tree):
+        """(n_samples, depth + 1) node ids visited in `tree`, root to leaf."""
+        paths = np.zeros((len(X), self.depth + 1), dtype=np.int64)
+        rows = np.arange(len(X))
+        for level in range(self.depth):
+            node = paths[:, level]
+            right = X[rows, self.split_dims[tree, node]] > self.split_values[tree, node]
+            paths[:, level + 1] = 2 * node + 1 + right
+        return paths
+
+    def partial_fit(self, X):
+        """Add frames to the current window; a full window becomes the reference profile."""
+        X = np.asarray(X, dtype=np.float64).reshape(len(X), -1)
+        if self.split_dims is None:
+            if len(X) == 0:
+                return self
+            self._build(X)
+        start = 0
+        while start < len(X):
+            take = min(self.window_size - self.window_count, len(X) - start)
+            for tree in range(self.n_trees):
+                paths = self._paths(X[start:start + take], tree)
+                self.latest_mass[tree] += np.bincount(paths.ravel(), minlength=self.latest_mass.shape[1])
+            self.window_count += take
+            start += take
+            if self.window_count == self.window_size:
+                self.reference_mass, self.latest_mass = self.latest_mass, np.zeros_like(self.latest_mass)
+                self.window_count = 0
+                self.n_windows += 1
+        return self
+
+    def score_samples(self, X):
+        """Mass score per frame against the reference window (NaN until one is complete)."""
+        X = np.asarray(X, dtype=np.float64).reshape(len(X), -1)
+        if self.n_windows == 0:
+            return np.full(len(X), np.nan)
+        scores = np.zeros(len(X), dtype=np.float64)
+        depth_weights = 2.0 ** np.arange(self.depth + 1)
+        for tree in range(self.n_trees):
+            paths = self._paths(X, tree)
+            masses = self.reference_mass[tree][paths]
+            # Terminal node: first node with mass <= size_limit, else the leaf
+            sparse = masses <= self.size_limit
+            sparse[:, -1] = True
+            terminal = sparse.argmax(axis=1)
+            scores += masses[np.arange(len(X)), terminal] * depth_weights[terminal]
+        return scores
@@ -0,0 +1,102 @@
+import numpy as np
+
+# k-nearest-neighbour anomaly detector: a frame's anomaly is its mean distance to the k nearest
+# frames of a reference set of normal embeddings. Neighbours come from an approximate HNSW graph
+# (hnswlib, when installed), which keeps queries sub-millisecond per frame on tens of millions of
+# reference frames; without hnswlib an exact scikit-learn tree search is used instead.
+# The estimator follows the scikit-learn detector conventions used by the anomaly stage:
+# decision_function is negative for outliers, and the threshold (offset_) is the distance exceeded
+# by a `contamination` fraction of the reference frames themselves. The reference set may be given
+# as a list of row blocks (e.g. memory-mapped transects), indexed chunk by chunk so it never has to
+# fit in memory at once.
+
+
+class KNNDetector:
+    """k-NN distance detector over an HNSW (or exact) neighbour index of the reference frames."""
+
+    accepts_row_blocks = True # fit() takes a list of (n_i, dim) arrays as well as one array
+    RUNTIME_PARAMS = ("build_threads", "query_threads") # Do not change the fitted index
+
+    def __init__(self, n_neighbors=10, contamination=0.01, backend="auto", hnsw_m=16, hnsw_ef_construction=200,
+                 hnsw_ef_search=64, threshold_sample=10000, build_threads=-1, query_threads=1, random_state=None):
+        self.n_neighbors = n_neighbors
+        self.contamination = contamination
+        self.backend = backend
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.threshold_sample = threshold_sample
+        self.build_threads = build_threads
+        self.query_threads = query_threads
+        self.random_state = random_state
+
+    def get_params(self, deep=True):
+        """Settings that shape the fitted index and threshold (the thread counts are left out)."""
+        return {name: getattr(self, name) for name in ("n_neighbors", "contamination", "backend", "hnsw_m",
+                "hnsw_ef_construction", "hnsw_ef_search", "threshold_sample", "random_state")}
+
+    def _resolve_backend(self):
+        if self.backend != "auto":
+            return self.backend
+        try:
+            import hnswlib # noqa: F401
+            return "hnsw"
+        except ImportError:
+            return "exact"
+
+    def fit(self, X, chunk_rows=65536):
+        """Index the reference frames (one array or a list of row blocks, added chunk by chunk) and
+        set the outlier threshold."""
+        blocks = [block for block in (X if isinstance(X, (list, tuple)) else [X]) if len(block)]
+        block_starts = np.cumsum([0] + [len(block) for block in blocks])
+        n_samples, n_features = int(block_starts[-1]), (blocks[0].shape[1] if blocks else 0)
+        if n_samples <= self.n_neighbors:
+            raise ValueError(f"Need more than n_neighbors={self.n_neighbors} reference frames, got {n_samples}.")
+        self.backend_ = self._resolve_backend()
+        if self.backend_ == "hnsw":
+            import hnswlib
+            index = hnswlib.Index(space="l2", dim=n_features)
+            index.init_index(max_elements=n_samples, ef_construction=self.hnsw_ef_construction, M=self.hnsw_m,
+                             random_seed=0 if self.random_state is None else self.random_state)
+            for block, block_start in zip(blocks, block_starts):
+                for start in range(0, len(block), chunk_rows):
+                    rows = np.ascontiguousarray(block[start:start + chunk_rows], dtype=np.float32)
+                    ids = np.arange(block_start + start, block_start + start + len(rows))
+                    index.add_items(rows, ids, num_threads=self.build_threads)
+            index.set_ef(max(self.hnsw_ef_search, self.n_neighbors + 1))
+            self.index_ = index
+        elif self.backend_ == "exact":
+            from sklearn.neighbors import NearestNeighbors
+            self.index_ = NearestNeighbors().fit(np.vstack([np.asarray(block, dtype=np.float32) for block in blocks]))
+        else:
+            raise ValueError(f"Unknown k-NN backend: {self.backend!r}")
+        self.n_samples_fit_ = n_samples
+
+        # Threshold from leave-one-out distances of (a sample of) the reference frames
+        rng = np.random.default_rng(self.random_state)
+        sample = np.sort(rng.choice(n_samples, min(n_samples, self.threshold_sample), replace=False))
+        sample_block = np.searchsorted(block_starts, sample, side="right") - 1
+        rows = np.concatenate([np.asarray(blocks[b][sample[sample_block == b] - block_starts[b]], dtype=np.float32)
+                               for b in np.unique(sample_block)])
+        distances = self._neighbor_distances(rows, self.n_neighbors + 1)[:, 1:]
+        self.offset_ = float(np.quantile(distances.mean(axis=1), 1.0 - self.contamination))
+        return self
+
+    def _neighbor_distances(self, X, k):
+        # (n, k) Euclidean distances to the k nearest reference frames, nearest first
+        if self.backend_ == "hnsw":
+            _, squared = self.index_.knn_query(np.ascontiguousarray(X, dtype=np.float32), k=k, num_threads=self.query_threads)
+            return np.sqrt(np.maximum(squared, 0.0))
+        distances, _ = self.index_.kneighbors(X, n_neighbors=k)
+        return distances
+
+    def score_samples(self, X):
+        """Negated mean distance to the n_neighbors nearest reference frames (higher is more normal)."""
+        return -self._neighbor_distances(np.asarray(X, dtype=np.float32), self.n_neighbors).mean(axis=1)
+
+    def decision_function(self, X):
+        """score_samples shifted by the threshold: negative for frames farther out than offset_."""
+        return self.score_samples(X) + self.offset_
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import time
+
+# Per-transect, per-stage run manifests. A manifest records what a stage consumed (input file
+# fingerprints and config values) and what it produced (output file fingerprints). A stage is
+# fresh while all three still match; anything else marks it stale so only that work re-runs.
+# Because stage inputs are the previous stage's outputs, staleness propagates downstream, but a
+# re-run that reproduces byte-identical outputs leaves later stages fresh.
+
+MANIFEST_VERSION = 1
+
+
+def content_hash(path, chunk_size=1 << 20):
+    """SHA-1 of a file's bytes, read in chunks."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, previous=None):
+    """Return {"size", "mtime_ns", "sha1"} for a file, or None if it does not exist.
+
+    If `previous` (an earlier fingerprint of the same path) has the same size and mtime, its
+    hash is reused instead of re-reading the file.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return dict(previous)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": content_hash(path)}
+
+
+def config_hash(config):
+    """Stable hash of a JSON-serializable dict of config values."""
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class StageManifest:
+    """JSON manifest for one stage of one transect, stored at <manifest_dir>/<transect_id>/<stage>.json."""
+
+    def __init__(self, manifest_dir, stage, transect_id):
+        self.stage = stage
+        self.transect_id = transect_id
+        self.path = os.path.join(manifest_dir, transect_id, f"{stage}.json")
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+    def _write(self, manifest):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def _fingerprints(self, paths, recorded):
+        return {name: file_fingerprint(path, recorded.get(name)) for name, path in paths.items()}
+
+    def staleness(self, inputs, config, outputs):
+        """Return None if the stage is fresh, else a short reason it has to re-run.
+
+        `inputs` and `outputs` map names to file paths; `config` maps names to JSON values.
+        """
+        manifest = self.load()
+        if manifest is None:
+            return "no manifest"
+        if manifest.get("status") != "complete":
+            return "previous run did not finish"
+        if manifest.get("config_hash") != config_hash(config):
+            changed = sorted(k for k in set(config) | set(manifest.get("config", {}))
+                             if json.dumps(config.get(k), sort_keys=True, default=str) != json.dumps(manifest.get("config", {}).get(k), sort_keys=True, default=str))
+            return f"config changed ({', '.join(changed) or 'values'})"
+        for kind, paths, recorded in (("input", inputs, manifest.get("inputs", {})), ("output", outputs, manifest.get("outputs", {}))):
+            if set(paths) != set(recorded):
+                return f"{kind} set changed"
+            for name, path in paths.items():
+                previous = recorded[name]
+                current = file_fingerprint(path, previous)
+                if current is None and previous is None:
+                    continue
+                if current is None or previous is None or current["sha1"] != previous["sha1"]:
+                    return f"{kind} '{name}' changed"
+        return None
+
+    def record(self, inputs, config, outputs, started_at=None):
+        """Mark the stage complete with the fingerprints of its inputs and outputs.
+
+        started_at defaults to the time saved by mark_started.
+        """
+        previous = self.load() or {}
+        if started_at is None:
+            started_at = previous.get("started_at")
+        self._write({
+            "version": MANIFEST_VERSION, "stage": self.stage, "transect_id": self.transect_id, "status": "complete",
+            "started_at": started_at, "finished_at": time.time(),
+            "config": config, "config_hash": config_hash(config),
+            "inputs": self._fingerprints(inputs, previous.get("inputs", {})),
+            "outputs": self._fingerprints(outputs, previous.get("outputs", {})),
+        })
+
+    def mark_started(self, config):
+        """Flag the stage as running, so a crash leaves it stale rather than falsely complete.
+
+        Earlier fingerprints are kept so unchanged files need not be re-hashed on completion.
+        """
+        previous = self.load() or {}
+        self._write({
+            "version": MANIFEST_VERSION, "stage": self.stage, "transect_id": self.transect_id, "status": "running",
+            "started_at": time.time(), "config": config, "config_hash": config_hash(config),
+            "inputs": previous.get("inputs", {}), "outputs": previous.get("outputs", {}),
+        })
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def db_to_gain(db):
+    """Convert a gain in dB to a linear amplitude factor."""
+    return 10 ** (db / 20.0)
+
+
+def constant_power_gains(pan):
+    """Left/right gains (..., 2) float32 for pan values from -1.0 (hard left) to 1.0 (hard right).
+
+    Gains follow the sin/cos law scaled so the centre stays at unity and a hard pan gives
+    +3 dB on one side, which keeps the perceived loudness constant across the stereo field.
+    """
+    theta = (np.clip(pan, -1.0, 1.0) + 1.0) * np.pi / 4.0
+    return (np.sqrt(2.0) * np.stack([np.cos(theta), np.sin(theta)], axis=-1)).astype(np.float32)
+
+
+def constant_power_pan(mono_audio, pan):
+    """Pan mono audio into a (samples, 2) float32 stereo buffer."""
+    return np.asarray(mono_audio, dtype=np.float32)[:, None] * constant_power_gains(pan)
+
+
+def overlay(base, layer, position=0, gain_during_overlay=0.0):
+    """Mix `layer` onto `base` starting at sample `position`, in place.
+
+    Like pydub's overlay, the result keeps the length of `base`, the layer is truncated to fit
+    and `gain_during_overlay` (dB) attenuates `base` only where the layer plays. Mono layers
+    are duplicated across the channels of a stereo base. Returns `base`.
+    """
+    end = min(len(base), position + len(layer))
+    if end <= position:
+        return base
+    layer = np.asarray(layer[:end - position], dtype=np.float32)
+    if base.ndim == 2 and layer.ndim == 1:
+        layer = layer[:, None]
+    if gain_during_overlay:
+        base[position:end] *= db_to_gain(gain_during_overlay)
+    base[position:end] += layer
+    return base
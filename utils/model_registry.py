@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+# Versioned store of fitted models. Model `name` lives under <root>/<name>/ as
+#   v0001.joblib   the fitted estimator (uncompressed, so its arrays can be memory-mapped on load)
+#   v0001.json     what it was fitted with: free-form metadata (training fingerprint, params, ...)
+# find() returns the newest version whose metadata matches, so a run with the same training data
+# and parameters reuses the model instead of refitting; anything else gets a new version.
+
+REGISTRY_VERSION = 1
+
+
+def training_fingerprint(named_arrays, chunk_rows=65536):
+    """SHA-1 over (name, shape, float32 values) of each training array, read chunk by chunk.
+
+    Arrays may be memory maps; values are hashed as float32, the precision estimators train on, so
+    the same data gives the same fingerprint whether it comes from memory or from disk.
+    """
+    digest = hashlib.sha1()
+    for name, array in named_arrays:
+        digest.update(json.dumps([str(name), list(np.shape(array))]).encode("utf-8"))
+        for start in range(0, len(array), chunk_rows):
+            digest.update(np.ascontiguousarray(array[start:start + chunk_rows], dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Fitted models by name and version under `root` (joblib is imported on first use)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, name, version, extension):
+        return os.path.join(self.root, name, f"v{version:04d}.{extension}")
+
+    def versions(self, name):
+        """Saved versions of `name`, oldest first."""
+        model_dir = os.path.join(self.root, name)
+        if not os.path.isdir(model_dir):
+            return []
+        versions = []
+        for filename in os.listdir(model_dir):
+            stem, extension = os.path.splitext(filename)
+            if extension == ".json" and stem.startswith("v") and stem[1:].isdigit():
+                if os.path.exists(self._path(name, int(stem[1:]), "joblib")):
+                    versions.append(int(stem[1:]))
+        return sorted(versions)
+
+    def metadata(self, name, version):
+        with open(self._path(name, version, "json"), "r") as f:
+            return json.load(f)
+
+    def find(self, name, **criteria):
+        """Newest version of `name` whose metadata has every given key/value, or None."""
+        expected = json.loads(json.dumps(criteria, default=str)) # Compare as stored (JSON types)
+        for version in reversed(self.versions(name)):
+            try:
+                metadata = self.metadata(name, version)
+            except (OSError, ValueError):
+                continue
+            if metadata.get("registry_version") == REGISTRY_VERSION and \
+               all(metadata.get(key) == value for key, value in expected.items()):
+                return version
+        return None
+
+    def save(self, name, model, **metadata):
+        """Save `model` as the next version of `name` with its metadata; returns the version."""
+        import joblib
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        versions = self.versions(name)
+        version = versions[-1] + 1 if versions else 1
+        while os.path.exists(self._path(name, version, "joblib")): # Another process took it
+            version += 1
+        metadata = dict(metadata, name=name, version=version, saved_at=time.time(), registry_version=REGISTRY_VERSION)
+        model_path = self._path(name, version, "joblib")
+        tmp_path = f"{model_path}.{os.getpid()}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, model_path)
+        # The metadata goes last: a version only counts once its JSON exists
+        tmp_path = f"{self._path(name, version, 'json')}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(metadata, f, indent=4, default=str)
+        os.replace(tmp_path, self._path(name, version, "json"))
+        return version
+
+    def load(self, name, version=None, mmap_mode="r"):
+        """Return (model, metadata) for a version of `name` (default: the newest).
+
+        Large arrays inside the model are memory-mapped read-only, so loading is fast and
+        processes scoring with the same version share pages.
+        """
+        import joblib
+        if version is None:
+            versions = self.versions(name)
+            if not versions:
+                raise FileNotFoundError(f"No saved versions of model '{name}' in '{self.root}'.")
+            version = versions[-1]
+        model = joblib.load(self._path(name, version, "joblib"), mmap_mode=mmap_mode)
+        return model, self.metadata(name, version)
@@ -0,0 +1,155 @@
+import math
+import numpy as np
+import rasterio
+import rasterio.merge
+from rasterio.transform import Affine
+from rasterio.warp import Resampling, reproject, transform_bounds
+from rasterio.windows import Window, from_bounds, transform as window_transform
+
+# Out-of-core helpers for the sonification inputs: the DTM mosaic is described from tile
+# metadata only and read back one row strip at a time, and ancillary rasters are read through
+# windows covering the current strip, so peak memory follows the strip size, not the AOI size.
+
+
+def mosaic_profile(tile_paths):
+    """Profile of the mosaic rasterio.merge.merge would build from `tile_paths`, without reading pixels."""
+    with rasterio.open(tile_paths[0]) as first:
+        profile = first.profile.copy()
+        res_x, res_y = first.res
+    xs, ys = [], []
+    for path in tile_paths:
+        with rasterio.open(path) as src:
+            left, bottom, right, top = src.bounds
+            xs += [left, right]
+            ys += [bottom, top]
+    west, east, south, north = min(xs), max(xs), min(ys), max(ys)
+    profile.update({
+        "height": int(round((north - south) / res_y)),
+        "width": int(round((east - west) / res_x)),
+        "transform": Affine.translation(west, north) * Affine.scale(res_x, -res_y),
+        "nodata": profile.get('nodata'),
+        "count": 1,
+    })
+    return profile
+
+
+def iter_row_strips(height, rows_per_strip):
+    """Yield (row_start, row_stop) pixel ranges covering `height` rows."""
+    for row_start in range(0, height, rows_per_strip):
+        yield row_start, min(height, row_start + rows_per_strip)
+
+
+def strip_bounds(master_profile, row_start, row_stop):
+    """(west, south, east, north) of master-grid rows [row_start, row_stop)."""
+    transform = master_profile['transform']
+    west, north = transform * (0, row_start)
+    east, south = transform * (master_profile['width'], row_stop)
+    return west, south, east, north
+
+
+def read_mosaic_strip(tile_sources, master_profile, row_start, row_stop):
+    """Mosaic rows [row_start, row_stop) of the master grid; only tile windows inside the strip are read.
+
+    `tile_sources` are paths or open datasets. The result is exactly (row_stop - row_start, width),
+    filled with the mosaic nodata value (or 0 without one) where no tile has data, like merge.
+    """
+    transform = master_profile['transform']
+    nodata = master_profile.get('nodata')
+    data, _ = rasterio.merge.merge(tile_sources, bounds=strip_bounds(master_profile, row_start, row_stop),
+                                   res=(transform.a, -transform.e), nodata=nodata)
+    height, width = row_stop - row_start, master_profile['width']
+    if data.shape[1:] == (height, width):
+        return data[0]
+    # merge rounds the output shape; pad/crop the odd edge pixel back onto the master grid
+    strip = np.full((height, width), nodata if nodata is not None else 0, dtype=data.dtype)
+    h, w = min(height, data.shape[1]), min(width, data.shape[2])
+    strip[:h, :w] = data[0, :h, :w]
+    return strip
+
+
+def read_mosaic_overview(tile_sources, master_profile, max_dim):
+    """Decimated mosaic whose longest side is at most `max_dim` pixels (for plots only)."""
+    factor = max(1, math.ceil(max(master_profile['height'], master_profile['width']) / max_dim))
+    transform = master_profile['transform']
+    data, _ = rasterio.merge.merge(tile_sources, res=(transform.a * factor, -transform.e * factor), nodata=master_profile.get('nodata'))
+    return data[0]
+
+
+def layer_window(src, master_crs, bounds, margin=2):
+    """Window of `src` covering master-CRS `bounds` plus `margin` pixels, clipped to the raster.
+
+    Returns None when the bounds do not overlap the raster. The margin absorbs rounding so every
+    cell window inside `bounds` is also inside the returned window.
+    """
+    try:
+        window = from_bounds(*transform_bounds(master_crs, src.crs, *bounds), transform=src.transform)
+    except rasterio.errors.WindowError:
+        return None
+    window = window.round_offsets().round_lengths()
+    row_start = max(0, window.row_off - margin)
+    col_start = max(0, window.col_off - margin)
+    row_stop = min(src.height, window.row_off + window.height + margin)
+    col_stop = min(src.width, window.col_off + window.width + margin)
+    if row_start >= row_stop or col_start >= col_stop:
+        return None
+    return Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+
+def window_profile(src, window):
+    """Copy of the source profile describing just `window` (shape and transform)."""
+    profile = src.profile.copy()
+    profile.update({"height": int(window.height), "width": int(window.width), "transform": window_transform(window, src.transform)})
+    return profile
+
+
+def read_layer(src, key, window=None, out_shape=None):
+    """Read a sonification input layer, optionally through a window and/or decimated to `out_shape` (rows, cols).
+
+    Hydro rasters with integer dtypes are read as float32, multi-band satellite stacks read all
+    bands, anything else reads band 1; nodata pixels become NaN.
+    """
+    if key.startswith('hydro_') and src.profile['dtype'] not in ['float32', 'float64']:
+        data = src.read(1, out_dtype=np.float32, window=window, out_shape=out_shape)
+    elif key.startswith('sat_') and src.count > 1:
+        data = src.read(window=window, out_shape=None if out_shape is None else (src.count,) + tuple(out_shape)) # Read all bands for satellite imagery
+    else:
+        data = src.read(1, window=window, out_shape=out_shape) # Read only the first band for single-band rasters
+
+    # Handle nodata values
+    if src.nodata is not None:
+        nodata_val = src.nodata
+        if data.ndim == 3: # Multi-band case
+            for band_idx in range(data.shape[0]):
+                # Only replace if the band itself is not entirely NaNs (might happen if clipped to an area outside data)
+                if not np.all(np.isnan(data[band_idx])):
+                    data[band_idx][data[band_idx] == nodata_val] = np.nan
+        elif data.ndim == 2: # Single-band case
+            if not np.all(np.isnan(data)):
+                data[data == nodata_val] = np.nan
+    return data
+
+
+def decimated_shape(src, max_dim):
+    """(rows, cols) of `src` decimated so the longest side is at most `max_dim` pixels."""
+    factor = max(1, math.ceil(max(src.height, src.width) / max_dim))
+    return max(1, src.height // factor), max(1, src.width // factor)
+
+
+def cell_grid_transform(master_transform, pixels_per_cell, row_offset=0):
+    """Transform of the cell grid: one pixel per sonification cell, starting at master row `row_offset`."""
+    return master_transform * Affine.translation(0, row_offset) * Affine.scale(pixels_per_cell)
+
+
+def reproject_to_cells(raster, src_profile, cell_transform, cell_crs, cell_shape, resampling=Resampling.average):
+    """Warp a 2D raster onto the (rows, cols) cell grid; NaN marks nodata and cells without coverage."""
+    destination = np.full(cell_shape, np.nan, dtype=np.float64)
+    reproject(source=np.asarray(raster, dtype=np.float64), destination=destination,
+              src_transform=src_profile['transform'], src_crs=src_profile['crs'], src_nodata=np.nan,
+              dst_transform=cell_transform, dst_crs=cell_crs, dst_nodata=np.nan, resampling=resampling)
+    return destination
+
+
+def reproject_nan_percent_to_cells(raster, src_profile, cell_transform, cell_crs, cell_shape):
+    """Percentage of NaN source pixels under each cell (NaN where the raster does not cover the cell)."""
+    nan_mask = np.isnan(np.asarray(raster, dtype=np.float64)).astype(np.float64)
+    return reproject_to_cells(nan_mask, src_profile, cell_transform, cell_crs, cell_shape) * 100.0